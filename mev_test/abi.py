@@ -1,9 +1,30 @@
-from dataclasses import dataclass
-from typing import List, Optional, Any
+import functools
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import List, Optional, Any, Dict, Mapping, Tuple
 
-from eth_abi import encode, decode
+from eth_abi import is_encodable
+from eth_abi.decoding import ContextFramesBytesIO
+from eth_abi.exceptions import EncodingTypeError
+from eth_abi.grammar import parse as parse_abi_type
+from eth_abi.registry import registry as codec_registry
 from eth_utils import to_checksum_address, function_signature_to_4byte_selector
 
+STATIC_TYPE = re.compile(r"^(address|bool|uint(\d*)|int(\d*)|bytes(\d+))$")
+ZERO_PADDING = bytes(32)
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def checksum_address(value: str) -> str:
+    """Memoized to_checksum_address, the keccak is only paid once per distinct address."""
+    return to_checksum_address(value)
+
 
 @dataclass
 class ABIFunction:
@@ -13,18 +34,31 @@ class ABIFunction:
     constant: bool = False
     payable: bool = False
     selector: Optional[str] = None
+    _selector: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
+    _encoder: Any = field(default=None, init=False, repr=False, compare=False)
+    _decoder: Any = field(default=None, init=False, repr=False, compare=False)
+
+    def __getstate__(self):
+        # Compiled codecs are rebuilt lazily, they are not worth (or able to be) pickled
+        state = self.__dict__.copy()
+        state["_encoder"] = None
+        state["_decoder"] = None
+        return state
 
     @staticmethod
     def func_selector(sig: str) -> bytes:
         return function_signature_to_4byte_selector(sig)
 
     def get_selector(self) -> bytes:
-        if self.selector:
-            return bytes.fromhex(self.selector.lstrip("0x"))
-        elif self.name:
-            return self.func_selector(self.get_signature())
-        else:
-            raise ValueError("Cannot compute selector without a name or selector")
+        # keccak is expensive, the selector never changes once the function is parsed
+        if self._selector is None:
+            if self.selector:
+                self._selector = bytes.fromhex(strip_hex_prefix(self.selector))
+            elif self.name:
+                self._selector = self.func_selector(self.get_signature())
+            else:
+                raise ValueError("Cannot compute selector without a name or selector")
+        return self._selector
 
     def get_signature(self) -> str:
         if self.name is None:
@@ -36,26 +70,31 @@ class ABIFunction:
 
         return f"{self.name}({input_types})"
 
+    def accepts(self, values: tuple) -> bool:
+        inputs = self.inputs or []
+        if len(inputs) != len(values):
+            return False
+        return all(is_encodable(typ, value) for typ, value in zip(inputs, values))
+
     def encode_inputs(self, values: List[Any]) -> bytes:
         selector = self.get_selector()
-        if self.inputs == []:
+        if not self.inputs:
             return selector
-        encoded_inputs = encode(self.inputs, values)
-        return selector + encoded_inputs
+        if self._encoder is None:
+            self._encoder = compile_encoder(self.inputs)
+        return selector + self._encoder(values)
 
     def decode_outputs(self, output_data: bytes) -> Any:
         if not output_data or not self.outputs:
             return None
 
         if isinstance(output_data, str):
-            output_data = bytes.fromhex(output_data.lstrip("0x"))
+            output_data = bytes.fromhex(strip_hex_prefix(output_data))
 
         try:
-            decoded = decode(self.outputs, output_data)
-            decoded = [
-                to_checksum_address(value) if typ == "address" else value
-                for value, typ in zip(decoded, self.outputs)
-            ]
+            if self._decoder is None:
+                self._decoder = compile_decoder(self.outputs)
+            decoded = self._decoder(output_data)
             if len(decoded) == 1:
                 return decoded[0]
             return decoded
@@ -66,10 +105,279 @@ class ABIFunction:
             )
 
 
-@dataclass
+def compile_encoder(types: List[str]):
+    """
+    Returns ``encode(values) -> bytes`` for the given input types.
+
+    Signatures made only of static single-word types (address, bool, (u)intN, bytesN)
+    are packed by hand, anything else (or any value the fast path is unsure about)
+    goes through the eth_abi tuple encoder resolved once here. Both reject mixed-case
+    addresses with a wrong EIP-55 checksum.
+    """
+    generic_encoder = codec_registry.get_tuple_encoder(*types)
+    checks = [(index, check) for index, check in enumerate(map(_address_checker, types)) if check]
+    generic = generic_encoder
+    if checks:
+        def generic(values):
+            # eth_utils >= 6 no longer checks address checksums
+            for index, check in checks:
+                if index < len(values):
+                    check(values[index])
+            return generic_encoder(values)
+
+    word_encoders = [_word_encoder(typ) for typ in types]
+    if None in word_encoders:
+        return generic
+
+    def encode_static(values):
+        if len(values) != len(word_encoders):
+            return generic(values)
+        words = []
+        for word_encoder, value in zip(word_encoders, values):
+            word = word_encoder(value)
+            if word is None:
+                return generic(values)
+            words.append(word)
+        return b"".join(words)
+
+    return encode_static
+
+
+def compile_decoder(types: List[str]):
+    """
+    Returns ``decode(data) -> list`` for the given output types, top level addresses
+    are checksummed. Same fast path / fallback split as compile_encoder.
+    """
+    generic_decoder = codec_registry.get_tuple_decoder(*types)
+    is_address = [typ == "address" for typ in types]
+
+    def generic(data):
+        decoded = generic_decoder(ContextFramesBytesIO(data))
+        return [
+            checksum_address(value) if address else value
+            for value, address in zip(decoded, is_address)
+        ]
+
+    word_decoders = [_word_decoder(typ) for typ in types]
+    if None in word_decoders:
+        return generic
+    size = 32 * len(word_decoders)
+
+    def decode_static(data):
+        if len(data) < size:
+            return generic(data)
+        decoded = []
+        for index, word_decoder in enumerate(word_decoders):
+            value = word_decoder(data[32 * index: 32 * (index + 1)])
+            if value is None:
+                return generic(data)
+            decoded.append(value)
+        return decoded
+
+    return decode_static
+
+
+def _check_checksum(value):
+    """Raises EncodingTypeError for a mixed-case (EIP-55) address string with a wrong checksum."""
+    if isinstance(value, str) and len(value) == 42 and value[:2] in ("0x", "0X"):
+        digits = value[2:]
+        if (digits != digits.lower() and digits != digits.upper()
+                and checksum_address("0x" + digits)[2:] != digits):
+            raise EncodingTypeError("Address {} has an invalid EIP-55 checksum".format(value))
+
+
+def _address_checker(typ) -> Optional[Any]:
+    """``check(value)`` applying _check_checksum to every address in a value of ``typ``, None without addresses."""
+    abi_type = parse_abi_type(typ) if isinstance(typ, str) else typ
+    if abi_type.arrlist:
+        check_item = _address_checker(abi_type.item_type)
+        if check_item is None:
+            return None
+
+        def check_array(value):
+            if isinstance(value, (list, tuple)):
+                for item in value:
+                    check_item(item)
+        return check_array
+
+    components = getattr(abi_type, "components", None)
+    if components is not None:
+        checks = [(index, check) for index, check in enumerate(map(_address_checker, components)) if check]
+        if not checks:
+            return None
+
+        def check_tuple(value):
+            if isinstance(value, (list, tuple)):
+                for index, check in checks:
+                    if index < len(value):
+                        check(value[index])
+        return check_tuple
+
+    return _check_checksum if abi_type.base == "address" else None
+
+
+def _word_encoder(typ: str):
+    """Encoder of one static 32 bytes word, returns None for values it does not handle."""
+    match = STATIC_TYPE.match(typ)
+    if not match:
+        return None
+
+    if typ == "address":
+        def encode_address(value):
+            if isinstance(value, str) and len(value) == 42 and value[:2] in ("0x", "0X"):
+                try:
+                    raw = bytes.fromhex(value[2:])
+                except ValueError:
+                    return None
+                _check_checksum(value)
+                return bytes(12) + raw
+            elif isinstance(value, (bytes, bytearray)) and len(value) == 20:
+                return bytes(12) + bytes(value)
+            return None
+        return encode_address
+
+    if typ == "bool":
+        def encode_bool(value):
+            if isinstance(value, bool):
+                return (1 if value else 0).to_bytes(32, "big")
+            return None
+        return encode_bool
+
+    if match.group(2) is not None:
+        upper = 1 << int(match.group(2) or 256)
+
+        def encode_uint(value):
+            if type(value) is int and 0 <= value < upper:
+                return value.to_bytes(32, "big")
+            return None
+        return encode_uint
+
+    if match.group(3) is not None:
+        bound = 1 << (int(match.group(3) or 256) - 1)
+
+        def encode_int(value):
+            if type(value) is int and -bound <= value < bound:
+                return (value % (1 << 256)).to_bytes(32, "big")
+            return None
+        return encode_int
+
+    width = int(match.group(4))
+    if not 0 < width <= 32:
+        return None
+
+    def encode_bytes(value):
+        if isinstance(value, (bytes, bytearray)) and len(value) <= width:
+            return bytes(value).ljust(32, b"\x00")
+        return None
+    return encode_bytes
+
+
+def _word_decoder(typ: str):
+    """Decoder of one static 32 bytes word, returns None when the padding is not clean."""
+    match = STATIC_TYPE.match(typ)
+    if not match:
+        return None
+
+    if typ == "address":
+        def decode_address(word):
+            if word[:12] != ZERO_PADDING[:12]:
+                return None
+            return checksum_address("0x" + word[12:].hex())
+        return decode_address
+
+    if typ == "bool":
+        def decode_bool(word):
+            value = int.from_bytes(word, "big")
+            return bool(value) if value <= 1 else None
+        return decode_bool
+
+    if match.group(2) is not None:
+        upper = 1 << int(match.group(2) or 256)
+
+        def decode_uint(word):
+            value = int.from_bytes(word, "big")
+            return value if value < upper else None
+        return decode_uint
+
+    if match.group(3) is not None:
+        bits = int(match.group(3) or 256)
+
+        def decode_int(word):
+            value = int.from_bytes(word, "big", signed=True)
+            if -(1 << (bits - 1)) <= value < (1 << (bits - 1)):
+                return value
+            return None
+        return decode_int
+
+    width = int(match.group(4))
+    if not 0 < width <= 32:
+        return None
+
+    def decode_bytes(word):
+        if word[width:] != ZERO_PADDING[width:]:
+            return None
+        return word[:width]
+    return decode_bytes
+
+
+@dataclass(frozen=True)
 class ContractABI:
-    functions: List[ABIFunction]
+    """Parsed contract ABI. Immutable so one instance can be shared by every Contract."""
+    functions: Tuple[ABIFunction, ...]
     name: Optional[str] = None
+    by_name: Mapping[str, Tuple[ABIFunction, ...]] = field(default=None, init=False, repr=False, compare=False)
+    by_selector: Mapping[str, ABIFunction] = field(default=None, init=False, repr=False, compare=False)
+    by_signature: Mapping[str, ABIFunction] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # Build the lookup indexes once, Contract dispatch only does dict hits afterwards
+        by_name, by_selector, by_signature = dict(), dict(), dict()
+        for func in self.functions:
+            if func.name:
+                by_name[func.name] = by_name.get(func.name, ()) + (func,)
+                by_signature[func.get_signature()] = func
+            if func.name or func.selector:
+                by_selector[func.get_selector().hex()] = func
+
+        object.__setattr__(self, "functions", tuple(self.functions))
+        object.__setattr__(self, "by_name", MappingProxyType(by_name))
+        object.__setattr__(self, "by_selector", MappingProxyType(by_selector))
+        object.__setattr__(self, "by_signature", MappingProxyType(by_signature))
+
+    def __reduce__(self):
+        # The indexes are rebuilt on load, selectors are already cached on the functions
+        return ContractABI, (self.functions, self.name)
+
+    def find(self, identifier: str) -> Tuple[ABIFunction, ...]:
+        """Returns all functions matching a name, a signature or a (0x-prefixed) selector."""
+        if identifier in self.by_name:
+            return self.by_name[identifier]
+        if identifier in self.by_signature:
+            return (self.by_signature[identifier],)
+        func = self.by_selector.get(strip_hex_prefix(identifier).lower())
+        return (func,) if func else ()
+
+    @staticmethod
+    def resolve_overload(candidates: Tuple[ABIFunction, ...], args: tuple) -> ABIFunction:
+        if len(candidates) == 1:
+            return candidates[0]
+
+        by_count = [func for func in candidates if len(func.inputs or []) == len(args)]
+        if len(by_count) == 1:
+            return by_count[0]
+
+        by_type = [func for func in by_count if func.accepts(args)]
+        if len(by_type) == 1:
+            return by_type[0]
+        if not by_type:
+            raise ValueError(
+                f"No overload of {candidates[0].name} accepts arguments {args}, candidates:"
+                f" {[func.get_signature() for func in candidates]}"
+            )
+        raise ValueError(
+            f"Ambiguous call to {candidates[0].name}, call it by signature instead:"
+            f" {[func.get_signature() for func in by_type]}"
+        )
 
 
 def parse_json_abi(abi: dict) -> ContractABI:
@@ -93,6 +401,84 @@ def parse_json_abi(abi: dict) -> ContractABI:
     return ContractABI(functions)
 
 
+class ABIRegistry:
+    """
+    Process-wide cache of parsed ABI files, keyed by path and content hash.
+
+    Every Contract built from the same file shares one ContractABI. When ``cache_dir`` is
+    set the parsed ABI is also pickled there (named by content hash) so a cold start skips
+    json parsing and the keccak of every selector.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self._abis: Dict[Tuple[str, str], ContractABI] = dict()
+        # path -> (mtime_ns, size, digest), avoids re-hashing files that did not change
+        self._stats: Dict[str, Tuple[int, int, str]] = dict()
+        self._lock = threading.Lock()
+
+    def get(self, file_path: str) -> ContractABI:
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        known = self._stats.get(path)
+        if known and known[:2] == (stat.st_mtime_ns, stat.st_size):
+            contract_abi = self._abis.get((path, known[2]))
+            if contract_abi is not None:
+                return contract_abi
+
+        with open(path, "rb") as file:
+            content = file.read()
+        digest = hashlib.sha256(content).hexdigest()
+
+        with self._lock:
+            self._stats[path] = (stat.st_mtime_ns, stat.st_size, digest)
+            contract_abi = self._abis.get((path, digest))
+            if contract_abi is None:
+                contract_abi = self._load_cached(digest)
+                if contract_abi is None:
+                    contract_abi = parse_json_abi(json.loads(content))
+                    self._store_cached(digest, contract_abi)
+                self._abis[(path, digest)] = contract_abi
+            return contract_abi
+
+    def clear(self):
+        with self._lock:
+            self._abis.clear()
+            self._stats.clear()
+
+    def _cache_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.abi.pickle")
+
+    def _load_cached(self, digest: str) -> Optional[ContractABI]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(digest), "rb") as file:
+                return pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+
+    def _store_cached(self, digest: str, contract_abi: ContractABI):
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._cache_path(digest) + f".{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(contract_abi, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._cache_path(digest))
+
+
+abi_registry = ABIRegistry(cache_dir=os.getenv("ABI_CACHE_DIR"))
+
+
+def load_abi_file(file_path: str) -> ContractABI:
+    return abi_registry.get(file_path)
+
+
+def strip_hex_prefix(value: str) -> str:
+    return value[2:] if value.startswith(("0x", "0X")) else value
+
+
 def collapse_if_tuple(abi: dict) -> str:
     typ = abi["type"]
     if not typ.startswith("tuple"):
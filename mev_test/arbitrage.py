@@ -0,0 +1,360 @@
+"""
+Arbitrage cycles over the Uniswap V2 pairs of a PairIndex.
+
+Every pair with reserves gives two directed edges between its tokens, weighted with the
+negative log of the marginal rate: 0.997 * reserve_out / reserve_in, less the sell fee of
+the token going into the pair and the buy fee of the token coming out (fee_models). A
+cycle of negative total weight returns more than it started with, at least for a small
+enough input.
+
+find_cycles() runs Bellman-Ford from every token at once with NumPy: one relaxation of all
+the edges is a handful of array operations, the cycles are read from the predecessor
+graph with pointer doubling. The candidates are then executed in the forked EVM by
+CycleVerifier, hop by hop straight through the pairs, with the amounts the pairs actually
+receive so transfer fees are accounted for exactly. The input of each cycle is the
+profit-maximizing one from input_solver, only that amount is run in the EVM.
+
+    python arbitrage.py --pair_index pairs.sqlite --top_k 10
+"""
+import argparse
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pyrevm import EVM, BlockEnv
+
+from block_meta import get_block_header
+from contract import Contract
+from fee_checker import MY_ADDR
+from fee_models import buy_fees, get_model, init_fees, sell_fees, transfer_fees
+from input_solver import solve_many
+from pair_index import PairIndex, PairInfo
+from pair_swap import PairSwapper
+from simulator import Simulator
+from uniswap_v2 import WETH_ADDR
+from v2_math import ReserveCache, get_amount_out
+
+SWAP_FEE = 0.997
+# Cycles whose log gain is below this are float noise
+MIN_LOG_GAIN = 1e-9
+
+
+def measured_fees() -> Dict[str, Tuple[float, float]]:
+    """
+    ``{token: (buy fee %, sell fee %)}`` of the tokens in the fee models file. A token with
+    no buy or sell model is taken to charge its measured transfer fee on that side: buying
+    is a transfer out of the pair and selling one into it.
+    """
+    init_fees()
+    fees = {}
+    for address in set(buy_fees) | set(sell_fees) | set(transfer_fees):
+        transfer = get_model(transfer_fees, address)
+        buy, sell = buy_fees.get(address, transfer), sell_fees.get(address, transfer)
+        fees[address] = (float(buy.fee_percent()), float(sell.fee_percent()))
+    return fees
+
+
+class PairGraph:
+    """Directed token graph of V2 pairs, edges as parallel arrays."""
+
+    def __init__(self, tokens: List[str], src: np.ndarray, dst: np.ndarray, pairs: List[str], weights: np.ndarray):
+        self.tokens = tokens
+        self.index = {token: position for position, token in enumerate(tokens)}
+        self.src = src
+        self.dst = dst
+        self.pairs = pairs
+        self.weights = weights
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[PairInfo], fees: Optional[Dict[str, Tuple[float, float]]] = None,
+                   min_reserve: int = 10 ** 6) -> "PairGraph":
+        """
+        Graph of the ``pairs`` whose reserves are both at least ``min_reserve`` (dust pairs
+        quote absurd rates). ``fees`` is ``{token: (buy fee %, sell fee %)}``.
+        """
+        fees = fees or {}
+        index: Dict[str, int] = {}
+        src, dst, names, reserve_in, reserve_out = [], [], [], [], []
+        for info in pairs:
+            if info.reserve0 is None or min(info.reserve0, info.reserve1) < min_reserve:
+                continue
+            token0 = index.setdefault(info.token0, len(index))
+            token1 = index.setdefault(info.token1, len(index))
+            src += [token0, token1]
+            dst += [token1, token0]
+            names += [info.pair, info.pair]
+            reserve_in += [float(info.reserve0), float(info.reserve1)]
+            reserve_out += [float(info.reserve1), float(info.reserve0)]
+        tokens = list(index)
+
+        src, dst = np.array(src, dtype=np.int64), np.array(dst, dtype=np.int64)
+        sell = np.array([1 - fees.get(token, (0.0, 0.0))[1] / 100 for token in tokens])
+        buy = np.array([1 - fees.get(token, (0.0, 0.0))[0] / 100 for token in tokens])
+        with np.errstate(divide="ignore"):
+            # A 100% fee makes the edge unusable: log(0) = -inf, weight +inf
+            log_rate = (math.log(SWAP_FEE) + np.log(np.array(reserve_out)) - np.log(np.array(reserve_in))
+                        + np.log(sell[src]) + np.log(buy[dst]))
+        return cls(tokens, src, dst, names, -log_rate)
+
+    @classmethod
+    def from_index(cls, index: PairIndex, block_number: Optional[int] = None, fees=None,
+                   min_reserve: int = 10 ** 6) -> "PairGraph":
+        return cls.from_pairs(index.pairs_with_reserves(block_number), fees, min_reserve)
+
+    def __len__(self):
+        return len(self.src)
+
+
+class Cycle:
+    def __init__(self, tokens: List[str], pairs: List[str], weight: float):
+        # Closed: tokens[0] == tokens[-1]
+        self.tokens = tokens
+        self.pairs = pairs
+        self.weight = weight
+
+    @property
+    def gain(self) -> float:
+        """Marginal return of the cycle, 0.05 for 5%."""
+        return math.expm1(-self.weight)
+
+    def rotated(self, token: str) -> "Cycle":
+        """The same cycle starting and ending at ``token``."""
+        start = self.tokens.index(token.lower())
+        tokens = self.tokens[start:-1] + self.tokens[:start + 1]
+        return Cycle(tokens, self.pairs[start:] + self.pairs[:start], self.weight)
+
+    def __repr__(self):
+        return "Cycle({}, gain={:.4%})".format(" -> ".join(self.tokens), self.gain)
+
+
+def _predecessor_cycles(graph: PairGraph, pred: np.ndarray) -> List[List[int]]:
+    """Cycles of the predecessor graph, each as its list of edges in path order."""
+    n = len(pred)
+    # parent[v] = token v was last relaxed from, the extra node n absorbs tokens never relaxed
+    parent = np.append(np.where(pred >= 0, graph.src[np.maximum(pred, 0)], n), n)
+    jump = parent
+    for _ in range(max(1, int(n).bit_length())):
+        jump = jump[jump]
+    # After n jumps every token that reaches a cycle stands on it
+    on_cycle = np.unique(jump[:n])
+    on_cycle = on_cycle[on_cycle < n]
+
+    seen = set()
+    cycles = []
+    for start in on_cycle.tolist():
+        if start in seen:
+            continue
+        edges, node = [], start
+        while True:
+            seen.add(node)
+            edges.append(int(pred[node]))
+            node = int(parent[node])
+            if node == start:
+                break
+        cycles.append(edges[::-1])
+    return cycles
+
+
+def _relax(graph: PairGraph, weights: np.ndarray, max_hops: int, max_iterations: int,
+           found: Dict[tuple, Cycle]) -> List[List[int]]:
+    """One Bellman-Ford search with ``weights``, adds its cycles to ``found`` and returns their edges."""
+    n = len(graph.tokens)
+    # Edges grouped by destination so one reduceat gives the best candidate of every token
+    order = np.argsort(graph.dst, kind="stable")
+    src, dst, sorted_weights = graph.src[order], graph.dst[order], weights[order]
+    targets, starts = np.unique(dst, return_index=True)
+
+    dist = np.zeros(n)
+    pred = np.full(n, -1, dtype=np.int64)
+    new_cycles = []
+    for _ in range(max_iterations):
+        candidates = dist[src] + sorted_weights
+        best = np.full(n, np.inf)
+        best[targets] = np.minimum.reduceat(candidates, starts)
+        improved = best < dist - MIN_LOG_GAIN
+        if not improved.any():
+            break
+        winners = improved[dst] & (candidates == best[dst])
+        pred[dst[winners]] = order[winners]
+        dist = np.where(improved, best, dist)
+
+        # A cycle in the predecessor graph is negative, collected before later rounds overwrite it
+        for edges in _predecessor_cycles(graph, pred):
+            weight = float(graph.weights[edges].sum())
+            if len(edges) > max_hops or weight > -MIN_LOG_GAIN:
+                continue
+            tokens = [graph.tokens[graph.src[edge]] for edge in edges]
+            # Same cycle from another starting token: keep one rotation
+            first = tokens.index(min(tokens))
+            key = tuple(tokens[first:] + tokens[:first])
+            if key not in found:
+                tokens.append(tokens[0])
+                found[key] = Cycle(tokens, [graph.pairs[edge] for edge in edges], weight)
+                new_cycles.append(edges)
+    return new_cycles
+
+
+def find_cycles(graph: PairGraph, max_hops: int = 8, max_iterations: Optional[int] = None, rounds: int = 8,
+                limit: int = 100) -> List[Cycle]:
+    """
+    Negative cycles of at most ``max_hops`` edges, most profitable first.
+
+    Bellman-Ford from a virtual source linked to every token, the cycles of the predecessor
+    graph are collected after every relaxation round. A search stops when nothing relaxes
+    anymore or after ``max_iterations`` rounds (4 * max_hops by default: cycles show up
+    within a few rounds of their length, later rounds only find longer ones).
+
+    The most negative cycles pull every distance around them and hide the others, so the
+    search is run again up to ``rounds`` times with the cheapest edge of every cycle found
+    so far taken out.
+    """
+    if not graph.tokens:
+        return []
+    max_iterations = max_iterations or 4 * max_hops
+    weights = graph.weights.copy()
+    found: Dict[tuple, Cycle] = {}
+    for _ in range(rounds):
+        new_cycles = _relax(graph, weights, max_hops, max_iterations, found)
+        if not new_cycles:
+            break
+        for edges in new_cycles:
+            weights[edges[int(np.argmin(graph.weights[edges]))]] = np.inf
+    return sorted(found.values(), key=lambda cycle: cycle.weight)[:limit]
+
+
+class CycleResult:
+    def __init__(self, cycle: Cycle, amount_in: int, amount_out: int = 0, error: Optional[str] = None):
+        self.cycle = cycle
+        self.amount_in = amount_in
+        self.amount_out = amount_out
+        self.error = error
+
+    @property
+    def profit(self) -> int:
+        return self.amount_out - self.amount_in if self.error is None else 0
+
+    def __repr__(self):
+        if self.error:
+            return "CycleResult({}, error={})".format(self.cycle, self.error)
+        return "CycleResult({}, profit={})".format(self.cycle, self.profit)
+
+
+class CycleVerifier:
+    """
+    Runs cycles in the EVM through the pairs, starting from ``base`` held by ``caller``.
+    Every hop transfers what the caller holds of the input token to the pair and asks for
+    what the pair actually received quotes to, each cycle in its own isolated() block.
+    """
+
+    def __init__(self, evm: Simulator, base: str = WETH_ADDR, caller: str = MY_ADDR,
+                 swapper: Optional[PairSwapper] = None):
+        self.evm = evm
+        self.base = base.lower()
+        self.caller = caller
+        self.swapper = swapper or PairSwapper(evm)
+        self._tokens: Dict[str, Contract] = {}
+
+    def token(self, address: str) -> Contract:
+        token = self._tokens.get(address)
+        if token is None:
+            token = self._tokens[address] = Contract(address, revm=self.evm, abi_file_path="./abi/erc20.abi")
+        return token
+
+    def swap(self, token_in: str, token_out: str, amount_in: int) -> int:
+        """Sends ``amount_in`` of ``token_in`` through its pair with ``token_out``, returns what the caller received."""
+        pair = self.swapper.pair(token_in, token_out)
+        reserve_in, reserve_out = self.swapper.reserves(token_in, token_out)
+        source, target = self.token(token_in), self.token(token_out)
+        source.transfer(pair.address, amount_in, caller=self.caller)
+        amount_out = get_amount_out(source.balanceOf(pair.address) - reserve_in, reserve_in, reserve_out)
+        before = target.balanceOf(self.caller)
+        zero_for_one = token_in < token_out
+        pair.swap(0 if zero_for_one else amount_out, amount_out if zero_for_one else 0, self.caller, b'',
+                  caller=self.caller)
+        return target.balanceOf(self.caller) - before
+
+    def verify(self, cycle: Cycle, amount_in: int) -> CycleResult:
+        if self.base not in cycle.tokens:
+            return CycleResult(cycle, amount_in, error="does not go through {}".format(self.base))
+        cycle = cycle.rotated(self.base)
+        amount = amount_in
+        with self.evm.isolated():
+            try:
+                for token_in, token_out in zip(cycle.tokens, cycle.tokens[1:]):
+                    amount = self.swap(token_in, token_out, amount)
+            except BaseException as e:
+                # pyrevm panics are raised as BaseException, a bad hop must not stop the batch
+                if isinstance(e, (KeyboardInterrupt, SystemExit)):
+                    raise
+                return CycleResult(cycle, amount_in, error="{}: {}".format(type(e).__name__, e))
+        return CycleResult(cycle, amount_in, amount)
+
+    def verify_many(self, cycles: Iterable[Cycle], amount_in: int, top_k: int = 10) -> List[CycleResult]:
+        """The ``top_k`` best cycles through ``base`` run in the EVM, most profitable first."""
+        through_base = [cycle for cycle in cycles if self.base in cycle.tokens][:top_k]
+        results = [self.verify(cycle, amount_in) for cycle in through_base]
+        return sorted(results, key=lambda result: result.profit, reverse=True)
+
+    def verify_solved(self, cycles: Iterable[Cycle], reserves: ReserveCache, fees=None,
+                      max_amount: Optional[int] = None, top_k: int = 10) -> List[CycleResult]:
+        """
+        Like verify_many() with the profit-maximizing input of each cycle (input_solver, at
+        most ``max_amount``): only that amount is run in the EVM, cycles whose quoted profit is
+        not positive are not run at all.
+        """
+        through_base = [cycle.rotated(self.base) for cycle in cycles if self.base in cycle.tokens][:top_k]
+        solutions = solve_many([cycle.tokens for cycle in through_base], reserves, fees, max_amount)
+        results = [self.verify(cycle, solution.amount_in)
+                   for cycle, solution in zip(through_base, solutions) if solution.profit > 0]
+        return sorted(results, key=lambda result: result.profit, reverse=True)
+
+
+def get_args() -> argparse.Namespace:
+    parse = argparse.ArgumentParser()
+    parse.add_argument('--rpc_url', default='http://192.168.1.58:8545')
+    parse.add_argument('--pair_index', required=True, help='PairIndex SQLite file with reserves')
+    parse.add_argument('--block', type=int, help='Block to verify at, the latest by default')
+    parse.add_argument('--max_hops', type=int, default=8)
+    parse.add_argument('--min_reserve', type=int, default=10 ** 6, help='Ignore pairs with a smaller reserve')
+    parse.add_argument('--top_k', type=int, default=10, help='Cycles through WETH to verify in the EVM')
+    parse.add_argument('--max_amount', type=float, default=1.0,
+                       help='Most WETH put into a cycle, the input is solved for the highest profit')
+    return parse.parse_args()
+
+
+def main():
+    args = get_args()
+    block = get_block_header(args.rpc_url, args.block if args.block is not None else "latest")
+    index = PairIndex(args.pair_index)
+
+    start = time.perf_counter()
+    fees = measured_fees()
+    graph = PairGraph.from_index(index, block.number - 1, fees, args.min_reserve)
+    built = time.perf_counter()
+    cycles = find_cycles(graph, max_hops=args.max_hops)
+    searched = time.perf_counter()
+    print("Graph: {} tokens, {} edges in {:.3f}s, {} cycles found in {:.3f}s".format(
+        len(graph.tokens), len(graph), built - start, len(cycles), searched - built))
+
+    evm = Simulator(EVM(fork_url=args.rpc_url, fork_block=block.parent_hash, tracing=False))
+    evm.set_block_env(BlockEnv(number=block.number, timestamp=block.timestamp))
+    max_amount = int(args.max_amount * 10 ** 18)
+    weth = Contract(WETH_ADDR, revm=evm, abi_file_path="./abi/weth.abi")
+    weth.deposit(value=max_amount, caller=MY_ADDR)
+
+    # Reserves of the fork, the index may lag behind it
+    reserves = ReserveCache(evm)
+    for result in CycleVerifier(evm).verify_solved(cycles, reserves, fees, max_amount, args.top_k):
+        print("==> {}".format(" -> ".join(result.cycle.tokens)))
+        print("    Expected gain: {:.4%}".format(result.cycle.gain))
+        if result.error:
+            print("    Failed: {}".format(result.error))
+        else:
+            print("    Amount in: {} Amount out: {} Profit: {} ({:.4%})".format(
+                result.amount_in, result.amount_out, result.profit, result.profit / result.amount_in))
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Startup time and per-Contract memory when building one Contract per token.
+
+"before" parses the ABI json for every Contract, like setup_contract used to do,
+"after" goes through the shared ABI registry.
+
+Run from the mev_test directory:
+    python -m benchmarks.bench_abi_registry [--file_path ./data/token_2.txt]
+"""
+import argparse
+import json
+import tempfile
+import time
+import tracemalloc
+
+from pyrevm import EVM
+
+from abi import ABIRegistry, parse_json_abi
+from contract import Contract
+
+ABI_FILE = "./abi/erc20.abi"
+
+
+def read_tokens(file_path):
+    with open(file_path) as f:
+        return [line[0: 42].rstrip() for line in f.readlines()]
+
+
+def build_parsed(evm, tokens):
+    contracts = []
+    for token in tokens:
+        with open(ABI_FILE) as file:
+            contract_abi = parse_json_abi(json.load(file))
+        contracts.append(Contract(address=token, revm=evm, contract_abi=contract_abi))
+    return contracts
+
+
+def build_shared(evm, tokens, registry):
+    return [Contract(address=token, revm=evm, contract_abi=registry.get(ABI_FILE)) for token in tokens]
+
+
+def measure(label, build, tokens):
+    tracemalloc.start()
+    start = time.perf_counter()
+    contracts = build()
+    elapsed = time.perf_counter() - start
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:<24} {:>5} contracts  startup: {:>8.1f} ms  memory/contract: {:>9.0f} B".format(
+        label, len(contracts), elapsed * 1000, current / len(contracts)))
+    return contracts
+
+
+def main():
+    parse = argparse.ArgumentParser()
+    parse.add_argument('--file_path', default='./data/token_2.txt')
+    args = parse.parse_args()
+
+    evm = EVM()
+    tokens = read_tokens(args.file_path)
+
+    measure("before (parse each)", lambda: build_parsed(evm, tokens), tokens)
+    measure("after (registry)", lambda: build_shared(evm, tokens, ABIRegistry()), tokens)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        ABIRegistry(cache_dir=cache_dir).get(ABI_FILE)
+        start = time.perf_counter()
+        ABIRegistry(cache_dir=cache_dir).get(ABI_FILE)
+        pickled = time.perf_counter() - start
+    start = time.perf_counter()
+    ABIRegistry().get(ABI_FILE)
+    parsed = time.perf_counter() - start
+    print("cold start from json: {:.2f} ms, from pickle: {:.2f} ms".format(parsed * 1000, pickled * 1000))
+
+
+if __name__ == "__main__":
+    main()
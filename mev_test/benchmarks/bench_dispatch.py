@@ -0,0 +1,58 @@
+"""
+Micro-benchmark of the Contract function lookup.
+
+Compares the old linear scan over ``ContractABI.functions`` (selector recomputed
+through keccak on every ``__getitem__``) with the prebuilt indexes and cached bound
+callables. Only the lookup is measured, no call reaches the EVM.
+
+Run from the mev_test directory:
+    python -m benchmarks.bench_dispatch
+"""
+import timeit
+
+from pyrevm import EVM
+
+from contract import Contract
+
+ROUNDS = 100_000
+ERC20_ADDR = "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"
+
+
+def linear_getattr(contract: Contract, attribute: str):
+    for func in contract.abi.functions:
+        if func.name == attribute or func.selector == attribute:
+            return lambda *args, **kwargs: contract.call_function(func, args, kwargs)
+    raise AttributeError(attribute)
+
+
+def linear_getitem(contract: Contract, identifier: str):
+    identifier = identifier[2:] if identifier.startswith("0x") else identifier
+    for func in contract.abi.functions:
+        # Old behaviour: keccak of the signature for every function on every lookup
+        if identifier in [func.name, func.func_selector(func.get_signature()).hex()]:
+            return lambda *args, **kwargs: contract.call_function(func, args, kwargs)
+    raise AttributeError(identifier)
+
+
+def report(label: str, before: float, after: float, rounds: int = ROUNDS):
+    print("{:<28} before: {:>8.3f} us  after: {:>8.3f} us  speedup: {:>7.1f}x".format(
+        label, before * 1e6 / rounds, after * 1e6 / rounds, before / after))
+
+
+def main():
+    token = Contract(address=ERC20_ADDR, revm=EVM(), abi_file_path="./abi/erc20.abi")
+
+    for name in ("balanceOf", "transfer", "transferFrom"):
+        before = timeit.timeit(lambda: linear_getattr(token, name), number=ROUNDS)
+        after = timeit.timeit(lambda: getattr(token, name), number=ROUNDS)
+        report(f"getattr {name}", before, after)
+
+    selector = "0x" + token.abi.find("balanceOf")[0].get_selector().hex()
+    rounds = ROUNDS // 100
+    before = timeit.timeit(lambda: linear_getitem(token, selector), number=rounds)
+    after = timeit.timeit(lambda: token[selector], number=rounds)
+    report(f"getitem {selector}", before, after, rounds)
+
+
+if __name__ == "__main__":
+    main()
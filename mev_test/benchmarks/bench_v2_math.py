@@ -0,0 +1,65 @@
+"""
+Micro-benchmark of Uniswap V2 quotes: v2_math against a call into the EVM.
+
+With FORK_URL set the EVM side is router.getAmountsOut on a fork. Without it, it is a
+call to a contract returning a constant: the cost of a message_call doing no maths,
+which every router quote pays at least.
+
+Run from the mev_test directory:
+    python -m benchmarks.bench_v2_math
+"""
+import os
+import timeit
+
+from pyrevm import EVM, AccountInfo
+
+from block_meta import get_block_header
+from contract import Contract
+from uniswap_v2 import UNISWAP_V2_ROUTER, WETH_ADDR
+from v2_math import ReserveCache, get_amounts_out, get_amounts_out_many
+
+ROUNDS = 20_000
+DOGE = "0xF2ec4a773ef90c58d98ea734c0eBDB538519b988"
+NEIRO = "0x812Ba41e071C7b7fA4EBcFB62dF5F45f6fA853Ee"
+MY_ADDR = "0xd8dA6BF26964aF9D7eEd9e03E53415D37aA96045"
+
+
+def report(label: str, seconds: float, quotes: int):
+    print("{:<36} {:>10.3f} us/quote".format(label, seconds * 1e6 / quotes))
+
+
+def evm_quote():
+    fork_url = os.getenv("FORK_URL")
+    if fork_url:
+        evm = EVM(fork_url=fork_url, fork_block=get_block_header(fork_url).parent_hash, tracing=False)
+        router = Contract(UNISWAP_V2_ROUTER, revm=evm, abi_file_path="./abi/uniswapv2router.abi")
+        path = [WETH_ADDR, DOGE]
+        router.getAmountsOut(10 ** 18, path)  # warm the fork
+        return "router.getAmountsOut (EVM)", lambda: router.getAmountsOut(10 ** 18, path)
+
+    evm = EVM()
+    constant = "0x" + "33" * 20
+    evm.insert_account_info(constant, AccountInfo(code=bytes.fromhex("602a60005260206000f3")))
+    return "message_call, no maths (EVM)", lambda: evm.message_call(MY_ADDR, constant, b"")
+
+
+def main():
+    reserves = ReserveCache()
+    reserves.set(WETH_ADDR, DOGE, 10 ** 20, 5 * 10 ** 27)
+    reserves.set(NEIRO, DOGE, 3 * 10 ** 24, 2 * 10 ** 27)
+
+    label, quote = evm_quote()
+    report(label, timeit.timeit(quote, number=ROUNDS // 10), ROUNDS // 10)
+
+    report("get_amounts_out 1 hop", timeit.timeit(
+        lambda: get_amounts_out(10 ** 18, [WETH_ADDR, DOGE], reserves), number=ROUNDS), ROUNDS)
+    report("get_amounts_out 2 hops", timeit.timeit(
+        lambda: get_amounts_out(10 ** 18, [WETH_ADDR, DOGE, NEIRO], reserves), number=ROUNDS), ROUNDS)
+
+    requests = [(10 ** 15 + index, [WETH_ADDR, DOGE, NEIRO]) for index in range(10_000)]
+    report("get_amounts_out_many 2 hops x10000", timeit.timeit(
+        lambda: get_amounts_out_many(requests, reserves), number=5), 5 * len(requests))
+
+
+if __name__ == "__main__":
+    main()
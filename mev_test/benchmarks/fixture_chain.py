@@ -0,0 +1,172 @@
+"""
+A fork-less chain for offline benchmarks: WETH, fee-on-transfer tokens and their WETH pairs
+as small hand-assembled contracts at the addresses the scan code expects.
+
+- token (also WETH): balanceOf, transfer, deposit. balances mapping at slot 0, the fee in
+  basis points at slot 1, taken from every transfer and burnt.
+- pair: getReserves, and swap(amount0Out, amount1Out, to, data) that transfers the asked
+  amounts of token0 (slot 6) and token1 (slot 7) to ``to`` and syncs the reserves to its
+  balances. There is no K check: whatever is asked is paid.
+
+The pairs sit at their CREATE2 addresses with their reserves in slot 8, PairSwapper and
+check_token_fee work on them as on mainnet.
+"""
+from pyrevm import EVM, AccountInfo
+
+from simulator import Simulator
+from uniswap_v2 import (PAIR_RESERVES_SLOT, PAIR_TOKEN0_SLOT, PAIR_TOKEN1_SLOT, WETH_ADDR, mapping_slot,
+                        pair_address, sort_tokens)
+
+OPCODES = {
+    "STOP": 0x00, "ADD": 0x01, "MUL": 0x02, "SUB": 0x03, "DIV": 0x04, "LT": 0x10, "EQ": 0x14, "ISZERO": 0x15, "AND": 0x16, "OR": 0x17,
+    "SHL": 0x1b, "SHR": 0x1c, "SHA3": 0x20, "ADDRESS": 0x30, "CALLER": 0x33, "CALLVALUE": 0x34, "CALLDATALOAD": 0x35, "POP": 0x50,
+    "MLOAD": 0x51, "MSTORE": 0x52, "SLOAD": 0x54, "SSTORE": 0x55, "JUMP": 0x56, "JUMPI": 0x57, "GAS": 0x5a, "JUMPDEST": 0x5b,
+    "DUP1": 0x80, "DUP2": 0x81, "DUP3": 0x82, "DUP6": 0x85, "SWAP1": 0x90, "CALL": 0xf1, "RETURN": 0xf3,
+    "STATICCALL": 0xfa, "REVERT": 0xfd,
+}
+
+BALANCES_SLOT = 0
+FEE_SLOT = 1
+RESERVE_MASK = (1 << 112) - 1
+MY_ADDR = "0xd8dA6BF26964aF9D7eEd9e03E53415D37aA96045"  # vitalik.eth
+
+
+def assemble(program: list) -> bytes:
+    """
+    Bytecode of ``program``: opcode names, ints (pushed with the smallest PUSH),
+    ``("label", name)`` for a JUMPDEST and ``("ref", name)`` to push its offset.
+    """
+    def size(item):
+        if isinstance(item, int):
+            return 1 + max(1, (item.bit_length() + 7) // 8)
+        if isinstance(item, tuple):
+            return 3 if item[0] == "ref" else 1
+        return 1
+
+    labels, offset = {}, 0
+    for item in program:
+        if isinstance(item, tuple) and item[0] == "label":
+            labels[item[1]] = offset
+        offset += size(item)
+
+    code = bytearray()
+    for item in program:
+        if isinstance(item, int):
+            width = size(item) - 1
+            code += bytes([0x5f + width]) + item.to_bytes(width, "big")
+        elif isinstance(item, tuple):
+            code += bytes([OPCODES["JUMPDEST"]]) if item[0] == "label" else b"\x61" + labels[item[1]].to_bytes(2, "big")
+        else:
+            code.append(OPCODES[item])
+    return bytes(code)
+
+
+def balance_slot() -> list:
+    # [address] -> [keccak(address . BALANCES_SLOT)]
+    return [0, "MSTORE", BALANCES_SLOT, 32, "MSTORE", 64, 0, "SHA3"]
+
+
+def dispatch(functions: dict) -> list:
+    program = [0, "CALLDATALOAD", 224, "SHR"]
+    for selector, label in functions.items():
+        program += ["DUP1", selector, "EQ", ("ref", label), "JUMPI"]
+    return program + [("label", "fail"), 0, "DUP1", "REVERT"]
+
+
+TOKEN_CODE = assemble(dispatch({0x70a08231: "balanceOf", 0xa9059cbb: "transfer", 0xd0e30db0: "deposit"}) + [
+    ("label", "balanceOf"),
+    4, "CALLDATALOAD", *balance_slot(), "SLOAD",
+    0, "MSTORE", 32, 0, "RETURN",
+
+    ("label", "deposit"),
+    "CALLER", *balance_slot(),                          # [s]
+    "DUP1", "SLOAD", "CALLVALUE", "ADD", "SWAP1", "SSTORE",
+    "STOP",
+
+    ("label", "transfer"),
+    "CALLER", *balance_slot(),                          # [s_from]
+    "DUP1", "SLOAD", 36, "CALLDATALOAD",                # [amount, balance, s_from]
+    "DUP1", "DUP3", "LT", ("ref", "fail"), "JUMPI",     # balance < amount
+    "SWAP1", "DUP2", "SWAP1", "SUB",                    # [balance - amount, amount, s_from]
+    "DUP3", "SSTORE", "SWAP1", "POP",                   # [amount]
+    "DUP1", FEE_SLOT, "SLOAD", "MUL", 10000, "SWAP1", "DIV",
+    "SWAP1", "SUB",                                     # [amount - fee]
+    4, "CALLDATALOAD", *balance_slot(),                 # [s_to, received]
+    "DUP1", "SLOAD", "DUP3", "ADD", "SWAP1", "SSTORE", "POP",
+    1, 0, "MSTORE", 32, 0, "RETURN",
+])
+
+
+def pay(token_slot: int, amount_offset: int, skip: str) -> list:
+    # token.transfer(to, amount) when amount > 0, reverts if the transfer fails
+    return [
+        amount_offset, "CALLDATALOAD", token_slot, "SLOAD",   # [token, amount]
+        "DUP2", "ISZERO", ("ref", skip), "JUMPI",
+        0xa9059cbb, 224, "SHL", 0, "MSTORE", 68, "CALLDATALOAD", 4, "MSTORE", "DUP2", 36, "MSTORE",
+        32, 0, 68, 0, 0, "DUP6", "GAS", "CALL",
+        "ISZERO", ("ref", "fail"), "JUMPI",
+        ("label", skip), "POP", "POP",
+    ]
+
+
+def balance_of_self(token_slot: int) -> list:
+    # [] -> [token.balanceOf(this)]
+    return [
+        0x70a08231, 224, "SHL", 0, "MSTORE", "ADDRESS", 4, "MSTORE",
+        32, 0, 36, 0, token_slot, "SLOAD", "GAS", "STATICCALL", "POP",
+        0, "MLOAD",
+    ]
+
+
+PAIR_CODE = assemble(dispatch({0x022c0d9f: "swap", 0x0902f1ac: "getReserves"}) + [
+    ("label", "getReserves"),
+    PAIR_RESERVES_SLOT, "SLOAD",
+    "DUP1", RESERVE_MASK, "AND", 0, "MSTORE",
+    "DUP1", 112, "SHR", RESERVE_MASK, "AND", 32, "MSTORE",
+    224, "SHR", 64, "MSTORE",
+    96, 0, "RETURN",
+
+    ("label", "swap"),
+    *pay(PAIR_TOKEN0_SLOT, 4, "paid0"),
+    *pay(PAIR_TOKEN1_SLOT, 36, "paid1"),
+    # sync(): the reserves become the balances, with a timestamp of 1
+    *balance_of_self(PAIR_TOKEN0_SLOT), *balance_of_self(PAIR_TOKEN1_SLOT),   # [balance1, balance0]
+    112, "SHL", "OR", 1, 224, "SHL", "OR", PAIR_RESERVES_SLOT, "SSTORE",
+    "STOP",
+])
+
+
+def token_address(index: int) -> str:
+    return "0x" + "{:040x}".format(0xf1c0000000000000000000000000000000000000 + index)
+
+
+class FixtureChain:
+    """
+    ``tokens`` fee-on-transfer tokens, token i taking ``fee_bps[i % len(fee_bps)]``, each
+    with a WETH pair holding ``weth_reserve`` WETH and ``token_reserve`` tokens. ``funded``
+    accounts get 10^6 ETH to deposit.
+    """
+
+    def __init__(self, tokens: int = 8, fee_bps=(0, 100, 500), weth_reserve: int = 10 ** 21,
+                 token_reserve: int = 10 ** 27, funded=(MY_ADDR,)):
+        self.evm = Simulator(EVM())
+        for account in funded:
+            self.evm.set_balance(account, 10 ** 24)
+        self.tokens = [token_address(index) for index in range(tokens)]
+        self.evm.insert_account_info(WETH_ADDR, AccountInfo(code=TOKEN_CODE))
+        for index, token in enumerate(self.tokens):
+            self.evm.insert_account_info(token, AccountInfo(code=TOKEN_CODE))
+            self.evm.insert_account_storage(token, FEE_SLOT, fee_bps[index % len(fee_bps)])
+            self.add_pair(token, weth_reserve, token_reserve)
+
+    def add_pair(self, token: str, weth_reserve: int, token_reserve: int):
+        pair = pair_address(WETH_ADDR, token)
+        token0, token1 = sort_tokens(WETH_ADDR, token)
+        reserve0, reserve1 = (weth_reserve, token_reserve) if token0 == WETH_ADDR.lower() else (token_reserve,
+                                                                                                weth_reserve)
+        self.evm.insert_account_info(pair, AccountInfo(code=PAIR_CODE))
+        self.evm.insert_account_storage(pair, PAIR_TOKEN0_SLOT, int(token0, 16))
+        self.evm.insert_account_storage(pair, PAIR_TOKEN1_SLOT, int(token1, 16))
+        self.evm.insert_account_storage(pair, PAIR_RESERVES_SLOT, (1 << 224) | (reserve1 << 112) | reserve0)
+        self.evm.insert_account_storage(WETH_ADDR, mapping_slot(pair, BALANCES_SLOT), weth_reserve)
+        self.evm.insert_account_storage(token, mapping_slot(pair, BALANCES_SLOT), token_reserve)
@@ -0,0 +1,233 @@
+"""
+Offline benchmark suite of the scan hot path, no node needed.
+
+Covers ABIFunction.encode_inputs/decode_outputs, Contract attribute dispatch, raw
+message_call throughput and Contract calls on a fork-less EVM, and check_token_fee end to
+end on the fixture chain of benchmarks.fixture_chain. Every benchmark reports the min and
+median time per operation over ``--repeat`` runs, written as JSON with ``--output``.
+
+With ``--baseline`` the results are compared to a stored run: a benchmark whose min time
+grew by more than ``--threshold`` (50% by default, run to run noise of the sub-10us
+benchmarks is already 20-30% on a busy machine) is a regression and the exit code is 1.
+benchmarks/baseline.json was taken on one machine, save your own before comparing.
+
+Run from the mev_test directory:
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --save_baseline benchmarks/baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+import timeit
+from typing import Callable, Dict, Optional
+
+import call_metrics
+from benchmarks.fixture_chain import MY_ADDR, FixtureChain
+from contract import Contract
+from ensure_token_fee import check_token_fee
+from pair_swap import PairSwapper
+from uniswap_v2 import WETH_ADDR
+
+ERC20_ABI = "./abi/erc20.abi"
+WETH_ABI = "./abi/weth.abi"
+RECIPIENT = "0x" + "77" * 20
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    """
+    Registers a benchmark. The decorated function gets the shared Fixture and returns the
+    callable to time, its setup is not measured.
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+class Fixture:
+    """The fixture chain with WETH deposited for MY_ADDR, built once for every benchmark."""
+
+    def __init__(self):
+        self.chain = FixtureChain()
+        self.evm = self.chain.evm
+        self.weth = Contract(WETH_ADDR, revm=self.evm, abi_file_path=WETH_ABI)
+        self.weth.deposit(value=10 ** 21, caller=MY_ADDR)
+        self.token = Contract(self.chain.tokens[1], revm=self.evm, abi_file_path=ERC20_ABI)
+        self.swapper = PairSwapper(self.evm)
+
+
+@benchmark("abi.encode_inputs.transfer")
+def bench_encode(fixture: Fixture):
+    func = fixture.token.abi.find("transfer")[0]
+    args = (RECIPIENT, 10 ** 18)
+    return lambda: func.encode_inputs(args)
+
+
+@benchmark("abi.decode_outputs.balanceOf")
+def bench_decode(fixture: Fixture):
+    func = fixture.token.abi.find("balanceOf")[0]
+    output = (10 ** 18).to_bytes(32, "big")
+    return lambda: func.decode_outputs(output)
+
+
+@benchmark("contract.getattr.balanceOf")
+def bench_getattr(fixture: Fixture):
+    token = fixture.token
+    return lambda: token.balanceOf
+
+
+@benchmark("evm.message_call.balanceOf")
+def bench_message_call_view(fixture: Fixture):
+    evm, address = fixture.evm, fixture.token.address
+    calldata = fixture.token.abi.find("balanceOf")[0].encode_inputs((MY_ADDR,))
+    return lambda: evm.message_call(MY_ADDR, address, calldata, is_static=True)
+
+
+@benchmark("evm.message_call.transfer")
+def bench_message_call_transfer(fixture: Fixture):
+    # 1 wei of WETH per call, always the same two balance slots
+    evm = fixture.evm
+    calldata = fixture.weth.abi.find("transfer")[0].encode_inputs((RECIPIENT, 1))
+    return lambda: evm.message_call(MY_ADDR, WETH_ADDR, calldata)
+
+
+@benchmark("contract.call.balanceOf")
+def bench_contract_call(fixture: Fixture):
+    token = fixture.token
+    return lambda: token.balanceOf(MY_ADDR)
+
+
+@benchmark("contract.call.balanceOf.metrics")
+def bench_contract_call_metrics(fixture: Fixture):
+    # call_metrics enabled for this benchmark only, switching it costs two global stores
+    token, metrics = fixture.token, call_metrics.CallMetrics()
+
+    def call():
+        call_metrics.active = metrics
+        try:
+            return token.balanceOf(MY_ADDR)
+        finally:
+            call_metrics.active = None
+
+    return call
+
+
+@benchmark("swapper.reserves")
+def bench_reserves(fixture: Fixture):
+    swapper, token = fixture.swapper, fixture.token.address
+    return lambda: swapper.reserves(WETH_ADDR, token)
+
+
+@benchmark("scan.check_token_fee")
+def bench_check_token_fee(fixture: Fixture):
+    evm, weth, token, swapper = fixture.evm, fixture.weth, fixture.token, fixture.swapper
+
+    def check():
+        # check_token_fee prints its findings, keep them out of the report
+        with evm.isolated(), contextlib.redirect_stdout(io.StringIO()):
+            return check_token_fee(weth, token, swapper)
+
+    return check
+
+
+def measure(func: Callable, repeat: int, min_time: float) -> dict:
+    timer = timeit.Timer(func)
+    number = 1
+    # Enough calls per run to last min_time, like Timer.autorange
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 2
+    times = [total / number * 1e6 for total in timer.repeat(repeat=repeat, number=number)]
+    return {"min_us": min(times), "median_us": statistics.median(times), "number": number, "repeat": repeat}
+
+
+def run(names=None, repeat: int = 5, min_time: float = 0.05) -> dict:
+    fixture = Fixture()
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if names and not any(pattern in name for pattern in names):
+            continue
+        results[name] = measure(setup(fixture), repeat, min_time)
+    return {
+        "time": int(time.time()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict) -> Dict[str, Optional[float]]:
+    """``{name: min time / baseline min time}`` of every current result, None for new benchmarks."""
+    ratios = {}
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        ratios[name] = result["min_us"] / before["min_us"] if before else None
+    return ratios
+
+
+def regressions(ratios: Dict[str, Optional[float]], threshold: float) -> list:
+    return [name for name, ratio in ratios.items() if ratio is not None and ratio > 1 + threshold]
+
+
+def report(current: dict, baseline: Optional[dict] = None, threshold: float = 0.5):
+    ratios = compare(current, baseline) if baseline else {}
+    for name, result in current["results"].items():
+        line = "{:<32} min: {:>10.3f} us  median: {:>10.3f} us".format(name, result["min_us"], result["median_us"])
+        if baseline:
+            ratio = ratios[name]
+            if ratio is None:
+                line += "  (new)"
+            else:
+                line += "  baseline: {:>10.3f} us  {:>+7.1f}%{}".format(
+                    baseline["results"][name]["min_us"], (ratio - 1) * 100,
+                    "  REGRESSION" if ratio > 1 + threshold else "")
+        print(line)
+
+
+def get_args():
+    parse = argparse.ArgumentParser()
+    parse.add_argument('--filter', nargs='*', help='only the benchmarks whose name contains one of these')
+    parse.add_argument('--repeat', type=int, default=5)
+    parse.add_argument('--min_time', type=float, default=0.05, help='seconds per timed run')
+    parse.add_argument('--output', help='write the results as JSON to this file')
+    parse.add_argument('--baseline', help='compare against the results stored in this file')
+    parse.add_argument('--save_baseline', help='store the results as the baseline in this file')
+    parse.add_argument('--threshold', type=float, default=0.5, help='slowdown counted as a regression')
+    return parse.parse_args()
+
+
+def main():
+    args = get_args()
+    current = run(args.filter, args.repeat, args.min_time)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if (baseline["python"], baseline["machine"]) != (current["python"], current["machine"]):
+            print("Baseline taken with Python {python} on {machine}, numbers may not compare".format(**baseline))
+    report(current, baseline, args.threshold)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(current, f, indent=2, sort_keys=True)
+
+    if baseline:
+        slower = regressions(compare(current, baseline), args.threshold)
+        if slower:
+            print("{} regression(s): {}".format(len(slower), ", ".join(slower)))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
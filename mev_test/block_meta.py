@@ -0,0 +1,205 @@
+"""
+Block headers over JSON-RPC without web3.
+
+eth_getBlockByNumber/Hash with ``full=False``, only the header fields the simulations use
+are kept. Headers of numbered or hashed blocks never change, they are kept in a shared LRU
+(HEADER_CACHE), ``"latest"`` and the other tags are always fetched.
+
+    header = get_block_header(rpc_url)                      # one-off, from synchronous code
+    async with BlockMetaClient(rpc_url) as client:          # many, concurrently
+        headers = await client.headers(range(start, end))
+"""
+import asyncio
+import json
+import ssl
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Union
+from urllib.parse import urlsplit
+
+from rpc_client import RPCError
+
+BLOCK_HASH_LENGTH = 66
+
+
+class BlockHeader:
+    def __init__(self, number: int, hash: str, parent_hash: str, timestamp: int, gas_limit: int,
+                 coinbase: str, base_fee: Optional[int] = None, prevrandao: Optional[str] = None):
+        self.number = number
+        self.hash = hash
+        self.parent_hash = parent_hash
+        self.timestamp = timestamp
+        self.gas_limit = gas_limit
+        self.coinbase = coinbase
+        self.base_fee = base_fee
+        self.prevrandao = prevrandao
+
+    @classmethod
+    def from_json(cls, block: dict) -> "BlockHeader":
+        base_fee = block.get("baseFeePerGas")
+        return cls(int(block["number"], 16), block["hash"], block["parentHash"], int(block["timestamp"], 16),
+                   int(block["gasLimit"], 16), block["miner"], int(base_fee, 16) if base_fee else None,
+                   block.get("mixHash"))
+
+    def __repr__(self):
+        return "BlockHeader(number={}, hash={})".format(self.number, self.hash)
+
+
+class HeaderCache:
+    """LRU of headers, found by number or by hash."""
+
+    def __init__(self, size: int = 256):
+        self.size = size
+        self._headers = OrderedDict()
+        self._by_hash = {}
+
+    def get(self, block: Union[int, str]) -> Optional[BlockHeader]:
+        number = self._by_hash.get(block.lower()) if isinstance(block, str) else block
+        header = self._headers.get(number)
+        if header is not None:
+            self._headers.move_to_end(number)
+        return header
+
+    def put(self, header: BlockHeader):
+        self._headers[header.number] = header
+        self._headers.move_to_end(header.number)
+        self._by_hash[header.hash.lower()] = header.number
+        while len(self._headers) > self.size:
+            _, evicted = self._headers.popitem(last=False)
+            self._by_hash.pop(evicted.hash.lower(), None)
+
+    def __len__(self):
+        return len(self._headers)
+
+
+HEADER_CACHE = HeaderCache()
+
+
+class BlockMetaClient:
+    """
+    Asyncio JSON-RPC client for block headers. Requests go over at most ``pool_size``
+    keep-alive HTTP/1.1 connections, concurrent requests beyond that wait for a free one.
+    """
+
+    def __init__(self, rpc_url: str, pool_size: int = 4, cache: HeaderCache = HEADER_CACHE, timeout: float = 30):
+        url = urlsplit(rpc_url)
+        self.ssl = ssl.create_default_context() if url.scheme == "https" else None
+        self.host = url.hostname
+        self.port = url.port or (443 if self.ssl else 80)
+        self.path = url.path or "/"
+        self.cache = cache
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.requests = 0
+        self._idle = []
+        self._slots = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def header(self, block: Union[int, str] = "latest") -> BlockHeader:
+        """Header of a block number, a block hash or a tag ("latest", "safe", "finalized", ...)."""
+        is_hash = isinstance(block, str) and len(block) == BLOCK_HASH_LENGTH
+        cached = self.cache.get(block) if isinstance(block, int) or is_hash else None
+        if cached is not None:
+            return cached
+
+        if is_hash:
+            result = await self.call("eth_getBlockByHash", [block, False])
+        else:
+            result = await self.call("eth_getBlockByNumber", [hex(block) if isinstance(block, int) else block, False])
+        if result is None:
+            raise RPCError("Unknown block {}".format(block))
+        header = BlockHeader.from_json(result)
+        self.cache.put(header)
+        return header
+
+    async def headers(self, blocks: Iterable[Union[int, str]]) -> List[BlockHeader]:
+        """Headers of ``blocks`` in the same order, fetched concurrently."""
+        return list(await asyncio.gather(*(self.header(block) for block in blocks)))
+
+    async def call(self, method: str, params: list):
+        response = await self._post({"jsonrpc": "2.0", "id": 0, "method": method, "params": params})
+        self.requests += 1
+        if "error" in response:
+            raise RPCError(response["error"])
+        return response["result"]
+
+    async def _post(self, payload) -> dict:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        body = json.dumps(payload).encode()
+        request = ("POST {} HTTP/1.1\r\nHost: {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                   "Connection: keep-alive\r\n\r\n").format(self.path, self.host, len(body)).encode() + body
+        async with self._slots:
+            for attempt in range(2):
+                reused = bool(self._idle)
+                reader, writer = self._idle.pop() if reused else await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout)
+                try:
+                    writer.write(request)
+                    status, keep_alive, data = await asyncio.wait_for(self._read_response(reader), self.timeout)
+                    break
+                except BaseException as e:
+                    # Timeouts, parse errors and cancellation leave the connection mid-response,
+                    # it never goes back to the pool
+                    writer.close()
+                    # The server may have closed an idle keep-alive connection, reconnect once
+                    if attempt or not reused or not isinstance(e, (ConnectionError, asyncio.IncompleteReadError)):
+                        raise
+            if keep_alive:
+                self._idle.append((reader, writer))
+            else:
+                writer.close()
+        if status != 200:
+            raise RPCError("HTTP {}: {}".format(status, data[:200]))
+        return json.loads(data)
+
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader):
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(head[0].split()[1])
+        headers = {}
+        for line in head[1:]:
+            if line:
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip().lower()
+
+        if headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                chunks.append(chunk[:-2])
+            data = b"".join(chunks)
+        else:
+            data = await reader.readexactly(int(headers.get("content-length", 0)))
+        keep_alive = headers.get("connection") != "close" and head[0].startswith("HTTP/1.1")
+        return status, keep_alive, data
+
+
+def get_block_header(rpc_url: str, block: Union[int, str] = "latest") -> BlockHeader:
+    """BlockMetaClient.header() for synchronous callers."""
+    return get_block_headers(rpc_url, [block])[0]
+
+
+def get_block_headers(rpc_url: str, blocks: Iterable[Union[int, str]]) -> List[BlockHeader]:
+    async def fetch():
+        async with BlockMetaClient(rpc_url) as client:
+            return await client.headers(blocks)
+
+    return asyncio.run(fetch())
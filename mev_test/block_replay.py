@@ -0,0 +1,284 @@
+"""
+Replays the transactions of a mined block on a fork of its parent.
+
+The fork gets the real BlockEnv of the block (number, timestamp, coinbase, basefee, gas
+limit, prevrandao) and the transactions run in block order, each one timed on its own with
+its gas, success or revert reason and logs recorded. The replay can stop at a transaction
+to inject our own calls into the same state and then resume:
+
+    replayer = BlockReplayer(rpc_url, 20967700)
+    replayer.run(until=victim_hash)          # victim included
+    weth.transfer(pair, amount, caller=MY_ADDR)
+    report = replayer.run()                  # rest of the block
+    replayer.compare_receipts()
+
+pyrevm's message_call checks the sender can pay gas * gasPrice but charges nothing and
+leaves the nonce alone, so both are settled after every transaction: the sender pays
+gas used * effective gas price and gets its nonce bumped (contract creations land at their
+real addresses), the coinbase gets the priority fee, the base fee is burnt.
+
+    python block_replay.py --block 20967700 --compare
+"""
+import argparse
+import re
+import time
+from typing import Dict, List, Optional, Union
+
+from pyrevm import EVM, AccountInfo, BlockEnv
+
+from block_meta import BlockHeader
+from multicall import revert_reason
+from rpc_client import BatchRPCClient, RPCError
+from simulator import Simulator
+
+REVERT_OUTPUT = re.compile(r"output: 0x([0-9a-fA-F]*)")
+
+
+def block_env(header: BlockHeader) -> BlockEnv:
+    prevrandao = bytes.fromhex(header.prevrandao[2:]) if header.prevrandao else None
+    return BlockEnv(number=header.number, coinbase=header.coinbase, timestamp=header.timestamp,
+                    prevrandao=prevrandao, basefee=header.base_fee or 0, gas_limit=header.gas_limit)
+
+
+def normalize_log(address: str, topics: list, data: Union[str, bytes]) -> tuple:
+    """(address, topics, data) in lowercase hex, the same for a pyrevm Log and a receipt log."""
+    data = data if isinstance(data, str) else "0x" + data.hex()
+    return address.lower(), tuple(topic.lower() for topic in topics), data.lower()
+
+
+class ReplayedTx:
+    def __init__(self, tx_hash: str, index: int, success: bool, reason: str, gas_used: int, logs: List[tuple],
+                 elapsed: float, error: Optional[str] = None):
+        self.tx_hash = tx_hash
+        self.index = index
+        self.success = success
+        self.reason = reason
+        self.gas_used = gas_used
+        self.logs = logs
+        self.elapsed = elapsed
+        self.error = error
+        # Filled in by BlockReplayer.compare_receipts()
+        self.receipt_success = None
+        self.receipt_gas_used = None
+        self.logs_match = None
+
+    @property
+    def gas_matches(self) -> Optional[bool]:
+        if self.receipt_gas_used is None:
+            return None
+        return self.gas_used == self.receipt_gas_used
+
+    @property
+    def matches_receipt(self) -> Optional[bool]:
+        if self.logs_match is None:
+            return None
+        return self.logs_match and self.success == self.receipt_success and self.gas_matches
+
+    def __repr__(self):
+        return "ReplayedTx(index={}, hash={}, success={}, gas_used={})".format(self.index, self.tx_hash,
+                                                                            self.success, self.gas_used)
+
+
+class ReplayReport:
+    def __init__(self, block_number: int, txs: List[ReplayedTx], elapsed: float):
+        self.block_number = block_number
+        self.txs = txs
+        # Wall time of the whole run, the execution time alone is the sum of the tx times
+        self.elapsed = elapsed
+
+    @property
+    def execution_time(self) -> float:
+        return sum(tx.elapsed for tx in self.txs)
+
+    @property
+    def gas_used(self) -> int:
+        return sum(tx.gas_used for tx in self.txs)
+
+    @property
+    def tx_per_second(self) -> float:
+        return len(self.txs) / self.execution_time if self.execution_time else 0.0
+
+    @property
+    def gas_per_second(self) -> float:
+        return self.gas_used / self.execution_time if self.execution_time else 0.0
+
+    @property
+    def failed(self) -> List[ReplayedTx]:
+        return [tx for tx in self.txs if not tx.success]
+
+    @property
+    def mismatched(self) -> List[ReplayedTx]:
+        return [tx for tx in self.txs if tx.matches_receipt is False]
+
+    def summary(self) -> str:
+        return "Block {}: {} txs ({} failed) in {:.3f}s, {:.1f} tx/s, {:.2f} Mgas/s".format(
+            self.block_number, len(self.txs), len(self.failed), self.execution_time, self.tx_per_second,
+            self.gas_per_second / 1e6)
+
+
+class BlockReplayer:
+    """
+    Fork of the parent of ``block`` (a number or a hash) with the block's env set, ready to
+    run its transactions. ``evm`` replaces the fork, it must already hold the parent state.
+    """
+
+    def __init__(self, rpc_url: str, block: Union[int, str], evm: Optional[EVM] = None, tracing: bool = False):
+        self.client = BatchRPCClient(rpc_url)
+        if isinstance(block, str) and block.startswith("0x") and len(block) == 66:
+            block_json = self.client.call("eth_getBlockByHash", [block, True])
+        else:
+            block_json = self.client.call("eth_getBlockByNumber", [hex(block) if isinstance(block, int) else block, True])
+        if block_json is None:
+            raise RPCError("Unknown block {}".format(block))
+        self.header = BlockHeader.from_json(block_json)
+        self.transactions = block_json["transactions"]
+        if evm is None:
+            evm = Simulator(EVM(fork_url=rpc_url, fork_block=self.header.parent_hash, tracing=tracing))
+        self.evm = evm
+        self.evm.set_block_env(block_env(self.header))
+        self.position = 0
+        self.results: List[ReplayedTx] = []
+
+    def index_of(self, tx_hash: str) -> int:
+        for index, tx in enumerate(self.transactions):
+            if tx["hash"].lower() == tx_hash.lower():
+                return index
+        raise ValueError("{} is not in block {}".format(tx_hash, self.header.number))
+
+    def execute(self, tx: dict) -> ReplayedTx:
+        """Runs one transaction (eth_getBlockByNumber/eth_getTransactionByHash JSON) on the current state."""
+        sender, value, gas = tx["from"], int(tx["value"], 16), int(tx["gas"], 16)
+        calldata = bytes.fromhex(tx["input"][2:])
+        gas_price = self.gas_price(tx)
+        error = None
+        start = time.perf_counter()
+        try:
+            if tx.get("to"):
+                self.evm.message_call(sender, tx["to"], calldata, value=value, gas=gas, gas_price=gas_price)
+            else:
+                self.evm.deploy(sender, calldata, value=value, gas=gas, gas_price=gas_price)
+            elapsed = time.perf_counter() - start
+        except RuntimeError as e:
+            elapsed = time.perf_counter() - start
+            error = str(e)
+        # Invalid transactions (funds, gas limit, ...) are refused before execution and leave
+        # the result of the previous transaction in place
+        executed = error is None or error.startswith(("Revert", "Halt"))
+        result = self.evm.result if executed else None
+
+        # An invalid transaction still gets its nonce used, for the next ones of the sender
+        self.settle(sender, int(tx["nonce"], 16), result.gas_used if result else 0, gas_price)
+
+        if result is None:
+            return ReplayedTx(tx["hash"], int(tx["transactionIndex"], 16), False, "Invalid", 0, [], elapsed, error)
+        reason = result.reason
+        if error and error.startswith("Revert"):
+            output = REVERT_OUTPUT.search(error)
+            reason = revert_reason(bytes.fromhex(output.group(1)) if output else b"")
+        logs = [normalize_log(log.address, log.topics, log.data[1]) for log in result.logs] if result.is_success else []
+        return ReplayedTx(tx["hash"], int(tx["transactionIndex"], 16), result.is_success, reason, result.gas_used,
+                          logs, elapsed, error)
+
+    def gas_price(self, tx: dict) -> int:
+        """Effective gas price of ``tx``, what the sender paid per unit of gas."""
+        if tx.get("maxFeePerGas") is not None and tx.get("gasPrice") is None:
+            # Not in the mined block JSON, which carries the effective price as gasPrice
+            max_fee, tip = int(tx["maxFeePerGas"], 16), int(tx.get("maxPriorityFeePerGas") or "0x0", 16)
+            return min(max_fee, (self.header.base_fee or 0) + tip)
+        return int(tx.get("gasPrice") or "0x0", 16)
+
+    def settle(self, sender: str, nonce: int, gas_used: int, gas_price: int):
+        """
+        What pyrevm leaves out of an executed transaction: the sender's nonce and its gas
+        payment, the priority fee of the coinbase. insert_account_info keeps the storage.
+        """
+        info = self.evm.basic(sender)
+        self.evm.insert_account_info(sender, AccountInfo(balance=info.balance - gas_used * gas_price,
+                                                         nonce=max(info.nonce, nonce + 1), code=info.code))
+        tip = (gas_price - (self.header.base_fee or 0)) * gas_used
+        if tip > 0:
+            coinbase = self.evm.basic(self.header.coinbase)
+            self.evm.insert_account_info(self.header.coinbase, AccountInfo(
+                balance=coinbase.balance + tip, nonce=coinbase.nonce, code=coinbase.code))
+
+    def run(self, until: Optional[str] = None, inclusive: bool = True, on_tx=None) -> ReplayReport:
+        """
+        Runs the transactions from the current position to the end of the block, or up to the
+        ``until`` hash (included unless ``inclusive`` is False). ``on_tx(ReplayedTx)`` is called
+        after every transaction. Returns the report of the transactions run by this call.
+        """
+        end = len(self.transactions)
+        if until is not None:
+            end = self.index_of(until) + (1 if inclusive else 0)
+        start = time.perf_counter()
+        replayed = []
+        while self.position < end:
+            result = self.execute(self.transactions[self.position])
+            self.position += 1
+            replayed.append(result)
+            if on_tx:
+                on_tx(result)
+        self.results.extend(replayed)
+        return ReplayReport(self.header.number, replayed, time.perf_counter() - start)
+
+    def report(self) -> ReplayReport:
+        """Report of every transaction replayed so far."""
+        return ReplayReport(self.header.number, list(self.results), sum(tx.elapsed for tx in self.results))
+
+    def receipts(self) -> Dict[str, dict]:
+        try:
+            receipts = self.client.call("eth_getBlockReceipts", [hex(self.header.number)])
+        except RPCError:
+            # Older nodes: one eth_getTransactionReceipt per transaction, in one batch
+            receipts = self.client.batch([("eth_getTransactionReceipt", [tx["hash"]]) for tx in self.transactions])
+            receipts = [receipt for receipt in receipts if not isinstance(receipt, RPCError) and receipt]
+        return {receipt["transactionHash"].lower(): receipt for receipt in receipts or []}
+
+    def compare_receipts(self) -> List[ReplayedTx]:
+        """Checks the replayed transactions against the mined receipts, returns the ones that differ."""
+        receipts = self.receipts()
+        for result in self.results:
+            receipt = receipts.get(result.tx_hash.lower())
+            if receipt is None:
+                continue
+            result.receipt_success = int(receipt["status"], 16) == 1
+            result.receipt_gas_used = int(receipt["gasUsed"], 16)
+            result.logs_match = result.logs == [normalize_log(log["address"], log["topics"], log["data"])
+                                                for log in receipt["logs"]]
+        return [result for result in self.results if result.matches_receipt is False]
+
+
+def get_args() -> argparse.Namespace:
+    parse = argparse.ArgumentParser()
+    parse.add_argument('--rpc_url', default='http://192.168.1.58:8545')
+    parse.add_argument('--block', required=True, help='Block number or hash to replay')
+    parse.add_argument('--until', help='Stop after this transaction hash')
+    parse.add_argument('--compare', action='store_true', help='Compare status, gas used and logs with the mined receipts')
+    parse.add_argument('--verbose', action='store_true', help='Print every transaction')
+    return parse.parse_args()
+
+
+def main():
+    args = get_args()
+    block = args.block if args.block.startswith("0x") else int(args.block)
+    replayer = BlockReplayer(args.rpc_url, block)
+
+    def on_tx(result: ReplayedTx):
+        if args.verbose:
+            print("{:>4} {} {:<8} gas {:>9} logs {:>3} {:.2f}ms {}".format(
+                result.index, result.tx_hash, "OK" if result.success else "FAILED", result.gas_used,
+                len(result.logs), result.elapsed * 1000, "" if result.success else result.reason))
+
+    report = replayer.run(until=args.until, on_tx=on_tx)
+    if args.compare:
+        mismatched = replayer.compare_receipts()
+        for result in mismatched:
+            print("Mismatch {} {}: success {} (mined {}), gas {} (mined {}), {} logs{}".format(
+                result.index, result.tx_hash, result.success, result.receipt_success, result.gas_used,
+                result.receipt_gas_used, len(result.logs), "" if result.logs_match else " (differ)"))
+        print("{} of {} transactions match their receipt".format(len(report.txs) - len(mismatched), len(report.txs)))
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
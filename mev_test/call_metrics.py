@@ -0,0 +1,217 @@
+"""
+Opt-in timing of Contract.call_function per (contract, function).
+
+Every call is split in three phases: ``encode`` (argument checks and ABI encoding),
+``execute`` (the message_call, including the state a fork fetches lazily over RPC during
+the call) and ``decode``. Each phase gets a latency histogram with fixed buckets, so a
+record is a bisect and a few integer additions. Every thread records into its own table
+without a lock, the tables are merged when the metrics are read.
+
+Disabled by default: call_function then only checks that ``active`` is None.
+
+    metrics = call_metrics.enable()
+    ...
+    print(metrics.summary())
+    metrics.write_prometheus("contract_calls.prom")
+    call_metrics.disable()
+"""
+import os
+import tempfile
+import threading
+from bisect import bisect_left
+from typing import Dict, Optional, Tuple
+
+PHASES = ("encode", "execute", "decode")
+# Upper bounds in seconds, the last bucket is +Inf
+BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def cumulative(self) -> list:
+        """``[(upper bound, calls at or under it)]``, the last bound is +Inf."""
+        total, buckets = 0, []
+        for bound, count in zip(BUCKETS + (float("inf"),), self.counts):
+            total += count
+            buckets.append((bound, total))
+        return buckets
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile, 0.0 without observations."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+        return float("inf")
+
+    def as_dict(self) -> dict:
+        return {"count": self.count, "sum": self.sum,
+                "buckets": [["+Inf" if bound == float("inf") else bound, total] for bound, total in self.cumulative()]}
+
+
+class CallStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.histograms = tuple(Histogram() for _ in PHASES)
+
+    @property
+    def phases(self) -> Dict[str, Histogram]:
+        return dict(zip(PHASES, self.histograms))
+
+    def merge(self, other: "CallStats"):
+        self.calls += other.calls
+        self.errors += other.errors
+        for histogram, added in zip(self.histograms, other.histograms):
+            histogram.counts = [a + b for a, b in zip(histogram.counts, added.counts)]
+            histogram.sum += added.sum
+            histogram.count += added.count
+
+    def as_dict(self) -> dict:
+        return {"calls": self.calls, "errors": self.errors,
+                "phases": {phase: histogram.as_dict() for phase, histogram in self.phases.items()}}
+
+
+class CallMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # One {(contract, function): CallStats} table per recording thread
+        self._tables = []
+
+    def _table(self) -> Dict[Tuple[str, str], CallStats]:
+        table = dict()
+        self._local.table = table
+        with self._lock:
+            self._tables.append(table)
+        return table
+
+    def record(self, contract: str, function: str, encode: float, execute: Optional[float] = None,
+               decode: Optional[float] = None, error: bool = False):
+        """
+        One call of ``function`` on ``contract``. Phases a failed call did not reach are
+        None and not observed.
+        """
+        try:
+            table = self._local.table
+        except AttributeError:
+            table = self._table()
+        key = (contract, function)
+        stats = table.get(key)
+        if stats is None:
+            stats = table[key] = CallStats()
+        stats.calls += 1
+        if error:
+            stats.errors += 1
+        # Histogram.observe() inlined, this runs on every call
+        encode_histogram, execute_histogram, decode_histogram = stats.histograms
+        encode_histogram.counts[bisect_left(BUCKETS, encode)] += 1
+        encode_histogram.sum += encode
+        encode_histogram.count += 1
+        if execute is not None:
+            execute_histogram.counts[bisect_left(BUCKETS, execute)] += 1
+            execute_histogram.sum += execute
+            execute_histogram.count += 1
+        if decode is not None:
+            decode_histogram.counts[bisect_left(BUCKETS, decode)] += 1
+            decode_histogram.sum += decode
+            decode_histogram.count += 1
+
+    def reset(self):
+        with self._lock:
+            for table in self._tables:
+                table.clear()
+
+    def _merged(self) -> Dict[Tuple[str, str], CallStats]:
+        merged = dict()
+        with self._lock:
+            for table in self._tables:
+                # Other threads may be adding keys meanwhile
+                for key, stats in list(table.items()):
+                    merged.setdefault(key, CallStats()).merge(stats)
+        return merged
+
+    def snapshot(self) -> dict:
+        """``{contract: {function: CallStats.as_dict()}}``, a copy safe to keep or dump as JSON."""
+        snapshot = {}
+        for (contract, function), stats in self._merged().items():
+            snapshot.setdefault(contract, {})[function] = stats.as_dict()
+        return snapshot
+
+    def prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        items = sorted(self._merged().items())
+        lines = ["# HELP contract_calls_total Contract.call_function calls.",
+                 "# TYPE contract_calls_total counter"]
+        lines += ['contract_calls_total{{{}}} {}'.format(_labels(key), stats.calls) for key, stats in items]
+        lines += ["# HELP contract_call_errors_total Contract.call_function calls that raised.",
+                  "# TYPE contract_call_errors_total counter"]
+        lines += ['contract_call_errors_total{{{}}} {}'.format(_labels(key), stats.errors) for key, stats in items]
+        lines += ["# HELP contract_call_seconds Time per Contract.call_function phase.",
+                  "# TYPE contract_call_seconds histogram"]
+        for key, stats in items:
+            for phase, histogram in stats.phases.items():
+                labels = _labels(key) + ',phase="{}"'.format(phase)
+                for bound, total in histogram.cumulative():
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append('contract_call_seconds_bucket{{{},le="{}"}} {}'.format(labels, le, total))
+                lines.append('contract_call_seconds_sum{{{}}} {!r}'.format(labels, histogram.sum))
+                lines.append('contract_call_seconds_count{{{}}} {}'.format(labels, histogram.count))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Writes prometheus() to ``path`` atomically, for node_exporter's textfile collector."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+    def summary(self, limit: int = 20) -> str:
+        """The ``limit`` functions with the most total time, one line each with p50/p99 per phase."""
+        items = sorted(self._merged().items(), key=lambda item: -sum(h.sum for h in item[1].histograms))
+        lines = []
+        for (contract, function), stats in items[:limit]:
+            phases = "  ".join("{} {:.1f}ms p50<={:g}s p99<={:g}s".format(
+                phase, histogram.sum * 1000, histogram.quantile(0.5), histogram.quantile(0.99))
+                for phase, histogram in stats.phases.items())
+            lines.append("{} {} calls: {} errors: {}  {}".format(contract, function, stats.calls, stats.errors,
+                                                                 phases))
+        return "\n".join(lines)
+
+
+def _labels(key: Tuple[str, str]) -> str:
+    contract, function = key
+    return 'contract="{}",function="{}"'.format(_escape(contract), _escape(function))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# The CallMetrics Contract.call_function records into, None when disabled
+active: Optional[CallMetrics] = None
+
+
+def enable(metrics: Optional[CallMetrics] = None) -> CallMetrics:
+    """Starts recording into ``metrics``, the active CallMetrics or a new one, and returns it."""
+    global active
+    active = metrics or active or CallMetrics()
+    return active
+
+
+def disable():
+    global active
+    active = None
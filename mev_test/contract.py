@@ -1,6 +1,9 @@
-import json
+from time import perf_counter
+
 from pyrevm import EVM
-from abi import ABIFunction, ContractABI, parse_json_abi
+
+import call_metrics
+from abi import ABIFunction, ContractABI, parse_json_abi, load_abi_file
 
 ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
 
@@ -19,6 +22,7 @@ class Contract:
         self.address = address
         self.caller = caller
         self.revm = revm
+        self._bound = dict()
 
         if contract_abi:
             self.abi = contract_abi
@@ -26,52 +30,90 @@ class Contract:
             self.abi = self._load_abi(abi, abi_file_path)
 
     def __getattr__(self, attribute):
-        for func in self.abi.functions:
-            if func.name == attribute or func.selector == attribute:
-                return lambda *args, **kwargs: self.call_function(func, args, kwargs)
-        raise AttributeError(f"No function named {attribute} in contract ABI")
+        if attribute.startswith("__") or attribute in ("abi", "_bound"):
+            raise AttributeError(attribute)
+        bound = self._bind(attribute)
+        if bound is None:
+            raise AttributeError(f"No function named {attribute} in contract ABI")
+        # Cache on the instance so the next access never reaches __getattr__
+        self.__dict__[attribute] = bound
+        return bound
 
     def __getitem__(self, identifier):
-        identifier = identifier.lstrip("0x")
-        for func in self.abi.functions:
-            if identifier in [func.name, func.get_selector().hex()]:
-                return lambda *args, **kwargs: self.call_function(func, args, kwargs)
-        raise AttributeError(
-            f"No function with identifier {identifier} in contract ABI"
-        )
+        bound = self._bound.get(identifier)
+        if bound is None:
+            bound = self._bind(identifier)
+            if bound is None:
+                raise AttributeError(
+                    f"No function with identifier {identifier} in contract ABI"
+                )
+            self._bound[identifier] = bound
+        return bound
+
+    def _bind(self, identifier: str):
+        candidates = self.abi.find(identifier)
+        if not candidates:
+            return None
+
+        if len(candidates) == 1:
+            func = candidates[0]
+            return lambda *args, **kwargs: self.call_function(func, args, kwargs)
+
+        resolve = self.abi.resolve_overload
+        return lambda *args, **kwargs: self.call_function(resolve(candidates, args), args, kwargs)
 
     def _load_abi(self, abi: dict = None, file_path: dict = None) -> ContractABI:
         if not abi and not file_path:
             raise ValueError("Either abi or abi_file_path must be provided")
 
         if file_path:
-            with open(file_path, "r") as file:
-                abi = json.load(file)
+            # Shared across all contracts using the same ABI file
+            return load_abi_file(file_path)
 
         return parse_json_abi(abi)
 
     def call_function(self, func: ABIFunction, args: tuple, kwargs: dict = {}):
-        value = kwargs.get("value", 0)
-        caller = kwargs.get("caller", self.caller)
-        ignore_outputs = kwargs.get("ignore_outputs", False)
-        calldata = func.encode_inputs(args)
-
-        if not func.payable and value > 0:
-            raise ValueError("Cannot send value to a non-payable function")
-
-        if not func.constant and caller == ZERO_ADDRESS:
-            raise ValueError("Cannot call a non-constant function without a caller")
-
-        raw_output = self.revm.message_call(
-            caller=caller,
-            to=self.address,
-            calldata=calldata,
-            value=value,
-            is_static=func.constant,
-        )
-
-        if not ignore_outputs:
-            return func.decode_outputs(raw_output)
+        metrics = call_metrics.active
+        # With call metrics enabled: the start of every phase reached so far
+        times = None if metrics is None else [perf_counter()]
+        try:
+            value = kwargs.get("value", 0)
+            caller = kwargs.get("caller", self.caller)
+            ignore_outputs = kwargs.get("ignore_outputs", False)
+            calldata = func.encode_inputs(args)
+
+            if not func.payable and value > 0:
+                raise ValueError("Cannot send value to a non-payable function")
+
+            if not func.constant and caller == ZERO_ADDRESS:
+                raise ValueError("Cannot call a non-constant function without a caller")
+
+            if times is not None:
+                times.append(perf_counter())
+            raw_output = self.revm.message_call(
+                caller=caller,
+                to=self.address,
+                calldata=calldata,
+                value=value,
+                is_static=func.constant,
+            )
+            if times is not None:
+                times.append(perf_counter())
+
+            output = None if ignore_outputs else func.decode_outputs(raw_output)
+        except BaseException as e:
+            # pyrevm panics are raised as BaseException, they count as errors too
+            if times is not None and not isinstance(e, (KeyboardInterrupt, SystemExit)):
+                self._record_call(metrics, func, times, error=True)
+            raise
+        if times is not None:
+            self._record_call(metrics, func, times)
+        return output
+
+    def _record_call(self, metrics: "call_metrics.CallMetrics", func: ABIFunction, times: list, error: bool = False):
+        times.append(perf_counter())
+        function = func.get_signature() if func.name else func.selector
+        metrics.record(self.address, function, *(end - start for start, end in zip(times, times[1:])), error=error)
 
     def balance(self):
         return self.revm.get_balance(self.address)
\ No newline at end of file
@@ -0,0 +1,402 @@
+import argparse
+import time
+
+from pyrevm import EVM, AccountInfo, BlockEnv
+
+import call_metrics
+from block_meta import get_block_header
+from contract import Contract
+from fee_models import buy_fees, get_model, init_fees, sell_fees, transfer_fees
+from fork_cache import ForkStateCache
+from multicall import Multicall
+from pair_swap import PairSwapper
+from prefetch import Prefetcher
+from result_sink import FORMATS, ResultSink, make_record
+from simulator import Simulator
+from uniswap_v2 import WETH_ADDR
+from v2_math import get_amount_out
+
+MY_ADDR = "0xd8dA6BF26964aF9D7eEd9e03E53415D37aA96045"  # vitalik.eth
+BOT_ADDR = "0x66B8a48DD0A0F42A4f0cb8286ED796D41E664f07"  # vitalik.eth
+
+BUY_AMOUNT = 1000000000
+
+# Probe matrix: buy sizes as a fraction of the pair's WETH reserve, transfer sizes as a
+# fraction of the tokens bought in the warm-up swap
+PROBE_BUY_FRACTIONS = (0.00001, 0.001, 0.01, 0.05)
+PROBE_WARM_FRACTION = 0.01
+PROBE_TRANSFER_FRACTIONS = (0.01, 0.1, 0.5)
+
+# (below, above, tolerance below, tolerance between, tolerance above) on the expected amount,
+# covers the integer division of the fee by the token contract
+TOLERANCES = {
+    "buy": (10_000, 1_000_000, 0.01, 0.001, 0.0001),
+    "transfer": (10_000, 1_000_000, 0.001, 0.00001, 0.000001),
+    "sell": (10_000, 1_000_000, 0.01, 0.001, 0.0001),
+}
+
+
+class FeeCheckResult:
+    has_v2_pair: bool = True
+    buy_fee: float = 0.0
+    transfer_fee: float = 0.0
+    sell_fee: float = 0.0
+    buy_status: str = ""
+    transfer_status: str = ""
+    sell_status: str = ""
+
+
+# Expected fee table and tolerance kind of each probe scenario
+PROBE_KINDS = {
+    "buy": "buy",
+    "wallet->wallet": "transfer",
+    "wallet->pair": "sell",
+    # A transfer out of the pair is what a buy looks like to the token: the buy fee applies
+    "pair->wallet": "buy",
+    "owner->wallet": "transfer",
+}
+
+
+class FeeProbe:
+    def __init__(self, scenario: str, amount: int, fee: float = None, error: str = None,
+                 sent: int = None, received: int = None):
+        self.scenario = scenario
+        self.amount = amount
+        self.fee = fee
+        self.error = error
+        self.sent = sent
+        self.received = received
+        self.status = ""
+
+
+class FeeTable:
+    """
+    Fees measured by probe_token, one row per (scenario, amount). format() marks with a "!"
+    the probes that do not match the token's fee model.
+    """
+
+    def __init__(self):
+        self.probes = []
+
+    def add(self, probe: FeeProbe):
+        self.probes.append(probe)
+
+    def fees(self, scenario: str) -> dict:
+        return {probe.amount: probe.fee for probe in self.probes if probe.scenario == scenario}
+
+    def check_expected(self, address: str):
+        """Sets the status of every probe against the known fee model, one pass per scenario."""
+        tables = {"buy": buy_fees, "transfer": transfer_fees, "sell": sell_fees}
+        for scenario, kind in PROBE_KINDS.items():
+            probes = [probe for probe in self.probes if probe.scenario == scenario and probe.error is None]
+            if not probes:
+                continue
+            expected = get_model(tables[kind], address).transfer_many([probe.sent for probe in probes])
+            for probe, expected_amount in zip(probes, expected):
+                probe.status = fee_status(kind, int(expected_amount), probe.received)
+
+    def format(self) -> str:
+        lines = []
+        for scenario in dict.fromkeys(probe.scenario for probe in self.probes):
+            cells = []
+            for probe in self.probes:
+                if probe.scenario == scenario:
+                    value = "{:.2f}%".format(probe.fee) if probe.error is None else "ERR"
+                    if probe.status not in ("", "OK"):
+                        value += "!"
+                    cells.append("{}@{:.3g}".format(value, probe.amount))
+            lines.append("    {:<16} {}".format(scenario, "  ".join(cells)))
+        return "\n".join(lines)
+
+
+def get_args() -> argparse.Namespace:
+    parse = argparse.ArgumentParser()
+    parse.add_argument('--rpc_url', default='http://192.168.1.58:8545')
+    parse.add_argument('--file_path')
+    parse.add_argument('--isolate', action='store_true',
+                       help='Revert to the state after the WETH setup after each token')
+    parse.add_argument('--state_cache',
+                       help='SQLite file caching the forked state per block hash (implies --prefetch, '
+                            'storage is only cached from the prefetched slots)')
+    parse.add_argument('--prefetch', action='store_true',
+                       help='Fetch the state of the next tokens in JSON-RPC batches while simulating')
+    parse.add_argument('--matrix', action='store_true',
+                       help='Probe several amounts and sender/recipient kinds per token (implies --isolate)')
+    parse.add_argument('--output', help='Stream one record per token to this file (.jsonl, .csv or .parquet)')
+    parse.add_argument('--output_format', choices=FORMATS, help='Defaults to the --output extension')
+    parse.add_argument('--metrics', help='Time every contract call per phase, written to this file in the '
+                                          'Prometheus text format at the end')
+    args = parse.parse_args()
+    if args.matrix and args.output:
+        # One record per token has no place for a probe matrix, the tables are only printed
+        parse.error("--output cannot be used with --matrix")
+    if args.state_cache:
+        args.prefetch = True
+    return args
+
+
+def fee_rate(sent: int, received: int) -> float:
+    return (sent - received) * 100 / sent if sent > 0 and received < sent else 0.0
+
+
+def fee_status(kind: str, expected: int, actual: int) -> str:
+    below, above, tolerance_below, tolerance_between, tolerance_above = TOLERANCES[kind]
+    if expected < below:
+        tolerance = tolerance_below
+    elif expected > above:
+        tolerance = tolerance_above
+    else:
+        tolerance = tolerance_between
+    relative_diff = abs(expected - actual) / expected if expected > 0 else 0
+    return "WRONG_FEE" if relative_diff > tolerance else "OK"
+
+
+def read_pair(token: Contract, pair: Contract) -> tuple:
+    """``(reserve0, reserve1, token balance of the pair)`` in one aggregated call."""
+    batch = Multicall(token.revm)
+    batch.add(pair, "getReserves")
+    batch.add(token, "balanceOf", pair.address)
+    (reserve0, reserve1, _), balance = batch.values()
+    return reserve0, reserve1, balance
+
+
+def check_token(weth: Contract, token: Contract, swapper: PairSwapper, amount_in: int = BUY_AMOUNT) -> FeeCheckResult:
+    """
+    Measures the buy, transfer and sell fee of ``token`` in one pass:
+    WETH -> token through the pair to MY_ADDR, 99% of it from MY_ADDR to BOT_ADDR, then
+    99% of that sold by BOT_ADDR back to WETH, all directly through the pair.
+    """
+    check_result = FeeCheckResult()
+
+    if 0 in swapper.reserves(weth.address, token.address):
+        check_result.has_v2_pair = False
+        return check_result
+
+    # Buy
+    current_balance = token.balanceOf(MY_ADDR)
+    try:
+        amount_out = swapper.swap_exact_in(weth, token.address, amount_in, MY_ADDR, caller=MY_ADDR)
+    except Exception as e:
+        print(f"Token {token.address} swap failed: {e}")
+        check_result.buy_status = "BUY_FAILED"
+        return check_result
+
+    bought = token.balanceOf(MY_ADDR) - current_balance
+    check_result.buy_fee = fee_rate(amount_out, bought)
+    check_result.buy_status = fee_status("buy", get_model(buy_fees, token.address).transfer(amount_out), bought)
+
+    # Wallet to wallet transfer, don't transfer the full balance
+    transfer_amount = int(bought * 99 / 100)
+    old_bot_balance = token.balanceOf(BOT_ADDR)
+    token.transfer(BOT_ADDR, transfer_amount, caller=MY_ADDR)
+    transferred = token.balanceOf(BOT_ADDR) - old_bot_balance
+    check_result.transfer_fee = fee_rate(transfer_amount, transferred)
+    check_result.transfer_status = fee_status(
+        "transfer", get_model(transfer_fees, token.address).transfer(transfer_amount), transferred)
+
+    # Sell through the pair: what the pair holds above its reserves after the transfer is what it received,
+    # even when the token swaps its collected fees on the same pair during the transfer
+    sell_amount = int(transferred * 99 / 100)
+    pair = swapper.pair(weth.address, token.address)
+    try:
+        token.transfer(pair.address, sell_amount, caller=BOT_ADDR)
+    except Exception as e:
+        print(f"Token {token.address} sell failed: {e}")
+        check_result.sell_status = "SELL_BLOCKED"
+        return check_result
+
+    reserve0, reserve1, pair_balance = read_pair(token, pair)
+    token_is_token0 = token.address.lower() < weth.address.lower()
+    reserve_token, reserve_weth = (reserve0, reserve1) if token_is_token0 else (reserve1, reserve0)
+    sold = pair_balance - reserve_token
+    check_result.sell_fee = fee_rate(sell_amount, sold)
+    check_result.sell_status = fee_status("sell", get_model(sell_fees, token.address).transfer(sell_amount), sold)
+
+    weth_out = get_amount_out(sold, reserve_token, reserve_weth)
+    try:
+        pair.swap(0 if token_is_token0 else weth_out, weth_out if token_is_token0 else 0, BOT_ADDR, b'',
+                  caller=BOT_ADDR)
+    except Exception as e:
+        print(f"Token {token.address} pair swap failed: {e}")
+        check_result.sell_status = "SWAP_FAILED"
+
+    return check_result
+
+
+def probe_token(sim: Simulator, weth: Contract, token: Contract, swapper: PairSwapper) -> FeeTable:
+    """
+    Fee matrix of ``token``: buys of several sizes spread across the pair's WETH reserve,
+    and transfers of several sizes wallet -> wallet, wallet -> pair, pair -> wallet and
+    owner -> wallet (owners are often fee exempt). pair -> wallet is a buy without the swap,
+    it is checked against the buy fee model.
+
+    Every probe is a branch of one shared state: the buys branch off the state before the
+    warm-up swap, the transfers off the state right after it. Nothing is swapped twice.
+    """
+    table = FeeTable()
+    pair = swapper.pair(weth.address, token.address)
+    token_is_token0 = token.address.lower() < weth.address.lower()
+
+    def pair_surplus():
+        # Tokens the pair holds above its reserves, i.e. what it received since the last sync
+        reserve0, reserve1, balance = read_pair(token, pair)
+        return balance - (reserve0 if token_is_token0 else reserve1)
+
+    def buy(amount):
+        balance = token.balanceOf(MY_ADDR)
+        amount_out = swapper.swap_exact_in(weth, token.address, amount, MY_ADDR, caller=MY_ADDR)
+        return amount_out, token.balanceOf(MY_ADDR) - balance
+
+    def transfer(sender, recipient, amount):
+        balance = token.balanceOf(recipient)
+        token.transfer(recipient, amount, caller=sender)
+        return amount, token.balanceOf(recipient) - balance
+
+    def transfer_to_pair(amount):
+        surplus = pair_surplus()
+        token.transfer(pair.address, amount, caller=MY_ADDR)
+        return amount, pair_surplus() - surplus
+
+    def from_pair(amount):
+        # pyrevm rejects callers with code (EIP-3607), so the pair sends without its code. Nothing
+        # calls the pair during the transfer: tokens skip their swap-back when the pair is the sender.
+        # insert_account_info is not journaled, the code is put back by hand
+        info = sim.basic(pair.address)
+        sim.insert_account_info(pair.address, AccountInfo(balance=info.balance, nonce=info.nonce))
+        try:
+            return transfer(pair.address, BOT_ADDR, amount)
+        finally:
+            sim.insert_account_info(pair.address, AccountInfo(balance=info.balance, nonce=info.nonce,
+                                                               code=info.code))
+
+    def from_owner(amount):
+        owner = token.owner()
+        balance = token.balanceOf(owner)
+        token.transfer(owner, amount, caller=MY_ADDR)
+        funded = token.balanceOf(owner) - balance
+        return transfer(owner, BOT_ADDR, funded)
+
+    def run(scenario, amount, probe):
+        with sim.isolated():
+            try:
+                sent, received = probe(amount)
+                table.add(FeeProbe(scenario, amount, fee=fee_rate(sent, received), sent=sent, received=received))
+            except Exception as e:
+                table.add(FeeProbe(scenario, amount, error="{}: {}".format(type(e).__name__, e)))
+
+    with sim.isolated():
+        reserve0, reserve1, _ = pair.getReserves()
+        reserve_weth = reserve1 if token_is_token0 else reserve0
+        if reserve_weth == 0:
+            return table
+
+        weth_balance = weth.balanceOf(MY_ADDR)
+        for fraction in PROBE_BUY_FRACTIONS:
+            amount = min(max(int(reserve_weth * fraction), 1000), weth_balance)
+            run("buy", amount, buy)
+
+        # Warm-up swap, the transfer probes branch off the state after it
+        _, bought = buy(min(max(int(reserve_weth * PROBE_WARM_FRACTION), 1000), weth_balance))
+        for fraction in PROBE_TRANSFER_FRACTIONS:
+            amount = int(bought * fraction)
+            run("wallet->wallet", amount, lambda amount: transfer(MY_ADDR, BOT_ADDR, amount))
+            run("wallet->pair", amount, transfer_to_pair)
+            run("pair->wallet", amount, from_pair)
+            run("owner->wallet", amount, from_owner)
+
+    table.check_expected(token.address)
+    return table
+
+
+def setup_contract(evm, file_path):
+    contracts = dict()
+    token_contracts = dict()
+
+    contracts["WETH"] = Contract(address=WETH_ADDR, revm=evm, abi_file_path="./abi/weth.abi")
+
+    with open(file_path) as f:
+        for line in f.readlines():
+            token = line[0: 42].rstrip()
+            name = line[43:].rstrip()
+            token_contracts[name] = Contract(address=token, revm=evm, abi_file_path="./abi/erc20.abi")
+
+    return contracts, token_contracts
+
+
+def format_result(result: FeeCheckResult) -> str:
+    return "    V2Pair: {}, Buy Fee: {:.1f}% ({}), Transfer Fee: {:.1f}% ({}), Sell Fee: {:.1f}% ({})".format(
+        result.has_v2_pair, result.buy_fee, result.buy_status, result.transfer_fee, result.transfer_status,
+        result.sell_fee, result.sell_status)
+
+
+def main():
+    args = get_args()
+    metrics = call_metrics.enable() if args.metrics else None
+    block = get_block_header(args.rpc_url)
+    parent_hash = block.parent_hash
+    evm = Simulator(EVM(fork_url=args.rpc_url, fork_block=parent_hash, tracing=False))
+    evm.set_block_env(BlockEnv(number=block.number, timestamp=block.timestamp))
+    state_cache = ForkStateCache(args.state_cache) if args.state_cache else None
+    if state_cache:
+        state_cache.seed(evm, parent_hash)
+    prefetcher = Prefetcher(args.rpc_url, parent_hash, state_cache=state_cache) if args.prefetch else None
+    if prefetcher:
+        prefetcher.seed_common(evm)
+    contracts, token_contracts = setup_contract(evm, args.file_path)
+
+    swapper = PairSwapper(evm)
+
+    contracts['WETH'].deposit(value=10 ** 19, caller=MY_ADDR)
+    init_fees()
+
+    sink = ResultSink(args.output, args.output_format) if args.output else None
+    tokens = token_contracts.items()
+    if prefetcher:
+        tokens = prefetcher.iter_seeded(evm, tokens, lambda item: item[1].address)
+
+    try:
+        for name, token in tokens:
+            start = time.perf_counter()
+            try:
+                if args.matrix:
+                    table = probe_token(evm, contracts['WETH'], token, swapper)
+                    print("==> Token {} {}".format(name, token.address))
+                    print(table.format())
+                    print("--" * 50)
+                    continue
+                if args.isolate:
+                    with evm.isolated():
+                        result = check_token(contracts['WETH'], token, swapper)
+                else:
+                    result = check_token(contracts['WETH'], token, swapper)
+                if sink:
+                    sink.write(make_record(token.address, name, block.number, result,
+                                           elapsed=time.perf_counter() - start))
+                print("==> Token {} {}".format(name, token.address))
+                print(format_result(result))
+                print("--" * 50)
+            except BaseException as e:
+                # pyrevm panics are raised as BaseException, one bad token must not stop the scan
+                if isinstance(e, (KeyboardInterrupt, SystemExit)):
+                    raise
+                if sink:
+                    sink.write(make_record(token.address, name, block.number, error=e,
+                                           elapsed=time.perf_counter() - start))
+                print("==> Token: ", name, "got error: ", e)
+    finally:
+        # Flushes the records written so far and keeps the fetched state even when the scan is aborted
+        if sink:
+            sink.close()
+        if state_cache:
+            state_cache.save_accounts(evm, parent_hash)
+            print("State cache: {}".format(state_cache.stats.as_dict()))
+        if prefetcher:
+            prefetcher.close()
+            print("Prefetch: {}".format(prefetcher.stats.as_dict()))
+    if metrics:
+        metrics.write_prometheus(args.metrics)
+        print("Contract calls:\n{}".format(metrics.summary()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Infers the fee model of tokens from probes instead of reading their source.
+
+Every token is probed under the same grid of conditions (ProbeGrid): buy sizes, values
+written to the token's buy counter slot and block timestamps. The measured fees of a batch
+of tokens form one (tokens, conditions) array, and the fixed, buy count and buy count/time
+models of fee_models are fitted to all of it at once with NumPy. The best model of each
+token comes with a confidence score, merge_into_registry() adds the confident ones to
+data/fee_models.json.
+"""
+import argparse
+import itertools
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from pyrevm import EVM, BlockEnv
+
+from block_meta import get_block_header
+from contract import Contract
+from fee_checker import BOT_ADDR, MY_ADDR, fee_rate, setup_contract
+from fee_models import (FEE_MODELS_FILE, KINDS, ERC20Token, TokenBuyCountFee, TokenBuyCountTimeFee, TokenFixedFee,
+                        model_entry, read_fee_models_file, write_fee_models_file)
+from pair_swap import PairSwapper
+from simulator import Simulator
+
+MODELS = ("fixed", "buy_count", "buy_count_time")
+# Fees collect_probes measures, sells are not probed
+PROBED_KINDS = ("buy", "transfer")
+PARAM_COUNTS = np.array([1, 3, 5])
+# Buy counts where TokenBuyCountTimeFee moves to its next tier before trading opens
+BUY_COUNT_TIERS = (30, 60, 90)
+# Percentage points, the fee a token rounds away on small amounts
+FEE_TOLERANCE = 0.1
+# Slots searched for the buy counter, hand-written tokens declare it among their first variables
+COUNTER_SLOTS = range(0, 64)
+INFERRED_NOTE = "inferred, confidence {:.2f}"
+
+
+class ProbeGrid:
+    """
+    Conditions every token is probed under: buy size as a fraction of the pair's WETH
+    reserve, value of the token's buy counter and offset of the block timestamp. The grid
+    is shared by all tokens, so the results of a batch are one (tokens, conditions) array.
+    """
+
+    def __init__(self, fractions=(0.0001, 0.005), buy_counts=(0, 5, 10, 15, 20, 25, 30, 40, 50, 60, 75, 90, 120),
+                 time_offsets=(-30 * 86400, -86400, -3600, 0)):
+        conditions = list(itertools.product(fractions, buy_counts, time_offsets))
+        self.fractions = np.array([condition[0] for condition in conditions], dtype=np.float64)
+        self.buy_counts = np.array([condition[1] for condition in conditions], dtype=np.int64)
+        self.time_offsets = np.array([condition[2] for condition in conditions], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.fractions)
+
+
+class TokenProbes:
+    """Fees measured for one token, NaN where the probe reverted or could not be set up."""
+
+    def __init__(self, address: str, buy: np.ndarray, transfer: np.ndarray, counter_slot: Optional[int],
+                 buy_count: Optional[int], timestamp: int):
+        self.address = address
+        self.fees = {"buy": buy, "transfer": transfer}
+        self.counter_slot = counter_slot
+        self.buy_count = buy_count
+        self.timestamp = timestamp
+
+
+class InferredModel:
+    def __init__(self, address: str, model: ERC20Token, confidence: float, rmse: float, observations: int):
+        self.address = address
+        self.model = model
+        self.confidence = confidence
+        self.rmse = rmse
+        self.observations = observations
+
+    @property
+    def name(self) -> str:
+        return model_entry(self.model)["model"]
+
+    def entry(self) -> dict:
+        return model_entry(self.model, INFERRED_NOTE.format(self.confidence))
+
+    def format(self) -> str:
+        params = ", ".join("{}={}".format(key, value) for key, value in self.entry().items()
+                           if key not in ("model", "note"))
+        return "{} {} (confidence {:.2f}, rmse {:.3f}, {} probes)".format(
+            self.name, params, self.confidence, self.rmse, self.observations)
+
+
+def ratio(numerator: np.ndarray, count: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(count > 0, numerator / np.maximum(count, 1), 0.0)
+
+
+def group_means(x: np.ndarray, valid: np.ndarray, masks: np.ndarray):
+    """Sums, counts and the explained sum of squares of (tokens, conditions) data over (groups, conditions) masks."""
+    sums = x @ masks.T
+    counts = valid @ masks.T
+    return sums, counts, ratio(sums ** 2, counts)
+
+
+def fit_fixed(x, valid, grid: ProbeGrid):
+    sums, counts, explained = group_means(x, valid, np.ones((1, len(grid))))
+    return explained[:, 0], {"fee_rate": ratio(sums, counts)[:, 0]}
+
+
+def fit_buy_count(x, valid, grid: ProbeGrid):
+    thresholds = np.unique(grid.buy_counts)[:-1]
+    if len(thresholds) == 0:
+        thresholds = np.unique(grid.buy_counts)
+    initial = (grid.buy_counts[None, :] <= thresholds[:, None]).astype(np.float64)
+    sums_initial, counts_initial, explained_initial = group_means(x, valid, initial)
+    sums_final, counts_final, explained_final = group_means(x, valid, 1 - initial)
+
+    explained = explained_initial + explained_final
+    best = np.argmax(explained, axis=1)
+    rows = np.arange(len(x))
+    initial_fee = ratio(sums_initial, counts_initial)[rows, best]
+    final_fee = ratio(sums_final, counts_final)[rows, best]
+    # A side without any probe takes the fee of the other one
+    initial_fee = np.where(counts_initial[rows, best] > 0, initial_fee, final_fee)
+    final_fee = np.where(counts_final[rows, best] > 0, final_fee, initial_fee)
+    return explained[rows, best], {"initial_fee": initial_fee, "final_fee": final_fee,
+                                   "reduce_fee_at": thresholds[best]}
+
+
+def fit_buy_count_time(x, valid, grid: ProbeGrid):
+    # Candidate opening offsets, inf for "not open within the probed window"
+    openings = np.append(np.unique(grid.time_offsets), np.inf)
+    opened = grid.time_offsets[None, :] >= openings[:, None]
+    tier = np.searchsorted(BUY_COUNT_TIERS, grid.buy_counts, side="right")
+
+    # Free groups: tiers 1-3 before the opening and everything after it. Tier 0 before the
+    # opening has no fee, its probes stay entirely in the residual
+    groups = [~opened & (tier == index)[None, :] for index in (1, 2, 3)] + [opened]
+    explained = np.zeros((len(x), len(openings)))
+    stats = []
+    for group in groups:
+        sums, counts, group_explained = group_means(x, valid, group.astype(np.float64))
+        explained += group_explained
+        stats.append((sums, counts))
+
+    best = np.argmax(explained, axis=1)
+    rows = np.arange(len(x))
+    fee_tier = np.stack([ratio(sums, counts)[rows, best] for sums, counts in stats], axis=1)
+    return explained[rows, best], {"fee_tier": fee_tier, "opening_offset": openings[best]}
+
+
+def infer_models(probes: List[TokenProbes], kind: str, grid: ProbeGrid) -> List[InferredModel]:
+    """Fits every model to the ``kind`` fees of all ``probes`` in one pass, returns the best model of each token."""
+    if not probes:
+        return []
+    fees = np.stack([token_probes.fees[kind] for token_probes in probes])
+    valid = (~np.isnan(fees)).astype(np.float64)
+    x = np.nan_to_num(fees)
+    observations = valid.sum(axis=1)
+    total = (x ** 2).sum(axis=1)
+
+    fits = [fit_fixed(x, valid, grid), fit_buy_count(x, valid, grid), fit_buy_count_time(x, valid, grid)]
+    sse = np.stack([np.maximum(total - explained, 0.0) for explained, _ in fits], axis=1)
+
+    # BIC picks the simplest model that explains the probes, its weight against the
+    # others and how close it fits make the confidence
+    n = np.maximum(observations, 1)[:, None]
+    bic = n * np.log(sse / n + FEE_TOLERANCE ** 2) + PARAM_COUNTS[None, :] * np.log(n)
+    weights = np.exp(-(bic - bic.min(axis=1, keepdims=True)) / 2)
+    weights /= weights.sum(axis=1, keepdims=True)
+    best = np.argmin(bic, axis=1)
+    rows = np.arange(len(probes))
+    rmse = np.sqrt(sse[rows, best] / n[:, 0])
+    confidence = weights[rows, best] * np.exp(-0.5 * (rmse / FEE_TOLERANCE) ** 2)
+    confidence = np.where(observations > PARAM_COUNTS[best], confidence, 0.0)
+
+    results = []
+    for index, token_probes in enumerate(probes):
+        params = {name: values[index] for name, values in fits[best[index]][1].items()}
+        model = build_model(MODELS[best[index]], params, token_probes)
+        results.append(InferredModel(token_probes.address, model, float(confidence[index]), float(rmse[index]),
+                                     int(observations[index])))
+    return results
+
+
+def build_model(name: str, params: dict, token_probes: TokenProbes) -> ERC20Token:
+    def percent(value):
+        return round(float(value), 2)
+
+    buy_count = token_probes.buy_count or 0
+    if name == "fixed":
+        return TokenFixedFee(percent(params["fee_rate"]))
+    if name == "buy_count":
+        return TokenBuyCountFee(buy_count, initial_fee=percent(params["initial_fee"]),
+                                final_fee=percent(params["final_fee"]), reduce_fee_at=int(params["reduce_fee_at"]))
+    opening_offset = params["opening_offset"]
+    # Not opened within the window: any time after the probed timestamps
+    opening_offset = int(opening_offset) if np.isfinite(opening_offset) else 1
+    return TokenBuyCountTimeFee(buy_count, token_probes.timestamp,
+                                trading_opened_time=token_probes.timestamp + opening_offset,
+                                fee_tier=[percent(fee) for fee in params["fee_tier"]])
+
+
+def find_buy_counter(sim: Simulator, token: Contract, buy, slots=COUNTER_SLOTS) -> Optional[int]:
+    """The storage slot a buy increments by exactly one, None if there is not exactly one."""
+    # Loaded outside the isolated scope on purpose: on a fork, insert_account_storage is
+    # ignored for a slot first loaded inside a reverted scope, and collect_probes sets the
+    # counter slot that way
+    before = [sim.storage(token.address, slot) for slot in slots]
+    with sim.isolated():
+        buy()
+        after = [sim.storage(token.address, slot) for slot in slots]
+    candidates = [slot for slot, old, new in zip(slots, before, after) if new == old + 1]
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def collect_probes(sim: Simulator, weth: Contract, token: Contract, swapper: PairSwapper,
+                   grid: ProbeGrid) -> TokenProbes:
+    """
+    Measures the buy fee and the wallet to wallet transfer fee of ``token`` under every
+    condition of ``grid``, each probe in its own isolated scope. Without a buy counter
+    only the conditions with the highest buy count are probed, against the real counter.
+    """
+    buy_fees = np.full(len(grid), np.nan)
+    transfer_fees = np.full(len(grid), np.nan)
+    timestamp = sim.env.block.timestamp
+    pair = swapper.pair(weth.address, token.address)
+
+    def buy(amount):
+        balance = token.balanceOf(MY_ADDR)
+        amount_out = swapper.swap_exact_in(weth, token.address, amount, MY_ADDR, caller=MY_ADDR)
+        return amount_out, token.balanceOf(MY_ADDR) - balance
+
+    try:
+        reserve0, reserve1, _ = pair.getReserves()
+    except Exception:
+        return TokenProbes(token.address, buy_fees, transfer_fees, None, None, timestamp)
+    reserve_weth = reserve1 if token.address.lower() < weth.address.lower() else reserve0
+    weth_balance = weth.balanceOf(MY_ADDR)
+
+    def amount_of(fraction):
+        return min(max(int(reserve_weth * fraction), 1000), weth_balance)
+
+    try:
+        counter_slot = find_buy_counter(sim, token, lambda: buy(amount_of(grid.fractions.min())))
+    except Exception:
+        counter_slot = None
+    buy_count = sim.storage(token.address, counter_slot) if counter_slot is not None else None
+
+    for index in range(len(grid)):
+        if counter_slot is None and grid.buy_counts[index] != grid.buy_counts.max():
+            continue
+        with sim.isolated(), sim.at_block(timestamp=timestamp + int(grid.time_offsets[index])):
+            if counter_slot is not None:
+                sim.insert_account_storage(token.address, counter_slot, int(grid.buy_counts[index]))
+            try:
+                amount_out, received = buy(amount_of(grid.fractions[index]))
+                buy_fees[index] = fee_rate(amount_out, received)
+                sent = int(received * 99 / 100)
+                balance = token.balanceOf(BOT_ADDR)
+                token.transfer(BOT_ADDR, sent, caller=MY_ADDR)
+                transfer_fees[index] = fee_rate(sent, token.balanceOf(BOT_ADDR) - balance)
+            except Exception:
+                pass
+
+    return TokenProbes(token.address, buy_fees, transfer_fees, counter_slot, buy_count, timestamp)
+
+
+def merge_into_registry(inferred: Dict[str, List[InferredModel]], path: str = FEE_MODELS_FILE,
+                        min_confidence: float = 0.9, overwrite: bool = False) -> int:
+    """
+    Adds the models at least ``min_confidence`` confident to the data file, ``inferred``
+    is keyed by kind (buy, transfer, sell). Hand-written entries are kept unless
+    ``overwrite``, earlier inferred ones are replaced. Returns the number of entries written.
+    """
+    data = read_fee_models_file(path)
+    written = 0
+    for kind, models in inferred.items():
+        if kind not in KINDS:
+            raise ValueError("Unknown fee kind {}, expected one of {}".format(kind, KINDS))
+        table = data.setdefault(kind, {})
+        existing = {address.lower(): address for address in table}
+        for inferred_model in models:
+            if inferred_model.confidence < min_confidence:
+                continue
+            address = inferred_model.address.lower()
+            if address in existing:
+                note = table[existing[address]].get("note", "")
+                if not overwrite and not note.startswith("inferred"):
+                    continue
+                del table[existing[address]]
+            table[address] = inferred_model.entry()
+            written += 1
+    write_fee_models_file(data, path)
+    return written
+
+
+def get_args() -> argparse.Namespace:
+    parse = argparse.ArgumentParser()
+    parse.add_argument('--rpc_url', default='http://192.168.1.58:8545')
+    parse.add_argument('--file_path')
+    parse.add_argument('--kinds', default='buy,transfer',
+                       help='Fees to infer, comma separated among {}'.format(", ".join(PROBED_KINDS)))
+    parse.add_argument('--min_confidence', type=float, default=0.9)
+    parse.add_argument('--write', action='store_true', help='Add the confident models to the fee models file')
+    parse.add_argument('--models_file', default=FEE_MODELS_FILE)
+    parse.add_argument('--overwrite', action='store_true', help='With --write, also replace hand-written models')
+    args = parse.parse_args()
+    args.kinds = [kind for kind in args.kinds.split(",") if kind]
+    unknown = [kind for kind in args.kinds if kind not in PROBED_KINDS]
+    if unknown:
+        parse.error("--kinds: {} not probed, choose among {}".format(", ".join(unknown), ", ".join(PROBED_KINDS)))
+    return args
+
+
+def main():
+    args = get_args()
+    block = get_block_header(args.rpc_url)
+    evm = Simulator(EVM(fork_url=args.rpc_url, fork_block=block.parent_hash, tracing=False))
+    evm.set_block_env(BlockEnv(number=block.number, timestamp=block.timestamp))
+    contracts, token_contracts = setup_contract(evm, args.file_path)
+
+    swapper = PairSwapper(evm)
+    contracts['WETH'].deposit(value=10 ** 19, caller=MY_ADDR)
+
+    grid = ProbeGrid()
+    names = {}
+    probes = []
+    start = time.perf_counter()
+    for name, token in token_contracts.items():
+        try:
+            probes.append(collect_probes(evm, contracts['WETH'], token, swapper, grid))
+            names[token.address] = name
+        except Exception as e:
+            print("==> Token: ", name, "got error: ", e)
+    probed = time.perf_counter()
+
+    inferred = {kind: infer_models(probes, kind, grid) for kind in args.kinds}
+    print("Probed {} tokens in {:.1f}s, fitted in {:.3f}s".format(
+        len(probes), probed - start, time.perf_counter() - probed))
+
+    for index, token_probes in enumerate(probes):
+        print("==> Token {} {} (buy counter slot: {})".format(
+            names[token_probes.address], token_probes.address, token_probes.counter_slot))
+        for kind in args.kinds:
+            print("    {:<8} {}".format(kind, inferred[kind][index].format()))
+        print("--" * 50)
+
+    if args.write:
+        written = merge_into_registry(inferred, args.models_file, args.min_confidence, args.overwrite)
+        print("Wrote {} models to {}".format(written, args.models_file))
+
+
+if __name__ == "__main__":
+    main()
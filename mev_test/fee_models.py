@@ -0,0 +1,237 @@
+"""
+Expected fee models of the tokens we know, one table per kind of movement.
+
+The models live in data/fee_models.json, ``{"buy": {address: model}, "transfer": ..., "sell": ...}``
+with a model written as ``{"model": "fixed", "fee_rate": 5}`` (see MODEL_PARAMS). init_fees()
+loads and validates the file once, the tables are keyed by lowercase address, use get_model()
+to look them up.
+
+A model's ``transfer(amount)`` returns the amount received after the fee, ``transfer_many``
+does the same for a whole array of amounts at once.
+"""
+import json
+import os
+import re
+from fractions import Fraction
+from typing import Dict
+
+import numpy as np
+
+FEE_MODELS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fee_models.json")
+KINDS = ("buy", "transfer", "sell")
+ADDRESS_RE = re.compile(r"^0x[0-9a-fA-F]{40}$")
+
+
+def as_amounts(amounts) -> np.ndarray:
+    """int64 array, or an object array of Python ints when an amount does not fit in 64 bits."""
+    amounts = np.asarray(amounts)
+    if amounts.dtype != object and not np.issubdtype(amounts.dtype, np.integer):
+        raise TypeError("Token amounts must be integers, got {}".format(amounts.dtype))
+    return amounts
+
+
+def fee_fraction(fee_percent: float) -> Fraction:
+    # From the decimal text so 0.7% is exactly 7/1000, not the nearest binary float
+    return Fraction(str(fee_percent)) / 100
+
+
+class ERC20Token:
+    # No fee
+    def fee_percent(self) -> float:
+        return 0
+
+    def transfer(self, amount):
+        # The fee is rounded down in integer arithmetic, like the token contracts do
+        fee = fee_fraction(self.fee_percent())
+        return amount - amount * fee.numerator // fee.denominator
+
+    def transfer_many(self, amounts) -> np.ndarray:
+        """transfer() of every amount in one pass, in int64 unless the products could overflow."""
+        amounts = as_amounts(amounts)
+        fee = fee_fraction(self.fee_percent())
+        if amounts.dtype != object and amounts.size and int(amounts.max()) * fee.numerator >= 2 ** 63:
+            amounts = amounts.astype(object)
+        return amounts - amounts * fee.numerator // fee.denominator
+
+
+class TokenFixedFee(ERC20Token):
+    fee_rate: float
+
+    def __init__(self, fee_rate):
+        self.fee_rate = fee_rate
+
+    def fee_percent(self) -> float:
+        return self.fee_rate
+
+
+class TokenBuyCountTimeFee(ERC20Token):
+    buy_count: int
+    transaction_time: int
+    trading_opened_time: int
+    fee_tier = []
+
+    def __init__(self, buy_count, transaction_time, trading_opened_time, fee_tier):
+        self.buy_count = buy_count
+        self.transaction_time = transaction_time
+        self.trading_opened_time = trading_opened_time
+        self.fee_tier = fee_tier
+
+    def fee_percent(self) -> float:
+        current_fee_tier = 0
+
+        if self.transaction_time >= self.trading_opened_time:
+            current_fee_tier = self.fee_tier[3]
+        else:
+            if 30 <= self.buy_count < 60:
+                current_fee_tier = self.fee_tier[0]
+            elif 60 <= self.buy_count < 90:
+                current_fee_tier = self.fee_tier[1]
+            elif self.buy_count >= 90:
+                current_fee_tier = self.fee_tier[2]
+
+        return current_fee_tier
+
+
+class TokenBuyCountFee(ERC20Token):
+    buy_count: int
+    initial_fee: int
+    final_fee: int
+    reduce_fee_at: int
+
+    def __init__(self, buy_count, initial_fee, final_fee, reduce_fee_at):
+        self.buy_count = buy_count
+        self.initial_fee = initial_fee
+        self.final_fee = final_fee
+        self.reduce_fee_at = reduce_fee_at
+
+    def fee_percent(self) -> float:
+        current_fee = self.initial_fee
+        if self.buy_count > self.reduce_fee_at:
+            current_fee = self.final_fee
+
+        return current_fee
+
+
+MODEL_TYPES = {
+    "fixed": TokenFixedFee,
+    "buy_count": TokenBuyCountFee,
+    "buy_count_time": TokenBuyCountTimeFee,
+}
+# Parameters of each model, every one of them is required
+MODEL_PARAMS = {
+    "fixed": ("fee_rate",),
+    "buy_count": ("buy_count", "initial_fee", "final_fee", "reduce_fee_at"),
+    "buy_count_time": ("buy_count", "transaction_time", "trading_opened_time", "fee_tier"),
+}
+FEE_PARAMS = ("fee_rate", "initial_fee", "final_fee")
+
+buy_fees = dict()
+transfer_fees = dict()
+sell_fees = dict()
+_loaded_from = None
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def parse_model(entry: dict, where: str = "model") -> ERC20Token:
+    """Builds the model of one entry of the data file, raises ValueError naming ``where`` if it is invalid."""
+    if not isinstance(entry, dict):
+        raise ValueError("{}: expected an object, got {!r}".format(where, entry))
+    kind = entry.get("model")
+    if kind not in MODEL_TYPES:
+        raise ValueError("{}: unknown model {!r}, expected one of {}".format(where, kind, sorted(MODEL_TYPES)))
+
+    params = MODEL_PARAMS[kind]
+    missing = [param for param in params if param not in entry]
+    unknown = [key for key in entry if key not in params and key not in ("model", "note")]
+    if missing or unknown:
+        raise ValueError("{}: {} model, missing {} unknown {}".format(where, kind, missing, unknown))
+
+    for param in params:
+        value = entry[param]
+        if param == "fee_tier":
+            if not isinstance(value, list) or len(value) != 4 or not all(is_number(fee) for fee in value):
+                raise ValueError("{}: fee_tier must be a list of 4 numbers, got {!r}".format(where, value))
+            fees = value
+        elif not is_number(value):
+            raise ValueError("{}: {} must be a number, got {!r}".format(where, param, value))
+        else:
+            fees = [value] if param in FEE_PARAMS else []
+        if any(not 0 <= fee <= 100 for fee in fees):
+            raise ValueError("{}: {} must be a percentage between 0 and 100, got {!r}".format(where, param, value))
+
+    return MODEL_TYPES[kind](**{param: entry[param] for param in params})
+
+
+def model_entry(model: ERC20Token, note: str = None) -> dict:
+    """Data file entry of ``model``, the inverse of parse_model()."""
+    kind = next(kind for kind, model_type in MODEL_TYPES.items() if type(model) is model_type)
+    entry = {"model": kind}
+    entry.update((param, getattr(model, param)) for param in MODEL_PARAMS[kind])
+    if note:
+        entry["note"] = note
+    return entry
+
+
+def read_fee_models_file(path: str = FEE_MODELS_FILE) -> dict:
+    """Raw ``{kind: {address: entry}}`` of the data file, for tools that edit it."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_fee_models_file(data: dict, path: str = FEE_MODELS_FILE):
+    """Writes ``{kind: {address: entry}}`` one entry per line, replacing the file atomically."""
+    lines = []
+    for kind in KINDS:
+        entries = ['    "{}": {}'.format(address, json.dumps(entry)) for address, entry in data.get(kind, {}).items()]
+        lines.append('  "{}": {{\n{}\n  }}'.format(kind, ",\n".join(entries)) if entries else '  "{}": {{}}'.format(kind))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write("{\n" + ",\n".join(lines) + "\n}\n")
+    os.replace(tmp_path, path)
+
+
+def load_fee_models(path: str = FEE_MODELS_FILE) -> Dict[str, Dict[str, ERC20Token]]:
+    """``{kind: {lowercase address: model}}`` of the data file at ``path``, validated."""
+
+    def no_duplicates(pairs):
+        keys = [key.lower() if isinstance(key, str) else key for key, _ in pairs]
+        duplicates = sorted({key for key in keys if keys.count(key) > 1})
+        if duplicates:
+            raise ValueError("{}: duplicate keys {}".format(path, duplicates))
+        return dict(pairs)
+
+    with open(path) as f:
+        data = json.load(f, object_pairs_hook=no_duplicates)
+
+    unknown = [kind for kind in data if kind not in KINDS]
+    if unknown:
+        raise ValueError("{}: unknown kinds {}, expected {}".format(path, unknown, KINDS))
+
+    tables = {}
+    for kind in KINDS:
+        tables[kind] = {}
+        for address, entry in data.get(kind, {}).items():
+            where = "{} {} {}".format(path, kind, address)
+            if not ADDRESS_RE.match(address):
+                raise ValueError("{}: not an address".format(where))
+            tables[kind][address.lower()] = parse_model(entry, where)
+    return tables
+
+
+def init_fees(path: str = FEE_MODELS_FILE):
+    """Fills buy_fees, transfer_fees and sell_fees from ``path``. Only reads the file once."""
+    global _loaded_from
+    if _loaded_from == path:
+        return
+    tables = load_fee_models(path)
+    for kind, table in zip(KINDS, (buy_fees, transfer_fees, sell_fees)):
+        table.clear()
+        table.update(tables[kind])
+    _loaded_from = path
+
+
+def get_model(table: dict, addr: str) -> ERC20Token:
+    return table.get(addr.lower(), ERC20Token())
@@ -0,0 +1,327 @@
+"""
+Fee checks of a set of tokens over a range of blocks, for taxes that change with time or
+with the number of buys (TokenBuyCountTimeFee, TokenBuyCountFee).
+
+Every swept block gets its own fork (state before the block) and BlockEnv. The range is
+cut into segments of consecutive swept blocks, segments run in parallel on ``workers``
+processes and a worker walks its segment in order: the forked state cached for one block
+is carried over to the next for every account whose code or storage root did not change
+in between (compared with eth_getProof), so only what changed is fetched again.
+
+Results go to a FeeSeries, one row per (token, block), read back per token as arrays:
+
+    python fee_sweep.py --file_path ./data/token.txt --from_block 20967000 --to_block 20967700 --stride 10
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from pyrevm import EVM, BlockEnv
+
+import fee_checker
+from block_meta import BlockHeader, get_block_headers
+from contract import Contract
+from fork_cache import ForkStateCache
+from pair_swap import PairSwapper
+from prefetch import Prefetcher
+from result_sink import make_record
+from rpc_client import BatchRPCClient, RPCError
+from scanner import read_tokens
+from simulator import Simulator
+from uniswap_v2 import WETH_ADDR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fees (
+    address TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    buy_fee REAL,
+    transfer_fee REAL,
+    sell_fee REAL,
+    status TEXT,
+    error TEXT,
+    PRIMARY KEY (address, block_number)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS fees_by_block ON fees (block_number);
+"""
+
+FEE_FIELDS = ("buy_fee", "transfer_fee", "sell_fee")
+# Status of the rows of a block that could not be set up, not counted as done
+BLOCK_ERROR = "BLOCK_ERROR"
+
+# Per worker process state, built once by init_worker
+worker = dict()
+
+
+class FeeSeries:
+    """
+    Per token fee time series in a SQLite file, clustered by (token, block) so the series
+    of one token is a single range read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def add(self, records: Iterable[dict], timestamp: int):
+        """Stores result_sink records of one block."""
+        rows = [(record["address"].lower(), record["block"], timestamp, record["buy_fee"], record["transfer_fee"],
+                 record["sell_fee"], record["status"], record["error"]) for record in records]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO fees VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def done_blocks(self, token_count: int) -> set:
+        """Blocks that already have a row for ``token_count`` tokens, BLOCK_ERROR rows excluded."""
+        with self._lock:
+            rows = self._db.execute("SELECT block_number FROM fees WHERE status IS NOT ? GROUP BY block_number "
+                                    "HAVING count(*) >= ?", (BLOCK_ERROR, token_count)).fetchall()
+        return {block for (block,) in rows}
+
+    def series(self, address: str, from_block: Optional[int] = None,
+               to_block: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        ``{"block", "timestamp", "buy_fee", "transfer_fee", "sell_fee", "status"}`` arrays of
+        one token ordered by block, fees are NaN where the check failed.
+        """
+        query = "SELECT block_number, timestamp, buy_fee, transfer_fee, sell_fee, status FROM fees WHERE address = ?"
+        params = [address.lower()]
+        if from_block is not None:
+            query += " AND block_number >= ?"
+            params.append(from_block)
+        if to_block is not None:
+            query += " AND block_number <= ?"
+            params.append(to_block)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY block_number", params).fetchall()
+
+        columns = list(zip(*rows)) if rows else [()] * 6
+        series = {"block": np.array(columns[0], dtype=np.int64), "timestamp": np.array(columns[1], dtype=np.int64)}
+        for field, values in zip(FEE_FIELDS, columns[2:5]):
+            series[field] = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        series["status"] = np.array(columns[5], dtype=object)
+        return series
+
+    def changes(self, address: str, field: str = "buy_fee", tolerance: float = 0.05) -> List[tuple]:
+        """``[(block, fee), ...]``: the first value of ``field`` and every block where it moved by more than ``tolerance``."""
+        series = self.series(address)
+        blocks, fees = series["block"], series[field]
+        valid = ~np.isnan(fees)
+        blocks, fees = blocks[valid], fees[valid]
+        if not len(fees):
+            return []
+        moved = np.flatnonzero(np.abs(np.diff(fees)) > tolerance) + 1
+        return [(int(blocks[index]), float(fees[index])) for index in np.concatenate(([0], moved))]
+
+
+class StateCarrier:
+    """
+    Carries the state cached for one block over to another block in a ForkStateCache:
+    the code of accounts whose code hash did not change and the cached slots of accounts
+    whose storage root did not change, both read with eth_getProof (no storage keys).
+    """
+
+    def __init__(self, rpc_url: str, state_cache: ForkStateCache, batch_size: int = 200):
+        self.client = BatchRPCClient(rpc_url)
+        self.state_cache = state_cache
+        self.batch_size = batch_size
+        # {block hash: {address: (balance, nonce, code hash, storage hash)}} of the last two blocks
+        self._proofs: Dict[str, Dict[str, tuple]] = {}
+
+    def proofs(self, block_hash: str, addresses: List[str]) -> Dict[str, tuple]:
+        known = self._proofs.setdefault(block_hash.lower(), {})
+        missing = [address for address in addresses if address not in known]
+        block = {"blockHash": block_hash}
+        for start in range(0, len(missing), self.batch_size):
+            group = missing[start: start + self.batch_size]
+            results = self.client.batch([("eth_getProof", [address, [], block]) for address in group])
+            for address, proof in zip(group, results):
+                if not isinstance(proof, RPCError) and proof:
+                    known[address] = (int(proof["balance"], 16), int(proof["nonce"], 16), proof["codeHash"].lower(),
+                                      proof["storageHash"].lower())
+        while len(self._proofs) > 2:
+            self._proofs.pop(next(iter(self._proofs)))
+        return known
+
+    def carry(self, from_hash: str, to_hash: str):
+        addresses = self.state_cache.accounts(from_hash)
+        if not addresses:
+            return
+        before = self.proofs(from_hash, addresses)
+        after = self.proofs(to_hash, addresses)
+        accounts = {address: after[address][:2] for address in addresses
+                    if address in before and address in after and before[address][2] == after[address][2]}
+        storage_of = [address for address in accounts if before[address][3] == after[address][3]]
+        self.state_cache.carry_over(from_hash, to_hash, accounts, storage_of)
+
+
+class SweepConfig:
+    def __init__(self, rpc_url: str, tokens: list, state_cache_path: str, prefetch: bool = True):
+        self.rpc_url = rpc_url
+        self.tokens = tokens
+        self.state_cache_path = state_cache_path
+        self.prefetch = prefetch
+
+
+def init_worker(config: SweepConfig):
+    state_cache = ForkStateCache(config.state_cache_path)
+    worker.update(config=config, state_cache=state_cache, carrier=StateCarrier(config.rpc_url, state_cache))
+    fee_checker.init_fees()
+
+
+def sweep_block(header: BlockHeader, previous: Optional[BlockHeader]) -> list:
+    """
+    result_sink records of every token at ``header``, each token from the same state. When
+    the block itself cannot be set up (RPC errors while forking or depositing WETH) every
+    token gets a BLOCK_ERROR record instead, the block is swept again on the next run.
+    """
+    config, state_cache = worker["config"], worker["state_cache"]
+    start = time.perf_counter()
+    prefetcher = None
+    try:
+        if previous is not None:
+            worker["carrier"].carry(previous.parent_hash, header.parent_hash)
+        evm = Simulator(EVM(fork_url=config.rpc_url, fork_block=header.parent_hash, tracing=False))
+        evm.set_block_env(BlockEnv(number=header.number, timestamp=header.timestamp))
+        state_cache.seed(evm, header.parent_hash)
+        if config.prefetch:
+            prefetcher = Prefetcher(config.rpc_url, header.parent_hash, state_cache=state_cache)
+            prefetcher.seed_common(evm)
+
+        weth = Contract(address=WETH_ADDR, revm=evm, abi_file_path="./abi/weth.abi")
+        swapper = PairSwapper(evm)
+        weth.deposit(value=10 ** 19, caller=fee_checker.MY_ADDR)
+    except BaseException as e:
+        if isinstance(e, (KeyboardInterrupt, SystemExit)):
+            raise
+        if prefetcher:
+            prefetcher.close()
+        error = "{}: {}".format(type(e).__name__, e)
+        elapsed = time.perf_counter() - start
+        return [dict(make_record(address, name, header.number, error=error, elapsed=elapsed), status=BLOCK_ERROR)
+                for name, address in config.tokens]
+
+    records = []
+    try:
+        tokens = config.tokens
+        if prefetcher:
+            tokens = prefetcher.iter_seeded(evm, tokens, lambda item: item[1])
+        for name, address in tokens:
+            start = time.perf_counter()
+            try:
+                token = Contract(address=address, revm=evm, abi_file_path="./abi/erc20.abi")
+                with evm.isolated():
+                    result = fee_checker.check_token(weth, token, swapper)
+                records.append(make_record(address, name, header.number, result, elapsed=time.perf_counter() - start))
+            except BaseException as e:
+                # pyrevm panics are raised as BaseException, one bad token must not stop the sweep
+                if isinstance(e, (KeyboardInterrupt, SystemExit)):
+                    raise
+                records.append(make_record(address, name, header.number, error="{}: {}".format(type(e).__name__, e),
+                                           elapsed=time.perf_counter() - start))
+    finally:
+        if prefetcher:
+            prefetcher.close()
+    state_cache.save_accounts(evm, header.parent_hash)
+    return records
+
+
+def sweep_segment(segment: List[BlockHeader]) -> list:
+    results = []
+    previous = None
+    for header in segment:
+        results.append((header, sweep_block(header, previous)))
+        previous = header
+    return results
+
+
+def sweep(headers: List[BlockHeader], config: SweepConfig, workers: int, segment_size: int = 8, on_block=None):
+    """
+    Runs every token at every block of ``headers`` (ascending), ``on_block(header, records)``
+    is called as soon as the segment of a block completes.
+    """
+    segments = [headers[start: start + segment_size] for start in range(0, len(headers), segment_size)]
+    if workers <= 1:
+        init_worker(config)
+        for segment in segments:
+            for header, records in sweep_segment(segment):
+                on_block(header, records)
+        return
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(config,)) as pool:
+        for results in pool.imap_unordered(sweep_segment, segments):
+            for header, records in results:
+                on_block(header, records)
+
+
+def get_args() -> argparse.Namespace:
+    parse = argparse.ArgumentParser()
+    parse.add_argument('--rpc_url', default='http://192.168.1.58:8545')
+    parse.add_argument('--file_path')
+    parse.add_argument('--from_block', type=int, required=True)
+    parse.add_argument('--to_block', type=int, required=True)
+    parse.add_argument('--stride', type=int, default=1, help='Check every n-th block of the range')
+    parse.add_argument('--workers', type=int, default=os.cpu_count())
+    parse.add_argument('--segment_size', type=int, default=8,
+                       help='Consecutive swept blocks handed to a worker, state is carried over within a segment')
+    parse.add_argument('--series', default='fee_series.sqlite', help='SQLite file the fee time series go to')
+    parse.add_argument('--state_cache', help='SQLite file caching the forked state, a temporary one by default')
+    parse.add_argument('--no_prefetch', action='store_true',
+                       help='Let the fork fetch the token state lazily, storage is then neither cached nor carried '
+                            'over to the next block')
+    return parse.parse_args()
+
+
+def main():
+    args = get_args()
+    tokens = read_tokens(args.file_path)
+    series = FeeSeries(args.series)
+    done = series.done_blocks(len(tokens))
+    blocks = [block for block in range(args.from_block, args.to_block + 1, args.stride) if block not in done]
+    headers = get_block_headers(args.rpc_url, blocks)
+    print("Sweeping {} tokens over {} blocks ({} already done)".format(len(tokens), len(blocks), len(done)))
+
+    tmp = tempfile.TemporaryDirectory() if not args.state_cache else None
+    state_cache_path = args.state_cache or os.path.join(tmp.name, "state.sqlite")
+    config = SweepConfig(args.rpc_url, tokens, state_cache_path, not args.no_prefetch)
+
+    start = time.perf_counter()
+
+    def on_block(header, records):
+        series.add(records, header.timestamp)
+        print("Block {}: {} tokens, {} errors".format(header.number, len(records),
+                                                      sum(1 for record in records if record["error"])))
+
+    try:
+        sweep(headers, config, args.workers, args.segment_size, on_block)
+    finally:
+        if tmp:
+            tmp.cleanup()
+    elapsed = time.perf_counter() - start
+
+    for name, address in tokens:
+        print("==> Token {} {}".format(name, address))
+        for field in FEE_FIELDS:
+            changes = series.changes(address, field)
+            print("    {:<13} {}".format(field, ", ".join("{:.1f}% from {}".format(fee, block)
+                                                          for block, fee in changes) or "-"))
+    print("--" * 50)
+    print("Swept {} blocks in {:.1f}s ({:.2f} blocks/s)".format(len(blocks), elapsed,
+                                                                 len(blocks) / elapsed if elapsed else 0))
+    series.close()
+
+
+if __name__ == "__main__":
+    main()
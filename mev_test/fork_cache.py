@@ -0,0 +1,217 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from pyrevm import AccountInfo
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    block_hash TEXT PRIMARY KEY,
+    last_used REAL NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS accounts (
+    block_hash TEXT NOT NULL,
+    address TEXT NOT NULL,
+    balance TEXT NOT NULL,
+    nonce INTEGER NOT NULL,
+    code BLOB,
+    PRIMARY KEY (block_hash, address)
+);
+CREATE TABLE IF NOT EXISTS storage (
+    block_hash TEXT NOT NULL,
+    address TEXT NOT NULL,
+    slot TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (block_hash, address, slot)
+);
+"""
+
+# Rough per row overhead used for the size cap, code is counted by its length
+ROW_SIZE = 96
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.accounts_loaded = 0
+        self.slots_loaded = 0
+        self.accounts_saved = 0
+        self.slots_saved = 0
+        self.accounts_carried = 0
+        self.slots_carried = 0
+        self.evicted_blocks = 0
+
+    def as_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+class ForkStateCache:
+    """
+    Persistent SQLite cache of forked chain state, keyed by block hash.
+
+    Accounts (balance, nonce, code) and storage slots fetched from the fork are saved
+    per block and replayed into a fresh EVM at the same block with
+    ``insert_account_info`` / ``insert_account_storage``, so pyrevm does not fetch them
+    over RPC again. Anything not in the cache is still fetched lazily by the fork.
+
+    Only pristine values may be stored: accounts are read from ``evm.db_accounts`` (the
+    fork database, never modified by message_call) and storage must come from the RPC
+    (see ``put_storage``), because ``evm.storage`` returns the journaled value and pyrevm
+    has no accessor for the storage its fork database loaded. Storage is therefore only
+    cached through the Prefetcher, the scripts turn ``--prefetch`` on with ``--state_cache``.
+
+    The least recently used blocks are dropped once ``max_blocks`` or ``max_bytes`` is
+    exceeded.
+    """
+
+    def __init__(self, path: str, max_blocks: int = 16, max_bytes: int = 1 << 30):
+        self.path = path
+        self.max_blocks = max_blocks
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def seed(self, evm, block_hash: str) -> bool:
+        """Inserts every cached account and slot of ``block_hash`` into ``evm``, returns whether it was a hit."""
+        block_hash = block_hash.lower()
+        with self._lock:
+            accounts = self._db.execute(
+                "SELECT address, balance, nonce, code FROM accounts WHERE block_hash = ?", (block_hash,)
+            ).fetchall()
+            slots = self._db.execute(
+                "SELECT address, slot, value FROM storage WHERE block_hash = ?", (block_hash,)
+            ).fetchall()
+            if accounts or slots:
+                self._db.execute("UPDATE blocks SET last_used = ? WHERE block_hash = ?", (time.time(), block_hash))
+                self._db.commit()
+
+        if not accounts and not slots:
+            self.stats.misses += 1
+            return False
+
+        for address, balance, nonce, code in accounts:
+            evm.insert_account_info(address, AccountInfo(balance=int(balance), nonce=nonce, code=code))
+        for address, slot, value in slots:
+            evm.insert_account_storage(address, int(slot, 16), int(value, 16))
+
+        self.stats.hits += 1
+        self.stats.accounts_loaded += len(accounts)
+        self.stats.slots_loaded += len(slots)
+        return True
+
+    def save_accounts(self, evm, block_hash: str):
+        """Stores the accounts the fork database has loaded so far."""
+        rows = []
+        for address, info in evm.db_accounts.items():
+            rows.append((block_hash.lower(), address.lower(), str(info.balance), info.nonce, info.code or None))
+
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO accounts (block_hash, address, balance, nonce, code) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._touch(block_hash.lower())
+            self._evict()
+            self._db.commit()
+        self.stats.accounts_saved += len(rows)
+
+    def put_storage(self, block_hash: str, address: str, slots: Dict[int, int]):
+        """Stores storage values as fetched from the chain at ``block_hash``."""
+        rows = [(block_hash.lower(), address.lower(), hex(slot), hex(value)) for slot, value in slots.items()]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO storage (block_hash, address, slot, value) VALUES (?, ?, ?, ?)", rows
+            )
+            self._touch(block_hash.lower())
+            self._evict()
+            self._db.commit()
+        self.stats.slots_saved += len(rows)
+
+    def cached_slots(self, block_hash: str, address: str) -> Iterable[int]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT slot FROM storage WHERE block_hash = ? AND address = ?", (block_hash.lower(), address.lower())
+            ).fetchall()
+        return [int(slot, 16) for (slot,) in rows]
+
+    def accounts(self, block_hash: str) -> List[str]:
+        """Addresses with a cached account at ``block_hash``."""
+        with self._lock:
+            rows = self._db.execute("SELECT address FROM accounts WHERE block_hash = ?",
+                                    (block_hash.lower(),)).fetchall()
+        return [address for (address,) in rows]
+
+    def carry_over(self, from_hash: str, to_hash: str, accounts: Dict[str, Tuple[int, int]],
+                   storage_of: Iterable[str]):
+        """
+        Copies cached state of ``from_hash`` to ``to_hash`` for what is known not to have
+        changed in between: the code of ``accounts`` (``{address: (balance, nonce)}`` at
+        ``to_hash``) and every cached slot of the ``storage_of`` addresses. State already
+        cached at ``to_hash`` is kept.
+        """
+        from_hash, to_hash = from_hash.lower(), to_hash.lower()
+        with self._lock:
+            accounts_before = self._db.total_changes
+            for address, (balance, nonce) in accounts.items():
+                self._db.execute(
+                    "INSERT OR IGNORE INTO accounts (block_hash, address, balance, nonce, code) "
+                    "SELECT ?, address, ?, ?, code FROM accounts WHERE block_hash = ? AND address = ?",
+                    (to_hash, str(balance), nonce, from_hash, address.lower()))
+            slots_before = self._db.total_changes
+            for address in storage_of:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO storage (block_hash, address, slot, value) "
+                    "SELECT ?, address, slot, value FROM storage WHERE block_hash = ? AND address = ?",
+                    (to_hash, from_hash, address.lower()))
+            carried_accounts, carried_slots = slots_before - accounts_before, self._db.total_changes - slots_before
+            self._touch(to_hash)
+            self._evict()
+            self._db.commit()
+        self.stats.accounts_carried += carried_accounts
+        self.stats.slots_carried += carried_slots
+
+    def blocks(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT block_hash, size FROM blocks ORDER BY last_used DESC, rowid DESC"
+            ).fetchall())
+
+    def _touch(self, block_hash: str):
+        (accounts_size,) = self._db.execute(
+            "SELECT COALESCE(SUM(LENGTH(code)), 0) + COUNT(*) * ? FROM accounts WHERE block_hash = ?",
+            (ROW_SIZE, block_hash),
+        ).fetchone()
+        (slots_size,) = self._db.execute(
+            "SELECT COUNT(*) * ? FROM storage WHERE block_hash = ?", (ROW_SIZE, block_hash)
+        ).fetchone()
+        self._db.execute(
+            "INSERT OR REPLACE INTO blocks (block_hash, last_used, size) VALUES (?, ?, ?)",
+            (block_hash, time.time(), accounts_size + slots_size),
+        )
+
+    def _evict(self):
+        blocks = self._db.execute(
+            "SELECT block_hash, size FROM blocks ORDER BY last_used DESC, rowid DESC"
+        ).fetchall()
+        total = 0
+        for position, (block_hash, size) in enumerate(blocks):
+            total += size
+            # Always keep the most recent block, even if it alone exceeds max_bytes
+            if position > 0 and (position >= self.max_blocks or total > self.max_bytes):
+                self._drop(block_hash)
+                self.stats.evicted_blocks += 1
+
+    def _drop(self, block_hash: str):
+        for table in ("blocks", "accounts", "storage"):
+            self._db.execute(f"DELETE FROM {table} WHERE block_hash = ?", (block_hash,))
+
@@ -0,0 +1,193 @@
+"""
+Profit-maximizing input of cyclic V2 paths (WETH -> ... -> WETH).
+
+A V2 hop with proportional fees maps x to ``g * R_out * x / (R_in + g * x)``: 0.997 times
+what is left of x after the input token's sell fee goes in, and the output token's buy fee
+comes off what comes out. Hops compose into the same shape, a whole path returns
+``A * x / (1 + C * x)`` and the profit ``A * x / (1 + C * x) - x`` is concave, highest at
+
+    x* = (sqrt(A) - 1) / C        (a profit only exists when A > 1)
+
+solve_many() computes A and C of a batch of paths together, one NumPy operation per hop
+position, then checks x* with the exact integer maths of v2_math and the fee models.
+Paths quoted by something else than proportional fees (a ``quote`` callable) are solved
+with a bounded golden-section search instead. Nothing here runs in the EVM: the solved
+amount is the one CycleVerifier.verify_solved() runs once through the fork.
+
+    solutions = solve_many(paths, ReserveCache(evm), measured_fees(), max_amount=10 ** 18)
+"""
+import math
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from fee_models import fee_fraction
+from v2_math import ReserveCache, get_amount_out
+
+SWAP_FEE = 0.997
+GOLDEN = (math.sqrt(5) - 1) / 2
+
+
+class Solution:
+    def __init__(self, path: Sequence[str], amount_in: int, amount_out: int, method: str):
+        self.path = list(path)
+        self.amount_in = amount_in
+        self.amount_out = amount_out
+        self.method = method
+
+    @property
+    def profit(self) -> int:
+        return self.amount_out - self.amount_in
+
+    def __repr__(self):
+        return "Solution({}, amount_in={}, profit={}, method={})".format(" -> ".join(self.path), self.amount_in,
+                                                                        self.profit, self.method)
+
+
+def _check_cycle(path: Sequence[str]):
+    if len(path) < 3 or path[0].lower() != path[-1].lower():
+        raise ValueError("Not a cycle: {}".format(" -> ".join(path)))
+
+
+def _token_fees(fees: Dict[str, Tuple[float, float]], token: str) -> Tuple[float, float]:
+    # float() so a model object or method passed by mistake fails here, not as a silent 0 profit
+    buy, sell = fees.get(token.lower(), (0.0, 0.0))
+    return float(buy), float(sell)
+
+
+def _after_fee(amount: int, fee_percent: float) -> int:
+    # Rounded down like fee_models.ERC20Token.transfer
+    fee = fee_fraction(fee_percent)
+    return amount - amount * fee.numerator // fee.denominator
+
+
+def exact_amount_out(amount_in: int, path: Sequence[str], reserves: ReserveCache,
+                     fees: Optional[Dict[str, Tuple[float, float]]] = None) -> int:
+    """
+    What ``amount_in`` of ``path[0]`` comes back as at the end of the path in integer maths:
+    each hop loses the sell fee of its input token and the buy fee of its output token
+    (``fees`` is ``{token: (buy fee %, sell fee %)}``, as arbitrage.measured_fees()).
+    Raises ValueError where a swap would revert.
+    """
+    fees = fees or {}
+    amount = amount_in
+    for token_in, token_out in zip(path, path[1:]):
+        amount = _after_fee(amount, _token_fees(fees, token_in)[1])
+        amount = get_amount_out(amount, *reserves.get(token_in, token_out)) if amount > 0 else 0
+        amount = _after_fee(amount, _token_fees(fees, token_out)[0])
+    return amount
+
+
+def _profit(quote: Callable[[int], int], amount_in: int) -> int:
+    try:
+        return quote(amount_in) - amount_in
+    except ValueError:
+        return -amount_in
+
+
+def golden_section(quote: Callable[[int], int], low: int, high: int, max_iterations: int = 200) -> int:
+    """
+    Integer input in [low, high] with the highest ``quote(x) - x``, for a concave profit.
+    ``quote`` raising ValueError counts as losing the whole input.
+    """
+    profits = {}
+
+    def profit(amount):
+        if amount not in profits:
+            profits[amount] = _profit(quote, amount)
+        return profits[amount]
+
+    a, b = low, high
+    for _ in range(max_iterations):
+        if b - a <= 2:
+            break
+        # Golden-ratio points of [a, b], evaluations are memoized
+        c, d = b - int((b - a) * GOLDEN), a + int((b - a) * GOLDEN)
+        if c >= d:
+            c, d = (a + b) // 2, (a + b) // 2 + 1
+        if profit(c) >= profit(d):
+            b = d
+        else:
+            a = c
+    return max(range(a, b + 1), key=profit)
+
+
+def solve(path: Sequence[str], reserves: ReserveCache, fees: Optional[Dict[str, Tuple[float, float]]] = None,
+          max_amount: Optional[int] = None, quote: Optional[Callable[[int], int]] = None) -> Solution:
+    """
+    Best input of one cyclic path, at most ``max_amount``. With ``quote`` (input -> output of
+    the whole path) the profit is searched with golden_section() on [1, max_amount].
+    """
+    _check_cycle(path)
+    if quote is None:
+        return solve_many([path], reserves, fees, max_amount)[0]
+    if max_amount is None:
+        raise ValueError("A quote function needs a max_amount to bound the search")
+    amount_in = golden_section(quote, 1, max_amount)
+    try:
+        amount_out = quote(amount_in)
+    except ValueError:
+        amount_out = 0
+    return Solution(path, amount_in, amount_out, "golden_section")
+
+
+def path_coefficients(paths: Sequence[Sequence[str]], reserves: ReserveCache,
+                      fees: Optional[Dict[str, Tuple[float, float]]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """A and C of every path, ``output = A * x / (1 + C * x)``."""
+    fees = fees or {}
+    hops = max(len(path) - 1 for path in paths)
+    # Shorter paths are padded with hops that leave A and C as they are
+    padded = np.ones((len(paths), hops), dtype=bool)
+    r_in = np.ones((len(paths), hops))
+    r_out = np.ones((len(paths), hops))
+    g = np.zeros((len(paths), hops))
+    phi = np.ones((len(paths), hops))
+    for row, path in enumerate(paths):
+        for column, (token_in, token_out) in enumerate(zip(path, path[1:])):
+            reserve_in, reserve_out = reserves.get(token_in, token_out)
+            padded[row, column] = False
+            r_in[row, column], r_out[row, column] = float(reserve_in) or math.nan, float(reserve_out)
+            g[row, column] = SWAP_FEE * (1 - _token_fees(fees, token_in)[1] / 100)
+            phi[row, column] = 1 - _token_fees(fees, token_out)[0] / 100
+
+    a = np.ones(len(paths))
+    c = np.zeros(len(paths))
+    for column in range(hops):
+        step_a = phi[:, column] * g[:, column] * r_out[:, column] / r_in[:, column]
+        step_c = g[:, column] * a / r_in[:, column]
+        a = np.where(padded[:, column], a, a * step_a)
+        c = np.where(padded[:, column], c, c + step_c)
+    return a, c
+
+
+def solve_many(paths: Sequence[Sequence[str]], reserves: ReserveCache,
+               fees: Optional[Dict[str, Tuple[float, float]]] = None,
+               max_amount: Optional[int] = None) -> List[Solution]:
+    """
+    Closed-form best input of every cyclic path, at most ``max_amount``, in the same order.
+    Unprofitable paths get an amount_in of 0.
+    """
+    if not paths:
+        return []
+    for path in paths:
+        _check_cycle(path)
+    a, c = path_coefficients(paths, reserves, fees)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        optimum = np.where(a > 1, (np.sqrt(a) - 1) / c, 0.0)
+    optimum = np.nan_to_num(optimum, nan=0.0, posinf=0.0)
+
+    solutions = []
+    for path, amount in zip(paths, optimum.tolist()):
+        amount_in = int(amount)
+        if max_amount is not None:
+            amount_in = min(amount_in, max_amount)
+        if amount_in <= 0:
+            solutions.append(Solution(path, 0, 0, "closed_form"))
+            continue
+        try:
+            amount_out = exact_amount_out(amount_in, path, reserves, fees)
+        except ValueError:
+            amount_in, amount_out = 0, 0
+        solutions.append(Solution(path, amount_in, amount_out, "closed_form"))
+    return solutions
+
@@ -0,0 +1,157 @@
+"""
+Batches of view calls, possibly to different contracts, run as one EVM call.
+
+A small aggregator contract is put into the state at AGGREGATOR_ADDR. It STATICCALLs every
+call of the batch and returns the success flag and return data of each one, so a revert
+only fails its own call. Results come back decoded, in the order the calls were added:
+
+    batch = Multicall(sim)
+    batch.add(token, "balanceOf", MY_ADDR)
+    batch.add(pair, "getReserves")
+    balance, (reserve0, reserve1, _) = batch.values()
+
+The calls run with the aggregator as msg.sender, which is what a view call gets anyway.
+"""
+from typing import Any, List, Optional
+
+from eth_abi import decode
+from pyrevm import AccountInfo
+
+from contract import Contract
+
+AGGREGATOR_ADDR = "0x000000000000000000000000000000000000ca11"
+AGGREGATOR_CALLER = "0x000000000000000000000000000000000000ca12"
+
+# Calldata is one record per call: target (20 bytes) | data length (4 bytes) | data.
+# Returns one record per call: success word | return data size word | return data padded
+# to a word. Stack is [out, in] while looping, top first:
+#
+#   0000 PUSH1 0 PUSH1 0                         out = in = 0
+#   0004 JUMPDEST                                loop:
+#        DUP1 CALLDATASIZE GT ISZERO             if in >= calldatasize
+#        PUSH2 0059 JUMPI                          goto end
+#        DUP1 CALLDATALOAD PUSH1 60 SHR          target
+#        DUP2 PUSH1 14 ADD CALLDATALOAD          len
+#        PUSH1 e0 SHR
+#        DUP1 DUP4 PUSH1 18 ADD                  copy the data to out + 64
+#        DUP6 PUSH1 40 ADD CALLDATACOPY
+#        PUSH1 0 PUSH1 0 DUP3 DUP7 PUSH1 40 ADD  staticcall(gas, target, out + 64, len, 0, 0)
+#        DUP6 GAS STATICCALL
+#        DUP5 MSTORE                             mem[out] = success
+#        RETURNDATASIZE DUP1 DUP6 PUSH1 20 ADD   mem[out + 32] = size
+#        MSTORE
+#        DUP1 PUSH1 0 DUP7 PUSH1 40 ADD          mem[out + 64:] = return data
+#        RETURNDATACOPY
+#        PUSH1 1f ADD PUSH1 1f NOT AND           out += 64 + size rounded up to a word
+#        PUSH1 40 ADD DUP5 ADD SWAP4 POP
+#        SWAP1 POP ADD PUSH1 18 ADD              in += 24 + len
+#        PUSH2 0004 JUMP
+#   0059 JUMPDEST                                end:
+#        POP PUSH1 0 RETURN                      return mem[0:out]
+AGGREGATOR_CODE = bytes.fromhex(
+    "600060005b8036111561005957803560601c816014013560e01c80836018018560400137600060008286604001855afa8452"
+    "3d808560200152806000866040013e601f01601f191660400184019350905001601801610004565b506000f3"
+)
+
+ERROR_SELECTOR = bytes.fromhex("08c379a0")  # Error(string)
+PANIC_SELECTOR = bytes.fromhex("4e487b71")  # Panic(uint256)
+
+
+def revert_reason(data: bytes) -> str:
+    """Readable reason of a revert's return data."""
+    try:
+        if data[:4] == ERROR_SELECTOR:
+            return "execution reverted: {}".format(decode(["string"], data[4:])[0])
+        if data[:4] == PANIC_SELECTOR:
+            return "execution reverted: panic {:#x}".format(decode(["uint256"], data[4:])[0])
+    except Exception:
+        pass
+    return "execution reverted" + (": 0x" + data.hex() if data else "")
+
+
+class CallResult:
+    def __init__(self, success: bool, value: Any = None, error: Optional[str] = None):
+        self.success = success
+        self.value = value
+        self.error = error
+
+    def unwrap(self) -> Any:
+        """The decoded value, raises RuntimeError with the reason if the call failed."""
+        if not self.success:
+            raise RuntimeError(self.error)
+        return self.value
+
+    def __repr__(self):
+        if self.success:
+            return "CallResult(value={!r})".format(self.value)
+        return "CallResult(error={!r})".format(self.error)
+
+
+class Multicall:
+    """
+    Collects view calls with add() and runs them with execute(), which also empties the batch.
+
+    Works inside Simulator.isolated() scopes: the calls never change state, and when a scope
+    revert removed the aggregator it is put back on the next execute().
+    """
+
+    def __init__(self, revm, address: str = AGGREGATOR_ADDR, caller: str = AGGREGATOR_CALLER):
+        self.revm = revm
+        self.address = address
+        self.caller = caller
+        self._calls = []
+
+    def __len__(self):
+        return len(self._calls)
+
+    def add(self, contract: Contract, identifier: str, *args) -> int:
+        """Queues ``contract.<identifier>(*args)``, returns the position of its result."""
+        candidates = contract.abi.find(identifier)
+        if not candidates:
+            raise AttributeError(f"No function with identifier {identifier} in contract ABI")
+        func = candidates[0] if len(candidates) == 1 else contract.abi.resolve_overload(candidates, args)
+        if not func.constant:
+            raise ValueError(f"Cannot batch the non-constant function {func.name}")
+        self._calls.append((contract.address, func, func.encode_inputs(args)))
+        return len(self._calls) - 1
+
+    def execute(self) -> List[CallResult]:
+        calls, self._calls = self._calls, []
+        if not calls:
+            return []
+
+        calldata = b"".join(bytes.fromhex(address[2:]) + len(data).to_bytes(4, "big") + data
+                            for address, _, data in calls)
+        output = self._call(calldata)
+        if not output:
+            # Never deployed, or removed by the revert of the scope it was deployed in
+            self.deploy()
+            output = self._call(calldata)
+
+        results = []
+        offset = 0
+        for _, func, _ in calls:
+            success = output[offset + 31] == 1
+            size = int.from_bytes(output[offset + 32: offset + 64], "big")
+            data = output[offset + 64: offset + 64 + size]
+            offset += 64 + (size + 31) // 32 * 32
+            if not success:
+                results.append(CallResult(False, error=revert_reason(data)))
+                continue
+            try:
+                results.append(CallResult(True, value=func.decode_outputs(data)))
+            except Exception as e:
+                # Not the ABI the contract was called with
+                results.append(CallResult(False, error="{}: {}".format(type(e).__name__, e)))
+        return results
+
+    def values(self) -> list:
+        """execute(), raising RuntimeError on the first call that failed."""
+        return [result.unwrap() for result in self.execute()]
+
+    def deploy(self):
+        self.revm.insert_account_info(self.address, AccountInfo(code=AGGREGATOR_CODE))
+
+    def _call(self, calldata: bytes) -> bytes:
+        return bytes(self.revm.message_call(caller=self.caller, to=self.address, calldata=calldata,
+                                            is_static=True))
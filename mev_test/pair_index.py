@@ -0,0 +1,254 @@
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from abi import load_abi_file
+from rpc_client import BatchRPCClient, RPCError
+from uniswap_v2 import (UNISWAP_V2_FACTORY, UNISWAP_V2_INIT_CODE_HASH, PAIR_RESERVES_SLOT, PAIR_TOKEN0_SLOT,
+                        PAIR_TOKEN1_SLOT, WETH_ADDR, decode_reserves, pair_address, sort_tokens)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pairs (
+    pair TEXT PRIMARY KEY,
+    token0 TEXT NOT NULL,
+    token1 TEXT NOT NULL,
+    factory_index INTEGER
+);
+CREATE UNIQUE INDEX IF NOT EXISTS pairs_by_tokens ON pairs (token0, token1);
+CREATE INDEX IF NOT EXISTS pairs_by_token1 ON pairs (token1);
+CREATE TABLE IF NOT EXISTS reserves (
+    pair TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    reserve0 TEXT NOT NULL,
+    reserve1 TEXT NOT NULL,
+    timestamp_last INTEGER NOT NULL,
+    PRIMARY KEY (pair, block_number)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+FACTORY_ABI_FILE = "./abi/uniswapv2factory.abi"
+
+
+class PairInfo:
+    def __init__(self, pair: str, token0: str, token1: str, reserve0: Optional[int] = None,
+                 reserve1: Optional[int] = None, block_number: Optional[int] = None):
+        self.pair = pair
+        self.token0 = token0
+        self.token1 = token1
+        self.reserve0 = reserve0
+        self.reserve1 = reserve1
+        self.block_number = block_number
+
+    def other(self, token: str) -> str:
+        return self.token1 if token.lower() == self.token0 else self.token0
+
+    def reserves(self, token_in: str):
+        """(reserve_in, reserve_out) selling ``token_in``, None if no reserves are known."""
+        if self.reserve0 is None:
+            return None
+        return (self.reserve0, self.reserve1) if token_in.lower() == self.token0 else (self.reserve1, self.reserve0)
+
+    def has_liquidity(self) -> bool:
+        return bool(self.reserve0) and bool(self.reserve1)
+
+
+class PairIndex:
+    """
+    V2 pairs by token in a SQLite file: token0/token1 of every known pair and their
+    reserves at the blocks they were read at. Lookups go through the token indexes, a pair
+    of two tokens is one primary key hit.
+
+    Filled by PairIndexer, either from the factory's allPairs list or by deriving the pair
+    address of given tokens with CREATE2.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def add_pairs(self, pairs: Iterable[tuple]):
+        """Adds ``(pair, token0, token1, factory_index)`` rows, factory_index may be None."""
+        rows = [(pair.lower(), token0.lower(), token1.lower(), index) for pair, token0, token1, index in pairs]
+        with self._lock:
+            # A pair found by CREATE2 first gets its factory index when the factory list reaches it
+            self._db.executemany(
+                "INSERT INTO pairs (pair, token0, token1, factory_index) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (pair) DO UPDATE SET factory_index = coalesce(excluded.factory_index, factory_index)",
+                rows)
+            self._db.commit()
+
+    def set_reserves(self, block_number: int, reserves: Iterable[tuple]):
+        """Stores ``(pair, reserve0, reserve1, timestamp_last)`` read at ``block_number``."""
+        rows = [(pair.lower(), block_number, hex(reserve0), hex(reserve1), timestamp)
+                for pair, reserve0, reserve1, timestamp in reserves]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO reserves VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def get_meta(self, key: str, default: int = 0) -> int:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value: int):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+            self._db.commit()
+
+    def pair_count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM pairs").fetchone()[0]
+
+    def get(self, token_a: str, token_b: str, block_number: Optional[int] = None) -> Optional[PairInfo]:
+        """The pair of two tokens with its latest reserves (at or before ``block_number``), None if unknown."""
+        token0, token1 = sort_tokens(token_a, token_b)
+        with self._lock:
+            row = self._db.execute("SELECT pair, token0, token1 FROM pairs WHERE token0 = ? AND token1 = ?",
+                                   (token0, token1)).fetchone()
+            return self._info(row, block_number) if row else None
+
+    def pairs_of(self, token: str, block_number: Optional[int] = None) -> List[PairInfo]:
+        token = token.lower()
+        with self._lock:
+            rows = self._db.execute("SELECT pair, token0, token1 FROM pairs WHERE token0 = ? "
+                                    "UNION ALL SELECT pair, token0, token1 FROM pairs WHERE token1 = ?",
+                                    (token, token)).fetchall()
+            return [self._info(row, block_number) for row in rows]
+
+    def pairs_with_reserves(self, block_number: Optional[int] = None) -> List[PairInfo]:
+        """Every pair with known reserves, the latest at or before ``block_number``."""
+        query = ("SELECT p.pair, p.token0, p.token1, r.reserve0, r.reserve1, r.block_number FROM pairs p "
+                 "JOIN reserves r ON r.pair = p.pair AND r.block_number = "
+                 "(SELECT max(block_number) FROM reserves WHERE pair = p.pair{})")
+        params = ()
+        if block_number is not None:
+            query, params = query.format(" AND block_number <= ?"), (block_number,)
+        else:
+            query = query.format("")
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [PairInfo(pair, token0, token1, int(reserve0, 16), int(reserve1, 16), block)
+                for pair, token0, token1, reserve0, reserve1, block in rows]
+
+    def _info(self, row, block_number: Optional[int]) -> PairInfo:
+        query = "SELECT reserve0, reserve1, block_number FROM reserves WHERE pair = ?"
+        params = [row[0]]
+        if block_number is not None:
+            query += " AND block_number <= ?"
+            params.append(block_number)
+        reserves = self._db.execute(query + " ORDER BY block_number DESC LIMIT 1", params).fetchone()
+        if reserves is None:
+            return PairInfo(*row)
+        return PairInfo(*row, int(reserves[0], 16), int(reserves[1], 16), reserves[2])
+
+
+class PairIndexer:
+    """
+    Updates a PairIndex from a node at one block, everything in JSON-RPC batches of
+    ``batch_size`` calls.
+
+    sync_factory() adds the pairs created since the last sync (allPairs is append only),
+    discover() derives the pair of each token with a quote token by CREATE2 and adds the
+    ones that hold reserves, refresh_reserves() records the reserves of known pairs.
+    """
+
+    def __init__(self, index: PairIndex, rpc_url: str, block_hash: str, block_number: int,
+                 factory: str = UNISWAP_V2_FACTORY, init_code_hash: str = UNISWAP_V2_INIT_CODE_HASH,
+                 batch_size: int = 500):
+        self.index = index
+        self.client = BatchRPCClient(rpc_url)
+        self.block = {"blockHash": block_hash}
+        self.block_number = block_number
+        self.factory = factory
+        self.init_code_hash = init_code_hash
+        self.batch_size = batch_size
+        self.factory_abi = load_abi_file(FACTORY_ABI_FILE)
+
+    def batch(self, calls: list) -> list:
+        results = []
+        for start in range(0, len(calls), self.batch_size):
+            results.extend(self.client.batch(calls[start: start + self.batch_size]))
+        return results
+
+    def eth_call(self, name: str, *args) -> tuple:
+        func = self.factory_abi.find(name)[0]
+        return "eth_call", [{"to": self.factory, "data": "0x" + func.encode_inputs(args).hex()}, self.block]
+
+    def storage(self, address: str, slot: int) -> tuple:
+        return "eth_getStorageAt", [address, hex(slot), self.block]
+
+    def sync_factory(self, limit: Optional[int] = None) -> int:
+        """Adds the factory's pairs not indexed yet (at most ``limit``), returns how many were added."""
+        length_call = self.eth_call("allPairsLength")
+        length = self.factory_abi.find("allPairsLength")[0].decode_outputs(
+            bytes.fromhex(self.client.call(*length_call)[2:]))
+        start = self.index.get_meta("factory_pairs")
+        end = length if limit is None else min(length, start + limit)
+        if end <= start:
+            return 0
+
+        all_pairs = self.factory_abi.find("allPairs")[0]
+        addresses = self.batch([self.eth_call("allPairs", index) for index in range(start, end)])
+        # Stop at the first failed call so the next sync carries on from there
+        for offset, result in enumerate(addresses):
+            if isinstance(result, RPCError):
+                addresses, end = addresses[:offset], start + offset
+                break
+        addresses = [all_pairs.decode_outputs(bytes.fromhex(result[2:])) for result in addresses]
+        tokens = self.batch([self.storage(pair, slot) for pair in addresses
+                             for slot in (PAIR_TOKEN0_SLOT, PAIR_TOKEN1_SLOT)])
+
+        rows = []
+        for offset, pair in enumerate(addresses):
+            token0, token1 = tokens[2 * offset], tokens[2 * offset + 1]
+            if isinstance(token0, RPCError) or isinstance(token1, RPCError):
+                end = start + offset
+                break
+            rows.append((pair, "0x" + token0[-40:], "0x" + token1[-40:], start + offset))
+        self.index.add_pairs(rows)
+        self.index.set_meta("factory_pairs", end)
+        self.index.set_meta("synced_block", self.block_number)
+        return len(rows)
+
+    def discover(self, tokens: Iterable[str], quote: str = WETH_ADDR) -> Dict[str, Optional[PairInfo]]:
+        """
+        ``{token: PairInfo}`` of the pair of every token with ``quote``, with its reserves at
+        this block, None for the tokens whose pair does not exist or holds nothing.
+        """
+        tokens = list(tokens)
+        pairs = [pair_address(token, quote, self.factory, self.init_code_hash) for token in tokens]
+        words = self.batch([self.storage(pair, PAIR_RESERVES_SLOT) for pair in pairs])
+
+        found, reserves = [], []
+        for token, pair, word in zip(tokens, pairs, words):
+            if isinstance(word, RPCError):
+                continue
+            if int(word, 16):
+                found.append((pair, *sort_tokens(token, quote), None))
+            elif self.index.get(token, quote) is None:
+                # No code or never traded, nothing worth indexing
+                continue
+            reserves.append((pair, *decode_reserves(int(word, 16))))
+        self.index.add_pairs(found)
+        self.index.set_reserves(self.block_number, reserves)
+        return {token: self.index.get(token, quote, self.block_number) for token in tokens}
+
+    def refresh_reserves(self, pairs: Iterable[str]) -> int:
+        """Records the reserves of ``pairs`` at this block, returns how many could be read."""
+        pairs = list(pairs)
+        words = self.batch([self.storage(pair, PAIR_RESERVES_SLOT) for pair in pairs])
+        reserves = [(pair, *decode_reserves(int(word, 16))) for pair, word in zip(pairs, words)
+                    if not isinstance(word, RPCError)]
+        self.index.set_reserves(self.block_number, reserves)
+        return len(reserves)
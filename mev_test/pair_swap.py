@@ -0,0 +1,61 @@
+"""
+Swaps straight through Uniswap V2 pairs, without the router.
+
+The pair address is derived offline (CREATE2 from the factory and the init code hash), its
+reserves are read from the reserves slot and the output is quoted with v2_math. A swap is
+then a transfer of the input to the pair and one pair.swap() call: no approve, no
+transferFrom, no factory getPair and none of the router's bookkeeping.
+
+The amounts are those swapExactTokensForTokens would use, so a fee measured against the
+returned ``amount_out`` means the same as it did through the router.
+"""
+from typing import Dict, Tuple
+
+from contract import Contract
+from uniswap_v2 import (UNISWAP_V2_FACTORY, UNISWAP_V2_INIT_CODE_HASH, PAIR_RESERVES_SLOT, decode_reserves,
+                        pair_address)
+from v2_math import get_amount_out
+
+PAIR_ABI_FILE = "./abi/uniswapv2.abi"
+
+
+class PairSwapper:
+    def __init__(self, revm, factory: str = UNISWAP_V2_FACTORY, init_code_hash: str = UNISWAP_V2_INIT_CODE_HASH):
+        self.revm = revm
+        self.factory = factory
+        self.init_code_hash = init_code_hash
+        self._pairs: Dict[Tuple[str, str], Contract] = {}
+
+    def pair(self, token_a: str, token_b: str) -> Contract:
+        key = (token_a.lower(), token_b.lower())
+        pair = self._pairs.get(key)
+        if pair is None:
+            pair = Contract(pair_address(token_a, token_b, self.factory, self.init_code_hash), revm=self.revm,
+                            abi_file_path=PAIR_ABI_FILE)
+            self._pairs[key] = self._pairs[key[::-1]] = pair
+        return pair
+
+    def reserves(self, token_in: str, token_out: str) -> Tuple[int, int]:
+        """(reserve_in, reserve_out) in the current state, (0, 0) when the pair does not exist."""
+        reserve0, reserve1, _ = decode_reserves(self.revm.storage(self.pair(token_in, token_out).address,
+                                                                  PAIR_RESERVES_SLOT))
+        return (reserve0, reserve1) if token_in.lower() < token_out.lower() else (reserve1, reserve0)
+
+    def quote(self, amount_in: int, token_in: str, token_out: str) -> int:
+        """getAmountsOut(amount_in, [token_in, token_out])[1], raises ValueError where the router reverts."""
+        return get_amount_out(amount_in, *self.reserves(token_in, token_out))
+
+    def swap_exact_in(self, token_in: Contract, token_out: str, amount_in: int, recipient: str, caller: str) -> int:
+        """
+        Sells ``amount_in`` of ``token_in`` held by ``caller`` for ``token_out`` sent to
+        ``recipient``, returns the quoted output the pair was asked for.
+
+        The quote assumes the pair receives all of ``amount_in``, like the router does, so use
+        it to buy with an input token that takes no fee (WETH).
+        """
+        amount_out = self.quote(amount_in, token_in.address, token_out)
+        pair = self.pair(token_in.address, token_out)
+        token_in.transfer(pair.address, amount_in, caller=caller)
+        zero_for_one = token_in.address.lower() < token_out.lower()
+        pair.swap(0 if zero_for_one else amount_out, amount_out if zero_for_one else 0, recipient, b'', caller=caller)
+        return amount_out
@@ -0,0 +1,156 @@
+import http.client
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from pyrevm import AccountInfo
+
+from rpc_client import BatchRPCClient, RPCError
+from uniswap_v2 import WETH_ADDR, PAIR_BALANCE_OF_SLOT, PAIR_SWAP_SLOTS, WETH_BALANCE_OF_SLOT, mapping_slot, pair_address
+
+# Slots most ERC20s declare their balances mapping at (plain OZ ERC20, Ownable first, ...)
+TOKEN_BALANCE_SLOT_CANDIDATES = range(0, 6)
+
+
+class AccountState:
+    def __init__(self, address: str, balance: int, nonce: int, code: bytes, storage: Dict[int, int]):
+        self.address = address
+        self.balance = balance
+        self.nonce = nonce
+        self.code = code
+        self.storage = storage
+
+
+class PrefetchStats:
+    def __init__(self):
+        self.batches = 0
+        self.accounts = 0
+        self.slots = 0
+        self.failed = 0
+
+    def as_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+class Prefetcher:
+    """
+    Fetches ahead of the simulation the state a token check is known to touch and seeds
+    it into the fork database, so pyrevm does not fetch it one round-trip at a time.
+
+    For each token: its code and balance slots, the WETH/token pair (address derived with
+    CREATE2) with the slots swap() uses, and the WETH balances of the holders. Everything
+    for one token goes in a single JSON-RPC batch, ``threads`` batches are in flight while
+    earlier tokens are simulated (``iter_seeded``).
+
+    Missing or failed values are simply not seeded, pyrevm then fetches them lazily.
+    ``holders`` defaults to fee_checker's MY_ADDR and BOT_ADDR.
+    """
+
+    def __init__(self, rpc_url: str, block_hash: str, threads: int = 4, lookahead: int = 8,
+                 holders=None, state_cache=None):
+        if holders is None:
+            # Imported here, fee_checker imports this module
+            from fee_checker import BOT_ADDR, MY_ADDR
+            holders = (MY_ADDR, BOT_ADDR)
+        self.client = BatchRPCClient(rpc_url)
+        self.block_hash = block_hash
+        self.block = {"blockHash": block_hash}
+        self.lookahead = lookahead
+        self.holders = holders
+        self.state_cache = state_cache
+        self.stats = PrefetchStats()
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="prefetch")
+        self._seeded = set()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def common_plan(self) -> Dict[str, List[int]]:
+        """Accounts every token check touches."""
+        plan = {
+            WETH_ADDR: [mapping_slot(holder, WETH_BALANCE_OF_SLOT) for holder in self.holders],
+        }
+        for holder in self.holders:
+            plan[holder] = []
+        return plan
+
+    def plan(self, token: str) -> Dict[str, List[int]]:
+        pair = pair_address(WETH_ADDR, token)
+        holders = list(self.holders) + [pair]
+        return {
+            token: [mapping_slot(holder, slot) for slot in TOKEN_BALANCE_SLOT_CANDIDATES for holder in holders],
+            pair: list(PAIR_SWAP_SLOTS) + [mapping_slot(holder, PAIR_BALANCE_OF_SLOT) for holder in holders],
+            # WETH balance of the pair, read by swap()
+            WETH_ADDR: [mapping_slot(pair, WETH_BALANCE_OF_SLOT)],
+        }
+
+    def fetch(self, plan: Dict[str, List[int]]) -> List[AccountState]:
+        calls = []
+        for address, slots in plan.items():
+            calls.append(("eth_getBalance", [address, self.block]))
+            calls.append(("eth_getTransactionCount", [address, self.block]))
+            calls.append(("eth_getCode", [address, self.block]))
+            calls.extend(("eth_getStorageAt", [address, hex(slot), self.block]) for slot in slots)
+
+        results = iter(self.client.batch(calls))
+        self.stats.batches += 1
+        states = []
+        for address, slots in plan.items():
+            balance, nonce, code = next(results), next(results), next(results)
+            storage = dict()
+            for slot in slots:
+                value = next(results)
+                if not isinstance(value, RPCError):
+                    storage[slot] = int(value, 16)
+            if any(isinstance(value, RPCError) for value in (balance, nonce, code)):
+                self.stats.failed += 1
+                balance = nonce = code = None
+            else:
+                balance, nonce, code = int(balance, 16), int(nonce, 16), bytes.fromhex(code[2:])
+            states.append(AccountState(address, balance, nonce, code, storage))
+        return states
+
+    def seed(self, evm, states: Iterable[AccountState]):
+        for state in states:
+            address = state.address.lower()
+            if address not in self._seeded and state.balance is not None:
+                evm.insert_account_info(address, AccountInfo(balance=state.balance, nonce=state.nonce,
+                                                             code=state.code))
+                self._seeded.add(address)
+                self.stats.accounts += 1
+            if address not in self._seeded:
+                continue
+            for slot, value in state.storage.items():
+                evm.insert_account_storage(address, slot, value)
+            self.stats.slots += len(state.storage)
+            if self.state_cache and state.storage:
+                self.state_cache.put_storage(self.block_hash, address, state.storage)
+
+    def seed_common(self, evm):
+        self.seed(evm, self.fetch(self.common_plan()))
+
+    def iter_seeded(self, evm, items: Iterable, address_of: Optional[Callable] = None):
+        """
+        Yields ``items`` in order, each one after its token state has been seeded into
+        ``evm``, while the state of the next ``lookahead`` tokens is being fetched.
+        """
+        address_of = address_of or (lambda item: item)
+        items = iter(items)
+        pending = deque()
+
+        def submit():
+            item = next(items, None)
+            if item is not None:
+                pending.append((item, self._executor.submit(self.fetch, self.plan(address_of(item)))))
+
+        for _ in range(self.lookahead):
+            submit()
+        while pending:
+            item, future = pending.popleft()
+            submit()
+            try:
+                self.seed(evm, future.result())
+            except (RPCError, OSError, ValueError, http.client.HTTPException):
+                # Left to the fork to fetch lazily
+                self.stats.failed += 1
+            yield item
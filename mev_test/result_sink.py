@@ -0,0 +1,187 @@
+import csv
+import json
+import os
+import queue
+import threading
+from typing import Optional
+
+FIELDS = [
+    "index", "address", "name", "block", "has_v2_pair",
+    "buy_fee", "transfer_fee", "sell_fee", "buy_status", "transfer_status", "sell_status",
+    "status", "error_class", "error", "elapsed_ms", "reused_from",
+]
+FORMATS = ("jsonl", "csv", "parquet")
+
+
+def make_record(address: str, name: str, block: int, result=None, error=None,
+                elapsed: float = 0.0, index: Optional[int] = None) -> dict:
+    """
+    Flat record of one token check. ``result`` is a FeeCheckResult, ``error`` either the
+    exception or its "ErrorClass: message" string as carried by ScanResult.
+    """
+    record = dict.fromkeys(FIELDS)
+    record.update(index=index, address=address, name=name, block=block, elapsed_ms=round(elapsed * 1000, 3))
+    if result is not None:
+        for field in ("has_v2_pair", "buy_fee", "transfer_fee", "sell_fee",
+                      "buy_status", "transfer_status", "sell_status"):
+            record[field] = getattr(result, field, None)
+
+    if error is not None:
+        record["status"] = "ERROR"
+        if isinstance(error, BaseException):
+            record["error_class"], record["error"] = type(error).__name__, str(error)
+        else:
+            error_class, _, message = str(error).partition(": ")
+            record["error_class"], record["error"] = error_class, message
+    elif result is None or not result.has_v2_pair:
+        record["status"] = "NO_PAIR"
+    else:
+        statuses = [record[field] for field in ("buy_status", "transfer_status", "sell_status") if record[field]]
+        wrong = [status for status in statuses if status != "OK"]
+        record["status"] = wrong[0] if wrong else "OK"
+    return record
+
+
+def format_record(record: dict) -> str:
+    """fee_checker.format_result of a record, with the block a reused record was simulated at."""
+    def fee(field):
+        return "-" if record.get(field) is None else "{:.1f}%".format(record[field])
+
+    line = "    V2Pair: {}, Buy Fee: {} ({}), Transfer Fee: {} ({}), Sell Fee: {} ({})".format(
+        record.get("has_v2_pair"), fee("buy_fee"), record.get("buy_status"), fee("transfer_fee"),
+        record.get("transfer_status"), fee("sell_fee"), record.get("sell_status"))
+    if record.get("reused_from") is not None:
+        line += ", reused from block {}".format(record["reused_from"])
+    return line
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write_many(self, records):
+        self.file.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CsvWriter:
+    def __init__(self, path):
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", encoding="utf-8", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=FIELDS, extrasaction="ignore")
+        if new_file:
+            self.writer.writeheader()
+
+    def write_many(self, records):
+        self.writer.writerows(records)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """One row group per flush. The file is only readable once closed (parquet footer)."""
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("The parquet format needs pyarrow: pip install pyarrow")
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([
+            ("index", pyarrow.int64()), ("address", pyarrow.string()), ("name", pyarrow.string()),
+            ("block", pyarrow.int64()), ("has_v2_pair", pyarrow.bool_()),
+            ("buy_fee", pyarrow.float64()), ("transfer_fee", pyarrow.float64()), ("sell_fee", pyarrow.float64()),
+            ("buy_status", pyarrow.string()), ("transfer_status", pyarrow.string()),
+            ("sell_status", pyarrow.string()), ("status", pyarrow.string()), ("error_class", pyarrow.string()),
+            ("error", pyarrow.string()), ("elapsed_ms", pyarrow.float64()), ("reused_from", pyarrow.int64()),
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.pending = []
+
+    def write_many(self, records):
+        self.pending.extend(records)
+
+    def flush(self):
+        if self.pending:
+            self.writer.write_table(self.pyarrow.Table.from_pylist(self.pending, schema=self.schema))
+            self.pending = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+WRITERS = {"jsonl": JsonlWriter, "csv": CsvWriter, "parquet": ParquetWriter}
+
+
+class ResultSink:
+    """
+    Streams one record per token to a JSONL, CSV or Parquet file from a background thread.
+
+    ``write`` only enqueues, the simulation loop never waits on the disk. The writer drains
+    the queue in batches and flushes whenever it catches up (or every ``flush_every``
+    records), so JSONL/CSV files can be tailed while the scan runs and a crash loses at
+    most the records still in the queue.
+    """
+
+    def __init__(self, path: str, fmt: Optional[str] = None, flush_every: int = 64):
+        fmt = fmt or os.path.splitext(path)[1].lstrip(".")
+        if fmt not in WRITERS:
+            raise ValueError("Unknown result format {}, expected one of {}".format(fmt, FORMATS))
+        self.path = path
+        self.flush_every = flush_every
+        self.written = 0
+        self._writer = WRITERS[fmt](path)
+        self._queue = queue.SimpleQueue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="result-sink", daemon=True)
+        self._thread.start()
+
+    def write(self, record: dict):
+        if self._error:
+            raise self._error
+        self._queue.put(record)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._writer.close()
+        if self._error:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        done = False
+        while not done:
+            batch = [self._queue.get()]
+            while len(batch) < self.flush_every:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                done = True
+                batch.pop()
+            try:
+                if batch:
+                    self._writer.write_many(batch)
+                    self._writer.flush()
+                    self.written += len(batch)
+            except Exception as e:
+                self._error = e
+                return
@@ -0,0 +1,84 @@
+import http.client
+import json
+import threading
+from urllib.parse import urlsplit
+
+
+class RPCError(Exception):
+    pass
+
+
+class BatchRPCClient:
+    """
+    Minimal JSON-RPC client sending batch requests over keep-alive connections,
+    one pooled connection per thread.
+    """
+
+    def __init__(self, rpc_url: str, timeout: float = 30):
+        url = urlsplit(rpc_url)
+        self.connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self.host = url.hostname
+        self.port = url.port
+        self.path = url.path or "/"
+        self.timeout = timeout
+        self._local = threading.local()
+        self.requests = 0
+        self.calls = 0
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self.connection_class(self.host, self.port, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _post(self, payload):
+        body = json.dumps(payload).encode()
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request("POST", self.path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # The server may have closed an idle keep-alive connection, reconnect once
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise RPCError("HTTP {}: {}".format(response.status, data[:200]))
+        return json.loads(data)
+
+    def call(self, method: str, params: list):
+        response = self._post({"jsonrpc": "2.0", "id": 0, "method": method, "params": params})
+        self.requests += 1
+        self.calls += 1
+        if "error" in response:
+            raise RPCError(response["error"])
+        return response["result"]
+
+    def batch(self, calls: list) -> list:
+        """
+        Sends ``[(method, params), ...]`` as one request, returns the results in the same
+        order, with an RPCError instance in place of every failed call.
+        """
+        if not calls:
+            return []
+        payload = [{"jsonrpc": "2.0", "id": index, "method": method, "params": params}
+                   for index, (method, params) in enumerate(calls)]
+        responses = self._post(payload)
+        self.requests += 1
+        self.calls += len(calls)
+        if isinstance(responses, dict):
+            # Some nodes answer a failed batch with a single error object
+            return [RPCError(responses.get("error"))] * len(calls)
+
+        results = [RPCError("missing response")] * len(calls)
+        for response in responses:
+            index = response.get("id")
+            if isinstance(index, int) and 0 <= index < len(calls):
+                results[index] = RPCError(response["error"]) if "error" in response else response.get("result")
+        return results
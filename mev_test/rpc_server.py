@@ -0,0 +1,219 @@
+import argparse
+import gzip
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+FIXTURE_SUFFIX = ".json.gz"
+MISSING_FIXTURE = -32001
+# Record mode, the upstream node could not be reached or answered garbage, never recorded
+UPSTREAM_ERROR = -32002
+
+
+def get_args() -> argparse.Namespace:
+    parse = argparse.ArgumentParser(description="Record/replay JSON-RPC stand-in for forking offline")
+    parse.add_argument('mode', choices=['record', 'replay'])
+    parse.add_argument('--fixtures', default='./fixtures', help='Directory of per-method fixture files')
+    parse.add_argument('--upstream', default='http://192.168.1.58:8545', help='Node proxied in record mode')
+    parse.add_argument('--host', default='127.0.0.1')
+    parse.add_argument('--port', type=int, default=8545)
+    return parse.parse_args()
+
+
+def params_key(params) -> str:
+    """Canonical key of a params list, hex strings are case insensitive (checksummed addresses)."""
+    def normalize(value):
+        if isinstance(value, str) and value.startswith("0x"):
+            return value.lower()
+        if isinstance(value, list):
+            return [normalize(item) for item in value]
+        if isinstance(value, dict):
+            return {key: normalize(item) for key, item in value.items()}
+        return value
+
+    return json.dumps(normalize(params or []), sort_keys=True, separators=(",", ":"))
+
+
+class FixtureStore:
+    """
+    JSON-RPC responses grouped by method, one gzip'd JSON file per method:
+    ``{params_key: {"result": ...}}`` or ``{params_key: {"error": ...}}``.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._fixtures: Dict[str, Dict[str, dict]] = dict()
+        self._dirty = set()
+        self._lock = threading.Lock()
+        if os.path.isdir(directory):
+            for file_name in os.listdir(directory):
+                if file_name.endswith(FIXTURE_SUFFIX):
+                    with gzip.open(os.path.join(directory, file_name), "rt") as file:
+                        self._fixtures[file_name[:-len(FIXTURE_SUFFIX)]] = json.load(file)
+
+    def get(self, method: str, params) -> Optional[dict]:
+        return self._fixtures.get(method, {}).get(params_key(params))
+
+    def put(self, method: str, params, response: dict):
+        with self._lock:
+            self._fixtures.setdefault(method, {})[params_key(params)] = response
+            self._dirty.add(method)
+
+    def flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            snapshot = {method: dict(self._fixtures[method]) for method in dirty}
+        os.makedirs(self.directory, exist_ok=True)
+        for method, entries in snapshot.items():
+            path = os.path.join(self.directory, method + FIXTURE_SUFFIX)
+            with gzip.open(path + ".tmp", "wt") as file:
+                json.dump(entries, file, separators=(",", ":"))
+            os.replace(path + ".tmp", path)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._fixtures.values())
+
+
+class RPCServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, store: FixtureStore, upstream: Optional[str] = None):
+        super().__init__(address, RPCHandler)
+        self.store = store
+        self.upstream = upstream
+        self.hits = 0
+        self.misses = 0
+        # Handler threads update the counters concurrently
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def answer(self, requests: list) -> list:
+        responses = [None] * len(requests)
+        missing = []
+        for index, request in enumerate(requests):
+            cached = self.store.get(request.get("method"), request.get("params"))
+            if cached is not None:
+                responses[index] = dict(cached, jsonrpc="2.0", id=request.get("id"))
+            else:
+                missing.append(index)
+        with self._lock:
+            self.hits += len(requests) - len(missing)
+            self.misses += len(missing)
+
+        if missing and self.upstream:
+            # Record mode, forward every miss to the node in one batch
+            upstream_requests = [dict(requests[index], id=position) for position, index in enumerate(missing)]
+            for upstream_response in self.forward(upstream_requests):
+                position = upstream_response.get("id") if isinstance(upstream_response, dict) else None
+                # Ids are the positions sent upstream, anything else cannot be matched to a request
+                if type(position) is not int or not 0 <= position < len(missing) or responses[missing[position]] is not None:
+                    continue
+                index = missing[position]
+                request = requests[index]
+                recorded = {key: upstream_response[key] for key in ("result", "error") if key in upstream_response}
+                if recorded.get("error", {}).get("code") != UPSTREAM_ERROR:
+                    self.store.put(request.get("method"), request.get("params"), recorded)
+                responses[index] = dict(recorded, jsonrpc="2.0", id=request.get("id"))
+            code, message = UPSTREAM_ERROR, "No upstream answer for {} {}"
+        else:
+            code, message = MISSING_FIXTURE, "No fixture for {} {}"
+
+        for index in missing:
+            if responses[index] is None:
+                request = requests[index]
+                responses[index] = {
+                    "jsonrpc": "2.0",
+                    "id": request.get("id"),
+                    "error": {"code": code, "message": message.format(request.get("method"), request.get("params"))},
+                }
+        return responses
+
+    def forward(self, requests: list) -> list:
+        """The upstream responses to ``requests``, an UPSTREAM_ERROR for each one when the upstream fails."""
+        http_request = urllib.request.Request(
+            self.upstream, data=json.dumps(requests).encode(), headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(http_request, timeout=60) as response:
+                responses = json.loads(response.read())
+            if not isinstance(responses, list):
+                raise ValueError("expected a batch response, got {}".format(responses))
+            return responses
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            # URLError and HTTPError are OSErrors
+            error = {"code": UPSTREAM_ERROR, "message": "Upstream {} failed: {}: {}".format(
+                self.upstream, type(e).__name__, e)}
+            return [{"jsonrpc": "2.0", "id": request["id"], "error": error} for request in requests]
+
+
+class RPCHandler(BaseHTTPRequestHandler):
+    # Keep-alive, pyrevm and web3 reuse their connections
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            self.reply({"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}})
+            return
+
+        if isinstance(payload, list):
+            self.reply(self.server.answer(payload))
+        else:
+            self.reply(self.server.answer([payload])[0])
+
+    def reply(self, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(fixtures: str, host: str = "127.0.0.1", port: int = 0, upstream: Optional[str] = None) -> RPCServer:
+    """
+    Starts the server on a background thread, ``port=0`` picks a free port. Stop it with ``shutdown()``.
+
+    pyrevm holds the GIL while it waits on the fork backend, so an EVM must not fork from a
+    server running in the same process: start it with ``python rpc_server.py replay`` instead.
+    """
+    server = RPCServer((host, port), FixtureStore(fixtures), upstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    args = get_args()
+    upstream = args.upstream if args.mode == 'record' else None
+    server = serve(args.fixtures, args.host, args.port, upstream)
+    print("Serving {} ({} fixtures) on {}".format(args.mode, len(server.store), server.url))
+    try:
+        while True:
+            time.sleep(5)
+            if upstream:
+                server.store.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.store.flush()
+        print("hits: {}, misses: {}".format(server.hits, server.misses))
+
+
+if __name__ == "__main__":
+    main()
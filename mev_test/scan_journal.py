@@ -0,0 +1,204 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from eth_utils import keccak
+
+from result_sink import FIELDS
+from rpc_client import BatchRPCClient, RPCError
+from uniswap_v2 import PAIR_RESERVES_SLOT, WETH_ADDR, pair_address
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    address TEXT NOT NULL,
+    block_hash TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    fingerprint TEXT,
+    record TEXT NOT NULL,
+    reused_from INTEGER,
+    created REAL NOT NULL,
+    PRIMARY KEY (address, block_hash)
+);
+CREATE INDEX IF NOT EXISTS results_by_address ON results (address, block_number);
+"""
+
+# Where hand-written tokens keep their fee, limit and counter variables (right after the
+# OZ ERC20/Ownable fields), changing one of them usually changes the fees
+DEFAULT_WATCHED_SLOTS = tuple(range(0, 16))
+
+
+def parse_slots(text: str) -> tuple:
+    """"0-15,20" -> (0, 1, ..., 15, 20)"""
+    slots = []
+    for part in text.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            slots.extend(range(int(first, 0), int(last, 0) + 1))
+        elif part.strip():
+            slots.append(int(part, 0))
+    return tuple(sorted(set(slots)))
+
+
+class JournalEntry:
+    def __init__(self, address: str, block_hash: str, block_number: int, fingerprint: Optional[str],
+                 record: dict, reused_from: Optional[int]):
+        self.address = address
+        self.block_hash = block_hash
+        self.block_number = block_number
+        self.fingerprint = fingerprint
+        self.record = record
+        self.reused_from = reused_from
+
+    def output_record(self) -> dict:
+        """The journaled record for a result sink, ``reused_from`` the block it was simulated at."""
+        record = dict.fromkeys(FIELDS)
+        record.update(self.record)
+        record.update(index=None, reused_from=self.reused_from or self.block_number)
+        return record
+
+
+class ScanPlan:
+    def __init__(self):
+        self.todo = []
+        self.done = []
+        self.reused = []
+
+    @property
+    def journaled(self) -> list:
+        """``(name, address, JournalEntry)`` of every token not simulated again."""
+        return self.done + self.reused
+
+    def as_dict(self) -> dict:
+        return {"todo": len(self.todo), "done": len(self.done), "reused": len(self.reused)}
+
+
+class Fingerprinter:
+    """
+    Summarises what a token's fees depend on at a block: the hash of its code, the reserves
+    word of its WETH pair and the values of ``watched_slots``. Fetched with one JSON-RPC
+    batch per ``batch_size`` tokens, which costs far less than forking and simulating.
+    """
+
+    def __init__(self, rpc_url: str, block_hash: str, watched_slots: Iterable[int] = DEFAULT_WATCHED_SLOTS,
+                 batch_size: int = 50):
+        self.client = BatchRPCClient(rpc_url)
+        self.block = {"blockHash": block_hash}
+        self.watched_slots = tuple(watched_slots)
+        self.batch_size = batch_size
+
+    def calls(self, token: str) -> list:
+        calls = [("eth_getCode", [token, self.block]),
+                 ("eth_getStorageAt", [pair_address(WETH_ADDR, token), hex(PAIR_RESERVES_SLOT), self.block])]
+        calls += [("eth_getStorageAt", [token, hex(slot), self.block]) for slot in self.watched_slots]
+        return calls
+
+    def fingerprints(self, tokens: List[str]) -> Dict[str, Optional[str]]:
+        """``{token: fingerprint}``, None where a value could not be fetched."""
+        fingerprints = {}
+        for start in range(0, len(tokens), self.batch_size):
+            group = tokens[start: start + self.batch_size]
+            calls = [self.calls(token) for token in group]
+            results = self.client.batch([call for token_calls in calls for call in token_calls])
+            offset = 0
+            for token, token_calls in zip(group, calls):
+                values = results[offset: offset + len(token_calls)]
+                offset += len(token_calls)
+                fingerprints[token] = self.fingerprint(values)
+        return fingerprints
+
+    def fingerprint(self, values: list) -> Optional[str]:
+        if any(isinstance(value, RPCError) for value in values):
+            return None
+        code, reserves, slots = values[0], values[1], values[2:]
+        return json.dumps({
+            "code": "0x" + keccak(hexstr=code).hex(),
+            "reserves": hex(int(reserves, 16)),
+            "slots": {hex(slot): hex(int(value, 16)) for slot, value in zip(self.watched_slots, slots)},
+        }, sort_keys=True)
+
+
+class ScanJournal:
+    """
+    Checkpoint journal of finished token checks, one row per (token, block hash) in a SQLite
+    file committed after every result so a killed scan loses nothing it already finished.
+
+    ``plan`` splits a token list for a block into the tokens already done at that block
+    (resume), the tokens whose last result can be carried over because their fingerprint
+    did not change (incremental) and the tokens that must be simulated.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def add(self, address: str, block_hash: str, block_number: int, record: dict,
+            fingerprint: Optional[str] = None, reused_from: Optional[int] = None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results "
+                "(address, block_hash, block_number, fingerprint, record, reused_from, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (address.lower(), block_hash.lower(), block_number, fingerprint, json.dumps(record),
+                 reused_from, time.time()),
+            )
+            self._db.commit()
+
+    def get(self, address: str, block_hash: str) -> Optional[JournalEntry]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT address, block_hash, block_number, fingerprint, record, reused_from FROM results "
+                "WHERE address = ? AND block_hash = ?", (address.lower(), block_hash.lower())
+            ).fetchone()
+        return self._entry(row)
+
+    def latest(self, address: str, before_block: Optional[int] = None) -> Optional[JournalEntry]:
+        """Most recent result of ``address``, optionally only from blocks before ``before_block``."""
+        query = ("SELECT address, block_hash, block_number, fingerprint, record, reused_from FROM results "
+                 "WHERE address = ?")
+        params = [address.lower()]
+        if before_block is not None:
+            query += " AND block_number < ?"
+            params.append(before_block)
+        with self._lock:
+            row = self._db.execute(query + " ORDER BY block_number DESC LIMIT 1", params).fetchone()
+        return self._entry(row)
+
+    def plan(self, tokens, block_hash: str, block_number: int,
+             fingerprints: Optional[Dict[str, Optional[str]]] = None) -> ScanPlan:
+        """
+        ``tokens`` are ``(name, address)`` pairs. Without ``fingerprints`` only resumes, with
+        them a token is reused when its latest earlier result has the same fingerprint.
+        Reused results are journaled at ``block_hash`` right away.
+        """
+        plan = ScanPlan()
+        for name, address in tokens:
+            entry = self.get(address, block_hash)
+            if entry:
+                plan.done.append((name, address, entry))
+                continue
+            fingerprint = fingerprints.get(address) if fingerprints else None
+            previous = self.latest(address, before_block=block_number) if fingerprint else None
+            if previous and previous.fingerprint == fingerprint:
+                record = dict(previous.record, block=block_number)
+                reused_from = previous.reused_from or previous.block_number
+                self.add(address, block_hash, block_number, record, fingerprint, reused_from)
+                plan.reused.append((name, address, self.get(address, block_hash)))
+            else:
+                plan.todo.append((name, address))
+        return plan
+
+    @staticmethod
+    def _entry(row) -> Optional[JournalEntry]:
+        if row is None:
+            return None
+        address, block_hash, block_number, fingerprint, record, reused_from = row
+        return JournalEntry(address, block_hash, block_number, fingerprint, json.loads(record), reused_from)
@@ -0,0 +1,287 @@
+import argparse
+import multiprocessing
+import multiprocessing.util
+import os
+import time
+
+from pyrevm import EVM, BlockEnv
+
+import fee_checker
+from block_meta import get_block_header
+from contract import Contract
+from fork_cache import ForkStateCache
+from prefetch import Prefetcher
+from result_sink import FORMATS, ResultSink, format_record, make_record
+from pair_index import PairIndex, PairIndexer
+from pair_swap import PairSwapper
+from scan_journal import Fingerprinter, ScanJournal, parse_slots
+from simulator import Simulator
+from uniswap_v2 import WETH_ADDR
+
+# Per worker process state, built once by init_worker
+worker = dict()
+
+
+class WorkerInitError(RuntimeError):
+    """A worker could not fork the block or set up WETH, the scan cannot go on."""
+
+
+class ScanResult:
+    def __init__(self, index, name, address, result=None, error=None, elapsed=0.0):
+        self.index = index
+        self.name = name
+        self.address = address
+        self.result = result
+        self.error = error
+        self.elapsed = elapsed
+
+
+def get_args() -> argparse.Namespace:
+    parse = argparse.ArgumentParser()
+    parse.add_argument('--rpc_url', default='http://192.168.1.58:8545')
+    parse.add_argument('--file_path')
+    parse.add_argument('--workers', type=int, default=os.cpu_count())
+    parse.add_argument('--chunk_size', type=int, default=8,
+                       help='Tokens handed to a worker at a time')
+    parse.add_argument('--state_cache',
+                       help='SQLite file caching the forked state per block hash (implies --prefetch, '
+                            'storage is only cached from the prefetched slots)')
+    parse.add_argument('--prefetch', action='store_true',
+                       help='Fetch the state of the next tokens in JSON-RPC batches while simulating')
+    parse.add_argument('--output', help='Stream one record per token to this file (.jsonl, .csv or .parquet)')
+    parse.add_argument('--output_format', choices=FORMATS, help='Defaults to the --output extension')
+    parse.add_argument('--journal', help='SQLite checkpoint journal, tokens already checked at this block are skipped')
+    parse.add_argument('--incremental', action='store_true',
+                       help='With --journal, reuse the last result of tokens whose code, pair reserves '
+                            'and watched slots did not change')
+    parse.add_argument('--watch_slots', default='0-15', help='Token storage slots compared by --incremental')
+    parse.add_argument('--pair_index', help='SQLite V2 pair index, tokens without WETH liquidity are skipped up front')
+    args = parse.parse_args()
+    if args.state_cache:
+        args.prefetch = True
+    return args
+
+
+def read_tokens(file_path):
+    tokens = []
+    with open(file_path) as f:
+        for line in f.readlines():
+            tokens.append((line[43:].rstrip(), line[0: 42].rstrip()))
+    return tokens
+
+
+class ScanConfig:
+    """Everything a worker needs to fork the same block as the other workers."""
+
+    def __init__(self, rpc_url, parent_hash, block_number, timestamp, state_cache_path=None, prefetch=False):
+        self.rpc_url = rpc_url
+        self.parent_hash = parent_hash
+        self.block_number = block_number
+        self.timestamp = timestamp
+        self.state_cache_path = state_cache_path
+        self.prefetch = prefetch
+
+
+def fork_evm(config: ScanConfig) -> Simulator:
+    evm = Simulator(EVM(fork_url=config.rpc_url, fork_block=config.parent_hash, tracing=False))
+    evm.set_block_env(BlockEnv(number=config.block_number, timestamp=config.timestamp))
+    return evm
+
+
+def init_worker(config: ScanConfig, pool_worker: bool = True):
+    # A Pool respawns workers whose initializer raised, forever: keep the error for
+    # check_chunk to raise in the parent instead
+    worker.clear()
+    try:
+        setup_worker(config, pool_worker)
+    except BaseException as e:
+        if isinstance(e, (KeyboardInterrupt, SystemExit)):
+            raise
+        worker.update(init_error="{}: {}".format(type(e).__name__, e))
+
+
+def setup_worker(config: ScanConfig, pool_worker: bool = True):
+    """
+    Forks the block into ``worker``. Pool workers save their state cache and close their
+    prefetcher through multiprocessing's finalizers when the pool is closed, without a
+    pool scan() does both itself.
+    """
+    evm = fork_evm(config)
+    state_cache = None
+    if config.state_cache_path:
+        state_cache = ForkStateCache(config.state_cache_path)
+        state_cache.seed(evm, config.parent_hash)
+        if pool_worker:
+            multiprocessing.util.Finalize(None, state_cache.save_accounts, args=(evm, config.parent_hash),
+                                          exitpriority=10)
+    prefetcher = None
+    if config.prefetch:
+        prefetcher = Prefetcher(config.rpc_url, config.parent_hash, state_cache=state_cache)
+        if pool_worker:
+            multiprocessing.util.Finalize(None, prefetcher.close, exitpriority=10)
+        # Set before seeding so scan() closes it even when the setup fails further on
+        worker.update(prefetcher=prefetcher)
+        prefetcher.seed_common(evm)
+
+    weth = Contract(address=WETH_ADDR, revm=evm, abi_file_path="./abi/weth.abi")
+    swapper = PairSwapper(evm)
+
+    weth.deposit(value=10 ** 19, caller=fee_checker.MY_ADDR)
+    fee_checker.init_fees()
+
+    worker.update(evm=evm, state_cache=state_cache, weth=weth, swapper=swapper, prefetcher=prefetcher)
+
+
+def check_token(item) -> ScanResult:
+    index, name, address = item
+    evm = worker["evm"]
+    start = time.perf_counter()
+    try:
+        token = Contract(address=address, revm=evm, abi_file_path="./abi/erc20.abi")
+        with evm.isolated():
+            result = fee_checker.check_token(worker["weth"], token, worker["swapper"])
+        return ScanResult(index, name, address, result=result, elapsed=time.perf_counter() - start)
+    except BaseException as e:
+        # pyrevm panics are raised as BaseException, one bad token must not kill the worker
+        if isinstance(e, (KeyboardInterrupt, SystemExit)):
+            raise
+        error = "{}: {}".format(type(e).__name__, e)
+        return ScanResult(index, name, address, error=error, elapsed=time.perf_counter() - start)
+
+
+def check_chunk(chunk) -> list:
+    if "init_error" in worker:
+        raise WorkerInitError(worker["init_error"])
+    prefetcher = worker["prefetcher"]
+    if prefetcher:
+        # The next tokens of the chunk are fetched while this one is simulated
+        chunk = prefetcher.iter_seeded(worker["evm"], chunk, lambda item: item[2])
+    return [check_token(item) for item in chunk]
+
+
+def report(chunk_results, on_result):
+    if on_result:
+        for scan_result in chunk_results:
+            on_result(scan_result)
+    return chunk_results
+
+
+def scan(tokens, config: ScanConfig, workers, chunk_size=8, on_result=None):
+    """
+    Checks ``tokens`` ([(name, address)]) on ``workers`` processes, each with its own fork
+    of the same block. Returns the results in input order, ``on_result`` is called with
+    every ScanResult as soon as its chunk completes. Raises WorkerInitError when a worker
+    cannot fork the block.
+    """
+    items = [(index, name, address) for index, (name, address) in enumerate(tokens)]
+    chunks = [items[start: start + chunk_size] for start in range(0, len(items), chunk_size)]
+
+    if workers <= 1:
+        init_worker(config, pool_worker=False)
+        results = []
+        try:
+            for chunk in chunks:
+                results.append(report(check_chunk(chunk), on_result))
+        finally:
+            if worker.get("prefetcher"):
+                worker["prefetcher"].close()
+            if worker.get("state_cache"):
+                worker["state_cache"].save_accounts(worker["evm"], config.parent_hash)
+                worker["state_cache"].close()
+    else:
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=(config,)) as pool:
+            results = [report(chunk_results, on_result)
+                       for chunk_results in pool.imap_unordered(check_chunk, chunks)]
+            # close/join instead of the implicit terminate so the workers save their state cache
+            pool.close()
+            pool.join()
+
+    results = [scan_result for chunk_results in results for scan_result in chunk_results]
+    results.sort(key=lambda scan_result: scan_result.index)
+    return results
+
+
+def split_by_liquidity(tokens, pair_index_path, config: ScanConfig):
+    """Splits ``tokens`` into those whose WETH pair holds reserves at the forked block and the others."""
+    pair_index = PairIndex(pair_index_path)
+    try:
+        indexer = PairIndexer(pair_index, config.rpc_url, config.parent_hash, config.block_number - 1)
+        pairs = indexer.discover([address for _, address in tokens])
+    finally:
+        pair_index.close()
+    liquid = {address for address, pair in pairs.items() if pair and pair.has_liquidity()}
+    return ([(name, address) for name, address in tokens if address in liquid],
+            [(name, address) for name, address in tokens if address not in liquid])
+
+
+def main():
+    args = get_args()
+    block = get_block_header(args.rpc_url)
+    tokens = read_tokens(args.file_path)
+
+    start = time.perf_counter()
+    config = ScanConfig(args.rpc_url, block.parent_hash, block.number, block.timestamp,
+                        args.state_cache, args.prefetch)
+    journal = ScanJournal(args.journal) if args.journal else None
+    fingerprints = {}
+    journaled = []
+    if journal:
+        fingerprinter = Fingerprinter(args.rpc_url, config.parent_hash, parse_slots(args.watch_slots))
+        fingerprints = fingerprinter.fingerprints([address for _, address in tokens])
+        plan = journal.plan(tokens, config.parent_hash, config.block_number,
+                            fingerprints if args.incremental else None)
+        print("Journal: {}".format(plan.as_dict()))
+        tokens = plan.todo
+        journaled = [(name, address, entry.output_record()) for name, address, entry in plan.journaled]
+
+    sink = ResultSink(args.output, args.output_format) if args.output else None
+    if sink:
+        # A resumed or incremental scan still writes every token
+        for _, _, record in journaled:
+            sink.write(record)
+
+    def on_result(scan_result):
+        record = make_record(scan_result.address, scan_result.name, config.block_number, scan_result.result,
+                             scan_result.error, scan_result.elapsed, scan_result.index)
+        if sink:
+            sink.write(record)
+        if journal and not scan_result.error:
+            journal.add(scan_result.address, config.parent_hash, config.block_number, record,
+                        fingerprints.get(scan_result.address))
+
+    skipped = []
+    if args.pair_index:
+        tokens, skipped = split_by_liquidity(tokens, args.pair_index, config)
+        print("Pair index: {} tokens without WETH liquidity skipped".format(len(skipped)))
+        for name, address in skipped:
+            no_pair = fee_checker.FeeCheckResult()
+            no_pair.has_v2_pair = False
+            on_result(ScanResult(None, name, address, result=no_pair))
+
+    try:
+        results = scan(tokens, config, args.workers, args.chunk_size, on_result)
+    finally:
+        if sink:
+            sink.close()
+        if journal:
+            journal.close()
+    elapsed = time.perf_counter() - start
+
+    for scan_result in results:
+        print("==> Token {} {}".format(scan_result.name, scan_result.address))
+        if scan_result.error:
+            print("    got error: {}".format(scan_result.error))
+        else:
+            print(fee_checker.format_result(scan_result.result))
+    for name, address, record in journaled:
+        print("==> Token {} {}".format(name, address))
+        print(format_record(record))
+    print("--" * 50)
+    print("Scanned {} tokens with {} workers in {:.1f}s ({:.1f} tokens/s), {} errors, {} without a pair, "
+          "{} from the journal".format(len(results), args.workers, elapsed, len(results) / elapsed,
+                                       sum(1 for scan_result in results if scan_result.error), len(skipped),
+                                       len(journaled)))
+
+
+if __name__ == "__main__":
+    main()
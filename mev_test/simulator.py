@@ -0,0 +1,61 @@
+from contextlib import contextmanager
+
+from pyrevm import EVM, BlockEnv, JournalCheckpoint
+
+
+class Simulator:
+    """
+    Thin wrapper around a pyrevm EVM that scopes simulations with journal snapshots.
+
+    Everything not defined here is forwarded to the wrapped EVM, so a Simulator can be
+    passed as ``revm`` to any Contract. State changes made inside ``isolated()`` are
+    reverted when the block exits, while fork data fetched over RPC stays cached.
+
+        sim = Simulator(evm)
+        weth.deposit(value=10 ** 19, caller=MY_ADDR)  # shared setup
+        with sim.isolated():
+            check_token_fee(weth, token, swapper)     # rolled back afterwards
+    """
+
+    def __init__(self, evm: EVM):
+        self.evm = evm
+        # Bound once, Contract.call_function uses it on every call
+        self.message_call = evm.message_call
+
+    def __getattr__(self, attribute):
+        if attribute == "evm":
+            raise AttributeError(attribute)
+        return getattr(self.evm, attribute)
+
+    def snapshot(self) -> JournalCheckpoint:
+        return self.evm.snapshot()
+
+    def revert(self, checkpoint: JournalCheckpoint):
+        self.evm.revert(checkpoint)
+
+    @contextmanager
+    def isolated(self):
+        """Runs the block against the current state and reverts every change made in it."""
+        checkpoint = self.evm.snapshot()
+        try:
+            yield self
+        finally:
+            self.evm.revert(checkpoint)
+
+    @contextmanager
+    def at_block(self, number: int = None, timestamp: int = None):
+        """Runs the block with another block number and/or timestamp, the block env is restored afterwards."""
+        block = self.evm.env.block
+        fields = dict(number=block.number, coinbase=block.coinbase, timestamp=block.timestamp,
+                      difficulty=block.difficulty, prevrandao=block.prevrandao, basefee=block.basefee,
+                      gas_limit=block.gas_limit, excess_blob_gas=block.excess_blob_gas)
+        changed = dict(fields)
+        if number is not None:
+            changed["number"] = number
+        if timestamp is not None:
+            changed["timestamp"] = timestamp
+        self.evm.set_block_env(BlockEnv(**changed))
+        try:
+            yield self
+        finally:
+            self.evm.set_block_env(BlockEnv(**fields))
@@ -1,9 +1,8 @@
 import os
-from pyrevm import EVM, BlockEnv
-from web3 import Web3
-from contract import Contract
+from pyrevm import EVM
 
-w3 = Web3(Web3.HTTPProvider("http://192.168.1.58:8545"))
+from block_replay import BlockReplayer
+from contract import Contract
 
 mev_addr = "0xd8dA6BF26964aF9D7eEd9e03E53415D37aA96045"  # vitalik.eth
 address2 = "0xbBbBBBBbbBBBbbbBbbBbbbbBBbBbbbbBbBbbBBbB"
@@ -14,7 +13,6 @@ fork_url = (
     # or "https://mainnet.infura.io/v3/c60b0bb42f8a4c6481ecd229eddaca27"
     or "http://192.168.1.58:8545"
 )
-
 evm = EVM(fork_url=fork_url, fork_block="0x9e90df7c4005075bac2146c118abf4f00629b0c25ad7df17b48502012e5e1f94", tracing=False)
 
 USDT_ADDR = "0xdAC17F958D2ee523a2206206994597C13D831ec7"
@@ -110,39 +108,23 @@ weth_kobasu = Contract(
 
 
 def test_v3_swap():
-    block = w3.eth.get_block(block_identifier=20967700, full_transactions=True)
-    print("Block hash", block["hash"].hex())
-    blockEnv = BlockEnv(number=block["number"], timestamp=block["timestamp"])
-    evm.set_block_env(blockEnv)
+    replayer = BlockReplayer(fork_url, 20967700, evm=evm)
+    print("Block hash", replayer.header.hash)
     balance = evm.get_balance(mev_addr)
     weth.deposit(value=10**19, caller=mev_addr)
     print("Current WETH: ", weth.balanceOf(mev_addr))
 
-    transactions = block.transactions
-
     fake_tran_111()
     return
 
-    for item in transactions:
-        print("transaction hash", item["hash"].hex(), "index", item["transactionIndex"], "value", item["value"])
-        tx = {
-            "caller": item["from"],
-            "to": item["to"],
-            "value": item["value"],
-            "calldata": item["input"],
-        }
-        try:
-            result = evm.message_call(**tx)
-            print("transaction hash", item["hash"].hex(), "Result", result.hex())
-        except Exception as ex:
-            print("tx_hash", item["hash"].hex(),"GOT ERROR: ", ex)
-
-
-        if item["hash"].hex() == "0xe2d8f79c51405af334da54562d53de48c978e8c8dd13ce8264b69c246756005c":
-            print("victim run ok")
-            fake_tran_111()
-            # custom ...
-            return
+    def on_tx(result):
+        print("transaction hash", result.tx_hash, "index", result.index, "Result", result.success, result.reason)
+
+    report = replayer.run(until="0xe2d8f79c51405af334da54562d53de48c978e8c8dd13ce8264b69c246756005c", on_tx=on_tx)
+    print(report.summary())
+    print("victim run ok")
+    fake_tran_111()
+    # custom ...
 
 def fake_trans_1():
     weth.transfer(TRIA_WETH_V2_ADDR, 249199998288265216, caller=mev_addr)
@@ -0,0 +1,119 @@
+import pickle
+import tempfile
+import unittest
+
+from eth_abi import encode, decode
+from eth_abi.exceptions import EncodingTypeError
+from pyrevm import EVM
+
+from abi import ABIRegistry, compile_encoder, compile_decoder
+from contract import Contract
+
+UNISWAP_UNIVERSAL_ROUTER = "0x3fC91A3afd70395Cd496C647d5a6CC9D4B2b7FAD"
+WETH_ADDR = "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"
+
+
+class ContractDispatchTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.evm = EVM()
+        self.weth = Contract(address=WETH_ADDR, revm=self.evm, abi_file_path="./abi/weth.abi")
+        self.router = Contract(address=UNISWAP_UNIVERSAL_ROUTER, revm=self.evm,
+                               abi_file_path="./abi/universal_router.abi")
+
+    def test_lookup_by_name_selector_and_signature(self):
+        balance_of = self.weth.abi.find("balanceOf")[0]
+        self.assertEqual(balance_of.get_selector().hex(), "70a08231")
+        self.assertIs(self.weth.abi.find("0x70a08231")[0], balance_of)
+        self.assertIs(self.weth.abi.find("balanceOf(address)")[0], balance_of)
+        self.assertEqual(self.weth.abi.find("notAFunction"), ())
+
+    def test_bound_callables_are_cached(self):
+        self.assertIs(self.weth.balanceOf, self.weth.balanceOf)
+        self.assertIs(self.weth["0x70a08231"], self.weth["0x70a08231"])
+        with self.assertRaises(AttributeError):
+            self.weth.notAFunction
+
+    def test_overload_resolution(self):
+        candidates = self.router.abi.find("execute")
+        self.assertEqual(len(candidates), 2)
+        resolve = self.router.abi.resolve_overload
+        self.assertEqual(resolve(candidates, (b"", [])).get_signature(), "execute(bytes,bytes[])")
+        self.assertEqual(resolve(candidates, (b"", [], 1)).get_signature(), "execute(bytes,bytes[],uint256)")
+        with self.assertRaises(ValueError):
+            resolve(candidates, (b"",))
+
+
+class ABICodecTest(unittest.TestCase):
+    TYPES = ["address", "uint256", "uint112", "int24", "bool", "bytes4"]
+    VALUES = [
+        ("0xd8dA6BF26964aF9D7eEd9e03E53415D37aA96045", 2 ** 256 - 1, 5, -3, True, b"\x12\x34"),
+        ("0x0000000000000000000000000000000000000001", 0, 2 ** 112 - 1, 2 ** 23 - 1, False, b""),
+        ("0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2", 10 ** 19, 0, -(2 ** 23), True, b"\xff" * 4),
+    ]
+
+    def test_static_fast_path_matches_eth_abi(self):
+        encoder = compile_encoder(self.TYPES)
+        decoder = compile_decoder(self.TYPES)
+        for values in self.VALUES:
+            encoded = encoder(values)
+            self.assertEqual(encoded, encode(self.TYPES, values))
+            expected = list(decode(self.TYPES, encoded))
+            expected[0] = expected[0].lower()
+            decoded = decoder(encoded)
+            self.assertEqual(decoded[0].lower(), expected[0])
+            self.assertEqual(decoded[1:], expected[1:])
+
+    def test_fast_path_falls_back_to_eth_abi_errors(self):
+        encoder = compile_encoder(["uint8", "address"])
+        with self.assertRaises(Exception):
+            encoder((256, "0x0000000000000000000000000000000000000001"))
+        with self.assertRaises(Exception):
+            encoder((1, "0xnot-an-address"))
+        with self.assertRaises(EncodingTypeError):
+            # WETH_ADDR with a bad checksum, its first letter lowercased
+            encoder((1, "0xc" + WETH_ADDR[3:]))
+        self.assertEqual(encoder((1, WETH_ADDR.lower())), encoder((1, WETH_ADDR)))
+        self.assertEqual(encoder((1, "0x" + WETH_ADDR[2:].upper())), encoder((1, WETH_ADDR)))
+        with self.assertRaises(Exception):
+            compile_decoder(["bool"])((2).to_bytes(32, "big"))
+
+    def test_checksum_policy(self):
+        bad = "0xc" + WETH_ADDR[3:]
+        for types, good_values, bad_values in (
+                (["address"], (WETH_ADDR,), (bad,)),
+                (["uint256", "address[]"], (1, [WETH_ADDR.lower(), WETH_ADDR]), (1, [WETH_ADDR, bad])),
+                (["(address,uint256)[]"], ([(WETH_ADDR, 1)],), ([(bad, 1)],))):
+            encoder = compile_encoder(types)
+            self.assertEqual(encoder(good_values), encode(types, good_values))
+            with self.assertRaisesRegex(EncodingTypeError, "checksum"):
+                encoder(bad_values)
+
+    def test_dynamic_types_use_generic_codec(self):
+        types = ["uint256", "address[]"]
+        values = (1, ["0xd8dA6BF26964aF9D7eEd9e03E53415D37aA96045"])
+        encoded = compile_encoder(types)(values)
+        self.assertEqual(encoded, encode(types, values))
+        self.assertEqual(compile_decoder(types)(encoded)[0], 1)
+
+
+class ABIRegistryTest(unittest.TestCase):
+    def test_contracts_share_parsed_abi(self):
+        evm = EVM()
+        first = Contract(address=WETH_ADDR, revm=evm, abi_file_path="./abi/erc20.abi")
+        second = Contract(address=UNISWAP_UNIVERSAL_ROUTER, revm=evm, abi_file_path="abi/erc20.abi")
+        self.assertIs(first.abi, second.abi)
+        with self.assertRaises(AttributeError):
+            first.abi.name = "changed"
+
+    def test_pickled_cache_round_trip(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            parsed = ABIRegistry(cache_dir=cache_dir).get("./abi/uniswapv2router.abi")
+            loaded = ABIRegistry(cache_dir=cache_dir).get("./abi/uniswapv2router.abi")
+        self.assertIsNot(parsed, loaded)
+        self.assertEqual(parsed, loaded)
+        self.assertEqual(dict(parsed.by_selector).keys(), dict(loaded.by_selector).keys())
+        self.assertEqual(pickle.loads(pickle.dumps(parsed)), parsed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import math
+import os
+import unittest
+
+from pyrevm import EVM, BlockEnv
+
+from arbitrage import Cycle, CycleVerifier, PairGraph, find_cycles, measured_fees
+from block_meta import get_block_header
+from contract import Contract
+from pair_index import PairInfo
+from simulator import Simulator
+from uniswap_v2 import WETH_ADDR, pair_address, sort_tokens
+
+FORK_URL = os.getenv("FORK_URL")
+BLOCK_NUM = 20967700
+MY_ADDR = "0xd8dA6BF26964aF9D7eEd9e03E53415D37aA96045"  # vitalik.eth
+DOGE = "0xF2ec4a773ef90c58d98ea734c0eBDB538519b988"
+NEIRO = "0x812Ba41e071C7b7fA4EBcFB62dF5F45f6fA853Ee"
+KABOSU = "0xCEb67a66c2c8a90980dA3A50A3F96c07525a26Cb"
+# In data/fee_models.json: a fixed 4% buy fee, and a 1.6% transfer fee without buy or sell model
+LISTED = "0x5aef5bba19e6a1644805bd4f5c93c8557b87c62c"
+TRANSFER_ONLY = "0x0fc6c0465c9739d4a42daca22eb3b2cb0eb9937a"
+
+
+def pair_info(token_a, reserve_a, token_b, reserve_b):
+    token0, token1 = sort_tokens(token_a, token_b)
+    reserves = (reserve_a, reserve_b) if token0 == token_a.lower() else (reserve_b, reserve_a)
+    return PairInfo(pair_address(token_a, token_b).lower(), token0, token1, *reserves)
+
+
+def triangle(mispricing: float):
+    # 1 WETH = 1000 DOGE = 10 NEIRO, except the DOGE/NEIRO pair
+    return [
+        pair_info(WETH_ADDR, 10 ** 20, DOGE, 10 ** 23),
+        pair_info(DOGE, 10 ** 23, NEIRO, int(10 ** 21 * mispricing)),
+        pair_info(NEIRO, 10 ** 21, WETH_ADDR, 10 ** 20),
+        pair_info(WETH_ADDR, 10 ** 20, KABOSU, 10 ** 25),
+    ]
+
+
+class FindCyclesTest(unittest.TestCase):
+    def test_triangle(self):
+        cycles = find_cycles(PairGraph.from_pairs(triangle(1.1)))
+        self.assertEqual(len(cycles), 1)
+        cycle = cycles[0].rotated(WETH_ADDR)
+        self.assertEqual(cycle.tokens, [token.lower() for token in (WETH_ADDR, DOGE, NEIRO, WETH_ADDR)])
+        self.assertEqual(cycle.pairs[0], pair_address(WETH_ADDR, DOGE).lower())
+        self.assertAlmostEqual(cycle.gain, 1.1 * 0.997 ** 3 - 1)
+
+    def test_no_cycle_after_swap_fees(self):
+        self.assertEqual(find_cycles(PairGraph.from_pairs(triangle(1.005))), [])
+
+    def test_transfer_fees(self):
+        graph = PairGraph.from_pairs(triangle(1.1), fees={NEIRO.lower(): (5.0, 5.0)})
+        self.assertEqual(find_cycles(graph), [])
+
+    def test_measured_fees(self):
+        fees = measured_fees()
+        self.assertEqual(fees[LISTED], (4.0, 0.0))
+        self.assertEqual(fees[TRANSFER_ONLY], (1.6, 1.6))
+
+        pairs = triangle(1.1) + [pair_info(WETH_ADDR, 10 ** 20, LISTED, 10 ** 23)]
+        plain, taxed = PairGraph.from_pairs(pairs), PairGraph.from_pairs(pairs, measured_fees())
+        buy = [edge for edge in range(len(plain))
+               if plain.tokens[plain.src[edge]] == WETH_ADDR.lower() and plain.tokens[plain.dst[edge]] == LISTED]
+        self.assertAlmostEqual(taxed.weights[buy[0]] - plain.weights[buy[0]], -math.log(0.96))
+        self.assertEqual(len(find_cycles(taxed)), 1)
+
+    def test_measured_transfer_fees(self):
+        # 3% mispricing pays the swap fees, not 1.6% in and out of the middle token as well
+        pairs = [
+            pair_info(WETH_ADDR, 10 ** 20, TRANSFER_ONLY, 10 ** 23),
+            pair_info(TRANSFER_ONLY, 10 ** 23, NEIRO, int(10 ** 21 * 1.03)),
+            pair_info(NEIRO, 10 ** 21, WETH_ADDR, 10 ** 20),
+        ]
+        self.assertEqual(len(find_cycles(PairGraph.from_pairs(pairs))), 1)
+        self.assertEqual(find_cycles(PairGraph.from_pairs(pairs, measured_fees())), [])
+
+    def test_dust_pairs_are_ignored(self):
+        graph = PairGraph.from_pairs(triangle(1.1) + [pair_info(KABOSU, 10, DOGE, 10 ** 5)])
+        self.assertEqual(len(graph), 8)
+        self.assertEqual(len(graph.tokens), 4)
+
+
+@unittest.skipUnless(FORK_URL, "needs FORK_URL")
+class CycleVerifierTest(unittest.TestCase):
+    def test_round_trip(self):
+        block = get_block_header(FORK_URL, BLOCK_NUM)
+        evm = Simulator(EVM(fork_url=FORK_URL, fork_block=block.parent_hash, tracing=False))
+        evm.set_block_env(BlockEnv(number=block.number, timestamp=block.timestamp))
+        Contract(WETH_ADDR, revm=evm, abi_file_path="./abi/weth.abi").deposit(value=10 ** 17, caller=MY_ADDR)
+        tokens = [token.lower() for token in (WETH_ADDR, NEIRO, WETH_ADDR)]
+        cycle = Cycle(tokens, [pair_address(WETH_ADDR, NEIRO).lower()] * 2, 0.0)
+
+        result = CycleVerifier(evm).verify(cycle, 10 ** 17)
+        self.assertIsNone(result.error)
+        # Buying and selling back through the same pair loses the swap fees
+        self.assertLess(result.amount_out, 10 ** 17)
+        self.assertGreater(result.amount_out, 10 ** 17 * 0.99)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import contextlib
+import io
+import unittest
+
+from benchmarks.fixture_chain import MY_ADDR, FixtureChain
+from benchmarks.suite import BENCHMARKS, Fixture, compare, measure, regressions
+from contract import Contract
+from ensure_token_fee import check_token_fee
+from pair_swap import PairSwapper
+from uniswap_v2 import WETH_ADDR
+
+
+class FixtureChainTest(unittest.TestCase):
+    def test_check_token_fee(self):
+        chain = FixtureChain(tokens=3, fee_bps=(0, 100, 500))
+        weth = Contract(WETH_ADDR, revm=chain.evm, abi_file_path="./abi/weth.abi")
+        weth.deposit(value=10 ** 19, caller=MY_ADDR)
+        self.assertEqual(weth.balanceOf(MY_ADDR), 10 ** 19)
+
+        swapper = PairSwapper(chain.evm)
+        fees = []
+        for address in chain.tokens:
+            token = Contract(address, revm=chain.evm, abi_file_path="./abi/erc20.abi")
+            with chain.evm.isolated(), contextlib.redirect_stdout(io.StringIO()):
+                result = check_token_fee(weth, token, swapper)
+            self.assertTrue(result.has_v2_pair)
+            fees.append((round(result.buy_fee, 6), round(result.transfer_fee, 6)))
+        self.assertEqual(fees, [(0, 0), (1, 1), (5, 5)])
+
+
+class SuiteTest(unittest.TestCase):
+    def test_every_benchmark_runs(self):
+        fixture = Fixture()
+        for name, setup in BENCHMARKS.items():
+            result = measure(setup(fixture), repeat=1, min_time=0)
+            self.assertGreater(result["min_us"], 0, name)
+
+    def test_compare(self):
+        baseline = {"results": {"a": {"min_us": 10.0}, "b": {"min_us": 10.0}}}
+        current = {"results": {"a": {"min_us": 20.0}, "b": {"min_us": 11.0}, "c": {"min_us": 1.0}}}
+        ratios = compare(current, baseline)
+        self.assertEqual(ratios, {"a": 2.0, "b": 1.1, "c": None})
+        self.assertEqual(regressions(ratios, 0.5), ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+
+from block_meta import BlockHeader, BlockMetaClient, HeaderCache, get_block_header
+from rpc_client import RPCError
+from rpc_server import FixtureStore, serve
+
+LATEST = 110
+
+
+def block_json(number: int) -> dict:
+    return {
+        "number": hex(number),
+        "hash": "0x" + "{:064x}".format(number),
+        "parentHash": "0x" + "{:064x}".format(number - 1),
+        "timestamp": hex(1_700_000_000 + 12 * number),
+        "gasLimit": hex(30_000_000),
+        "miner": "0x" + "11" * 20,
+        "baseFeePerGas": hex(10 ** 9),
+        "mixHash": "0x" + "22" * 32,
+        "transactions": ["0x" + "33" * 32],
+    }
+
+
+class BlockMetaTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        store = FixtureStore(self.tmp.name)
+        for number in range(100, LATEST + 1):
+            store.put("eth_getBlockByNumber", [hex(number), False], {"result": block_json(number)})
+        store.put("eth_getBlockByNumber", ["latest", False], {"result": block_json(LATEST)})
+        store.put("eth_getBlockByHash", [block_json(105)["hash"], False], {"result": block_json(105)})
+        store.flush()
+        self.server = serve(self.tmp.name)
+        self.cache = HeaderCache(size=4)
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.tmp.cleanup()
+
+    def run_client(self, body, pool_size=2):
+        async def run():
+            async with BlockMetaClient(self.server.url, pool_size=pool_size, cache=self.cache) as client:
+                return await body(client), client
+
+        return asyncio.run(run())
+
+    def test_header_fields(self):
+        header = get_block_header(self.server.url, 100)
+        self.assertIsInstance(header, BlockHeader)
+        self.assertEqual((header.number, header.timestamp, header.base_fee), (100, 1_700_001_200, 10 ** 9))
+        self.assertEqual(header.parent_hash, block_json(99)["hash"])
+
+    def test_cache(self):
+        async def body(client):
+            latest = await client.header()
+            await client.header(LATEST)
+            await client.header(latest.hash)
+            await client.header()
+            return latest
+
+        latest, client = self.run_client(body)
+        self.assertEqual(latest.number, LATEST)
+        # The number and hash lookups hit the cache, tags are always fetched
+        self.assertEqual(client.requests, 2)
+
+    def test_concurrent_headers_share_the_pool(self):
+        async def body(client):
+            return await client.headers(range(100, 108))
+
+        headers, client = self.run_client(body)
+        self.assertEqual([header.number for header in headers], list(range(100, 108)))
+        self.assertLessEqual(len(client._idle), 2)
+        self.assertEqual(len(self.cache), 4)
+        self.assertIsNone(self.cache.get(100))
+        self.assertEqual(self.cache.get(block_json(107)["hash"]).number, 107)
+
+    def test_by_hash_and_unknown_block(self):
+        self.assertEqual(get_block_header(self.server.url, block_json(105)["hash"]).number, 105)
+        with self.assertRaises(RPCError):
+            get_block_header(self.server.url, 99)
+
+    def test_timeout_closes_the_connection(self):
+        async def run():
+            async def silent(reader, writer):
+                # Reads the request and never answers
+                while await reader.read(1024):
+                    pass
+                writer.close()
+
+            writers = []
+
+            async def open_connection(*args, **kwargs):
+                reader, writer = await connect(*args, **kwargs)
+                writers.append(writer)
+                return reader, writer
+
+            connect = asyncio.open_connection
+            server = await asyncio.start_server(silent, "127.0.0.1", 0)
+            url = "http://127.0.0.1:{}".format(server.sockets[0].getsockname()[1])
+            try:
+                with mock.patch.object(asyncio, "open_connection", open_connection):
+                    async with BlockMetaClient(url, cache=HeaderCache(), timeout=0.2) as client:
+                        with self.assertRaises(asyncio.TimeoutError):
+                            await client.header(100)
+                        self.assertEqual(client._idle, [])
+                        self.assertEqual(len(writers), 1)
+                        self.assertTrue(writers[0].is_closing())
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
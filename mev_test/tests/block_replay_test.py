@@ -0,0 +1,115 @@
+import tempfile
+import unittest
+
+from pyrevm import EVM, AccountInfo
+
+from block_replay import BlockReplayer, normalize_log
+from rpc_server import FixtureStore, serve
+
+BLOCK = 100
+SENDER = "0x" + "11" * 20
+EMITTER = "0x" + "22" * 20
+REVERTER = "0x" + "33" * 20
+TOPIC = "0x" + "00" * 31 + "42"
+DATA = "0x" + "00" * 31 + "05"
+COINBASE = "0x" + "44" * 20
+BASE_FEE = 10
+GAS_PRICE = 100
+BALANCE = 10 ** 18
+# Gas used by the calls below: 21000 + the code
+EMITTER_GAS = 22027
+REVERTER_GAS = 21006
+# mstore(0, 5) log1(0, 32, 0x42) stop
+EMITTER_CODE = "6005600052604260206000a100"
+# revert(0, 0)
+REVERTER_CODE = "60006000fd"
+
+
+def tx_json(index, to, nonce, data="0x"):
+    return {"hash": "0x" + "{:064x}".format(index + 1), "transactionIndex": hex(index), "from": SENDER, "to": to,
+            "value": "0x0", "gas": hex(100_000), "gasPrice": hex(GAS_PRICE), "nonce": hex(nonce), "input": data}
+
+
+def receipt_json(tx, success, gas_used, logs):
+    return {"transactionHash": tx["hash"], "status": "0x1" if success else "0x0", "gasUsed": hex(gas_used),
+            "logs": [{"address": address, "topics": topics, "data": data} for address, topics, data in logs]}
+
+
+class BlockReplayerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.txs = [tx_json(0, EMITTER, 7), tx_json(1, REVERTER, 8), tx_json(2, EMITTER, 9)]
+        block = {"number": hex(BLOCK), "hash": "0x" + "ab" * 32, "parentHash": "0x" + "cd" * 32,
+                 "timestamp": hex(1_700_000_000), "gasLimit": hex(30_000_000), "miner": COINBASE,
+                 "baseFeePerGas": hex(BASE_FEE), "mixHash": "0x" + "55" * 32, "transactions": self.txs}
+        emitted = [(EMITTER, [TOPIC], DATA)]
+        self.tmp = tempfile.TemporaryDirectory()
+        store = FixtureStore(self.tmp.name)
+        store.put("eth_getBlockByNumber", [hex(BLOCK), True], {"result": block})
+        store.put("eth_getBlockReceipts", [hex(BLOCK)], {"result": [
+            receipt_json(self.txs[0], True, EMITTER_GAS, emitted),
+            # Mined with another gas used than the replay gives
+            receipt_json(self.txs[1], False, REVERTER_GAS + 1, []),
+            # Mined with another log than the replay gives
+            receipt_json(self.txs[2], True, EMITTER_GAS, [(EMITTER, [TOPIC], "0x")]),
+        ]})
+        store.flush()
+        self.server = serve(self.tmp.name)
+
+        self.evm = EVM()
+        self.evm.insert_account_info(SENDER, AccountInfo(balance=BALANCE, nonce=7))
+        self.evm.insert_account_info(EMITTER, AccountInfo(code=bytes.fromhex(EMITTER_CODE)))
+        self.evm.insert_account_info(REVERTER, AccountInfo(code=bytes.fromhex(REVERTER_CODE)))
+        self.replayer = BlockReplayer(self.server.url, BLOCK, evm=self.evm)
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.tmp.cleanup()
+
+    def test_block_env(self):
+        block = self.evm.env.block
+        self.assertEqual((block.number, block.timestamp, block.gas_limit), (BLOCK, 1_700_000_000, 30_000_000))
+        self.assertEqual(block.prevrandao, bytes.fromhex("55" * 32))
+
+    def test_stop_and_resume(self):
+        first = self.replayer.run(until=self.txs[1]["hash"])
+        self.assertEqual([tx.index for tx in first.txs], [0, 1])
+        self.assertTrue(first.txs[0].success)
+        self.assertEqual(first.txs[0].logs, [normalize_log(EMITTER, [TOPIC], DATA)])
+        self.assertFalse(first.txs[1].success)
+        self.assertEqual(first.txs[1].reason, "execution reverted")
+        self.assertEqual(self.evm.basic(SENDER).nonce, 9)
+
+        rest = self.replayer.run()
+        self.assertEqual([tx.index for tx in rest.txs], [2])
+        self.assertEqual(len(self.replayer.report().txs), 3)
+        self.assertGreater(self.replayer.report().tx_per_second, 0)
+
+    def test_compare_receipts(self):
+        self.replayer.run()
+        mismatched = self.replayer.compare_receipts()
+        self.assertEqual([tx.index for tx in mismatched], [1, 2])
+        self.assertTrue(self.replayer.results[0].matches_receipt)
+        self.assertFalse(self.replayer.results[1].gas_matches)
+        self.assertTrue(self.replayer.results[1].logs_match)
+        self.assertTrue(self.replayer.results[2].gas_matches)
+
+    def test_gas_payment(self):
+        self.replayer.run()
+        gas_used = [tx.gas_used for tx in self.replayer.results]
+        self.assertEqual(gas_used, [EMITTER_GAS, REVERTER_GAS, EMITTER_GAS])
+        self.assertEqual(self.evm.basic(SENDER).balance, BALANCE - sum(gas_used) * GAS_PRICE)
+        self.assertEqual(self.evm.basic(COINBASE).balance, sum(gas_used) * (GAS_PRICE - BASE_FEE))
+        self.assertEqual(self.evm.basic(SENDER).nonce, 10)
+
+    def test_eip1559_gas_price(self):
+        tx = {"maxFeePerGas": hex(1000), "maxPriorityFeePerGas": hex(5)}
+        self.assertEqual(self.replayer.gas_price(tx), BASE_FEE + 5)
+        self.assertEqual(self.replayer.gas_price({"maxFeePerGas": hex(12), "maxPriorityFeePerGas": hex(5)}), 12)
+
+    def test_unknown_tx(self):
+        with self.assertRaises(ValueError):
+            self.replayer.run(until="0x" + "ff" * 32)
+
+
+if __name__ == "__main__":
+    unittest.main()
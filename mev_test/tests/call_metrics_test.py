@@ -0,0 +1,107 @@
+import os
+import tempfile
+import threading
+import unittest
+
+import call_metrics
+from benchmarks.fixture_chain import MY_ADDR, FixtureChain
+from call_metrics import BUCKETS, CallMetrics, Histogram
+from contract import Contract
+
+BALANCE_OF = "balanceOf(address)"
+TRANSFER = "transfer(address,uint256)"
+
+
+class Panic(BaseException):
+    """Stands in for a pyrevm panic, raised as BaseException."""
+
+
+class RaisingEVM:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+    def message_call(self, **kwargs):
+        raise self.error
+
+
+class HistogramTest(unittest.TestCase):
+    def test_buckets(self):
+        histogram = Histogram()
+        for seconds in (1e-6, 3e-6, 3e-6, 20.0):
+            histogram.observe(seconds)
+        cumulative = dict(histogram.cumulative())
+        self.assertEqual((cumulative[1e-6], cumulative[5e-6], cumulative[10.0], cumulative[float("inf")]),
+                         (1, 3, 3, 4))
+        self.assertEqual(histogram.quantile(0.5), 5e-6)
+        self.assertEqual(len(histogram.as_dict()["buckets"]), len(BUCKETS) + 1)
+
+
+class CallMetricsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.chain = FixtureChain(tokens=1)
+        self.token = Contract(self.chain.tokens[0], revm=self.chain.evm, abi_file_path="./abi/erc20.abi")
+        self.metrics = call_metrics.enable(CallMetrics())
+
+    def tearDown(self) -> None:
+        call_metrics.disable()
+
+    def test_phases(self):
+        for _ in range(3):
+            self.token.balanceOf(MY_ADDR)
+        with self.assertRaises(RuntimeError):
+            # Reverts, nothing to transfer
+            self.token.transfer(MY_ADDR, 1, caller=MY_ADDR)
+        with self.assertRaises(ValueError):
+            self.token.transfer(MY_ADDR, 1)
+
+        functions = self.metrics.snapshot()[self.token.address]
+        balance_of = functions[BALANCE_OF]
+        self.assertEqual((balance_of["calls"], balance_of["errors"]), (3, 0))
+        self.assertEqual([balance_of["phases"][phase]["count"] for phase in call_metrics.PHASES], [3, 3, 3])
+        transfer = functions[TRANSFER]
+        self.assertEqual((transfer["calls"], transfer["errors"]), (2, 2))
+        # Only the reverted call reached the EVM, neither was decoded
+        self.assertEqual([transfer["phases"][phase]["count"] for phase in call_metrics.PHASES], [2, 1, 0])
+
+    def test_base_exceptions(self):
+        for error in (Panic("panicked"), KeyboardInterrupt()):
+            token = Contract(self.token.address, revm=RaisingEVM(error), abi_file_path="./abi/erc20.abi")
+            with self.assertRaises(type(error)):
+                token.balanceOf(MY_ADDR)
+        # The panic is an error of the call, the interrupt is not recorded
+        balance_of = self.metrics.snapshot()[self.token.address][BALANCE_OF]
+        self.assertEqual((balance_of["calls"], balance_of["errors"]), (1, 1))
+        self.assertEqual([balance_of["phases"][phase]["count"] for phase in call_metrics.PHASES], [1, 1, 0])
+
+    def test_disabled(self):
+        call_metrics.disable()
+        self.token.balanceOf(MY_ADDR)
+        self.assertEqual(self.metrics.snapshot(), {})
+
+    def test_threads(self):
+        threads = [threading.Thread(target=lambda: [self.metrics.record("0x1", "f()", 1e-6, 1e-5, 1e-6)
+                                                    for _ in range(100)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.metrics.snapshot()["0x1"]["f()"]["calls"], 400)
+        self.metrics.reset()
+        self.assertEqual(self.metrics.snapshot(), {})
+
+    def test_prometheus(self):
+        self.token.balanceOf(MY_ADDR)
+        labels = 'contract="{}",function="{}"'.format(self.token.address, BALANCE_OF)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "calls.prom")
+            self.metrics.write_prometheus(path)
+            with open(path) as f:
+                lines = f.read().splitlines()
+        self.assertIn("contract_calls_total{{{}}} 1".format(labels), lines)
+        self.assertIn('contract_call_seconds_bucket{{{},phase="execute",le="+Inf"}} 1'.format(labels), lines)
+        self.assertIn('contract_call_seconds_count{{{},phase="decode"}} 1'.format(labels), lines)
+        self.assertIn("# TYPE contract_call_seconds histogram", lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,12 @@
+import os
 import unittest
 
 from pyrevm import EVM, BlockEnv
-from web3 import Web3
 
+from block_meta import get_block_header
 from contract import Contract
 
-FORK_URL = "http://192.168.1.58:8545"
+FORK_URL = os.getenv("FORK_URL") or "http://192.168.1.58:8545"
 BLOCK_NUM = 20967700
 ERC20_LIST = []
 
@@ -42,15 +43,15 @@ class UniswapV2Test(unittest.TestCase):
                                            abi_file_path="./abi/uniswapv2factory.abi")
 
     def setUp(self) -> None:
-        self.w3 = Web3(Web3.HTTPProvider(FORK_URL))
-        block = self.w3.eth.get_block(block_identifier=BLOCK_NUM, full_transactions=True)
-        self.evm = EVM(fork_url=FORK_URL, fork_block="0x" + block['parentHash'].hex(), tracing=False)
+        block = get_block_header(FORK_URL, BLOCK_NUM)
+        self.evm = EVM(fork_url=FORK_URL, fork_block=block.parent_hash, tracing=False)
         self.init_contract()
         return super().setUp()
 
     def init_block(self, block_number):
-        block = self.w3.eth.get_block(block_identifier=block_number, full_transactions=True)
-        blockEnv = BlockEnv(number=block["number"], timestamp=block["timestamp"])
+        # Cached since setUp, no second round-trip
+        block = get_block_header(FORK_URL, block_number)
+        blockEnv = BlockEnv(number=block.number, timestamp=block.timestamp)
         self.evm.set_block_env(blockEnv)
         self.evm.get_balance(MY_ADDR)
         self.erc20_contracts['WETH'].deposit(value=10 ** 19, caller=MY_ADDR)
@@ -0,0 +1,114 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from pyrevm import AccountInfo
+
+from benchmarks.fixture_chain import MY_ADDR, TOKEN_CODE, FixtureChain, token_address
+from contract import Contract
+import fee_models
+from fee_checker import BOT_ADDR, PROBE_BUY_FRACTIONS, PROBE_TRANSFER_FRACTIONS, check_token, probe_token
+from pair_swap import PairSwapper
+from uniswap_v2 import WETH_ADDR, pair_address
+
+# revert(0, 0)
+REVERT_CODE = bytes.fromhex("60006000fd")
+
+
+class CheckTokenTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.chain = FixtureChain(tokens=3, fee_bps=(0, 100, 500))
+        self.evm = self.chain.evm
+        self.weth = Contract(WETH_ADDR, revm=self.evm, abi_file_path="./abi/weth.abi")
+        self.weth.deposit(value=10 ** 19, caller=MY_ADDR)
+        self.swapper = PairSwapper(self.evm)
+
+    def check(self, address):
+        token = Contract(address, revm=self.evm, abi_file_path="./abi/erc20.abi")
+        with self.evm.isolated(), contextlib.redirect_stdout(io.StringIO()):
+            return check_token(self.weth, token, self.swapper)
+
+    def test_fees(self):
+        for address, fee in zip(self.chain.tokens, (0, 1, 5)):
+            result = self.check(address)
+            self.assertTrue(result.has_v2_pair)
+            self.assertAlmostEqual(result.buy_fee, fee, places=6)
+            self.assertAlmostEqual(result.transfer_fee, fee, places=6)
+            self.assertAlmostEqual(result.sell_fee, fee, places=6)
+            # None of the fixture tokens is in data/fee_models.json, only the fee-free one matches "no fee"
+            expected = "OK" if fee == 0 else "WRONG_FEE"
+            self.assertEqual((result.buy_status, result.transfer_status, result.sell_status), (expected,) * 3)
+
+    def test_isolated(self):
+        before = self.weth.balanceOf(MY_ADDR)
+        self.check(self.chain.tokens[1])
+        self.assertEqual(self.weth.balanceOf(MY_ADDR), before)
+
+    def test_no_pair(self):
+        address = token_address(99)
+        self.evm.insert_account_info(address, AccountInfo(code=TOKEN_CODE))
+        result = self.check(address)
+        self.assertFalse(result.has_v2_pair)
+        self.assertEqual(result.buy_status, "")
+
+    def test_buy_failed(self):
+        # The pair keeps its reserves but every swap reverts
+        address = self.chain.tokens[1]
+        self.evm.insert_account_info(pair_address(WETH_ADDR, address), AccountInfo(code=REVERT_CODE))
+        result = self.check(address)
+        self.assertTrue(result.has_v2_pair)
+        self.assertEqual(result.buy_status, "BUY_FAILED")
+        self.assertEqual(result.transfer_status, "")
+
+
+class ProbeTokenTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.chain = FixtureChain(tokens=3, fee_bps=(0, 100, 500))
+        self.evm = self.chain.evm
+        self.weth = Contract(WETH_ADDR, revm=self.evm, abi_file_path="./abi/weth.abi")
+        self.weth.deposit(value=10 ** 21, caller=MY_ADDR)
+        self.swapper = PairSwapper(self.evm)
+
+        # The fixture tokens' fees as fee models, 1% and 5% on every kind of transfer
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, "fee_models.json")
+        listed = {address: {"model": "fixed", "fee_rate": fee} for address, fee in zip(self.chain.tokens[1:], (1, 5))}
+        with open(path, "w") as f:
+            json.dump({kind: listed for kind in fee_models.KINDS}, f)
+        fee_models.init_fees(path)
+
+    def tearDown(self) -> None:
+        fee_models.init_fees()
+        self.tmp.cleanup()
+
+    def state(self, token: Contract) -> tuple:
+        pair = self.swapper.pair(WETH_ADDR, token.address)
+        return (self.weth.balanceOf(MY_ADDR), token.balanceOf(MY_ADDR), token.balanceOf(BOT_ADDR),
+                token.balanceOf(pair.address), tuple(pair.getReserves()), self.evm.basic(pair.address).code)
+
+    def test_matrix(self):
+        for address, fee in zip(self.chain.tokens, (0, 1, 5)):
+            token = Contract(address, revm=self.evm, abi_file_path="./abi/erc20.abi")
+            before = self.state(token)
+            table = probe_token(self.evm, self.weth, token, self.swapper)
+            # Every branch was reverted, the pair got its code back after the pair->wallet probes
+            self.assertEqual(self.state(token), before)
+
+            for scenario in ("buy", "wallet->wallet", "wallet->pair", "pair->wallet"):
+                fees = table.fees(scenario)
+                expected = len(PROBE_BUY_FRACTIONS) if scenario == "buy" else len(PROBE_TRANSFER_FRACTIONS)
+                self.assertEqual(len(fees), expected, scenario)
+                for amount, measured in fees.items():
+                    self.assertAlmostEqual(measured, fee, places=6, msg="{} {}".format(scenario, amount))
+            statuses = {probe.status for probe in table.probes if probe.error is None}
+            self.assertEqual(statuses, {"OK"})
+            # The fixture tokens have no owner()
+            self.assertTrue(all(probe.error for probe in table.probes if probe.scenario == "owner->wallet"))
+            self.assertNotIn("!", table.format())
+
+
+if __name__ == "__main__":
+    unittest.main()
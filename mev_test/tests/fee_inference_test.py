@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from pyrevm import EVM, AccountInfo
+
+from fee_inference import ProbeGrid, TokenProbes, find_buy_counter, infer_models, merge_into_registry
+from fee_models import (FEE_MODELS_FILE, TokenBuyCountFee, TokenBuyCountTimeFee, TokenFixedFee, load_fee_models,
+                        read_fee_models_file)
+from simulator import Simulator
+
+NOW = 1_700_000_000
+MY_ADDR = "0xd8dA6BF26964aF9D7eEd9e03E53415D37aA96045"
+
+
+class Token:
+    def __init__(self, address):
+        self.address = address
+
+
+class FeeInferenceTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.grid = ProbeGrid()
+
+    def probes(self, index, fee_of, noise=0.0) -> TokenProbes:
+        fees = np.array([fee_of(int(count), NOW + int(offset))
+                         for count, offset in zip(self.grid.buy_counts, self.grid.time_offsets)], dtype=np.float64)
+        fees += np.random.default_rng(index).normal(0, noise, len(fees))
+        return TokenProbes("0x{:040x}".format(index), fees, fees.copy(), 3, 200, NOW)
+
+    def test_infer_models(self):
+        probes = [
+            self.probes(1, lambda count, now: TokenFixedFee(5).fee_percent()),
+            self.probes(2, lambda count, now: TokenBuyCountFee(count, 20, 4.5, 25).fee_percent()),
+            self.probes(3, lambda count, now: TokenBuyCountTimeFee(count, now, NOW - 3600,
+                                                                   [30, 20, 10, 0.3]).fee_percent()),
+            self.probes(4, lambda count, now: TokenBuyCountFee(count, 20, 4.5, 25).fee_percent(), noise=0.03),
+        ]
+        probes[0].fees["buy"][::3] = np.nan
+        fixed, buy_count, buy_count_time, noisy = infer_models(probes, "buy", self.grid)
+
+        self.assertEqual((fixed.name, fixed.model.fee_rate, fixed.observations), ("fixed", 5, 69))
+        self.assertEqual((buy_count.name, buy_count.model.initial_fee, buy_count.model.final_fee,
+                          buy_count.model.reduce_fee_at, buy_count.model.buy_count), ("buy_count", 20, 4.5, 25, 200))
+        self.assertEqual(buy_count_time.name, "buy_count_time")
+        self.assertEqual(buy_count_time.model.fee_tier, [30, 20, 10, 0.3])
+        self.assertEqual(buy_count_time.model.trading_opened_time, NOW - 3600)
+        self.assertEqual(buy_count_time.model.fee_percent(), 0.3)
+        for inferred in (fixed, buy_count, buy_count_time):
+            self.assertGreater(inferred.confidence, 0.95)
+        self.assertEqual(noisy.name, "buy_count")
+        self.assertLess(noisy.confidence, buy_count.confidence)
+
+    def test_too_few_probes(self):
+        probes = self.probes(1, lambda count, now: 1.0)
+        probes.fees["buy"][:] = np.nan
+        self.assertEqual(infer_models([probes], "buy", self.grid)[0].confidence, 0)
+
+    def test_find_buy_counter(self):
+        # Increments slot 5 when called with data, like a token counting its buys
+        sim = Simulator(EVM())
+        token = Token("0x" + "11" * 20)
+        sim.insert_account_info(token.address, AccountInfo(code=bytes.fromhex("600554600101600555" "00")))
+        sim.set_balance(MY_ADDR, 10 ** 18)
+        buy = lambda: sim.message_call(MY_ADDR, token.address, b"\x01")
+        self.assertEqual(find_buy_counter(sim, token, buy, slots=range(8)), 5)
+        self.assertEqual(sim.storage(token.address, 5), 0)
+
+    def test_merge_into_registry(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "fee_models.json")
+            shutil.copy(FEE_MODELS_FILE, path)
+            hand_written = "0x55a8f6c6b3aa58ad6d1f26f6afeded78f32e19f4"
+            probes = [self.probes(1, lambda count, now: 2.5), self.probes(2, lambda count, now: 3.0)]
+            probes[1].address = hand_written
+            inferred = infer_models(probes, "buy", self.grid)
+
+            self.assertEqual(merge_into_registry({"buy": inferred}, path), 1)
+            tables = load_fee_models(path)
+            self.assertEqual(tables["buy"][probes[0].address].fee_rate, 2.5)
+            self.assertEqual(tables["buy"][hand_written].fee_rate, 5)
+            self.assertTrue(read_fee_models_file(path)["buy"][probes[0].address]["note"].startswith("inferred"))
+
+            self.assertEqual(merge_into_registry({"buy": inferred}, path, overwrite=True), 2)
+            self.assertEqual(load_fee_models(path)["buy"][hand_written].fee_rate, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import fee_models
+from fee_models import (ERC20Token, TokenBuyCountFee, TokenBuyCountTimeFee, TokenFixedFee, get_model,
+                        init_fees, load_fee_models)
+
+TOKEN = "0x1bfce574deff725a3f483c334b790e25c8fa9779"
+
+
+class FeeModelsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def write(self, data) -> str:
+        path = os.path.join(self.tmp.name, "fee_models.json")
+        with open(path, "w") as f:
+            f.write(data if isinstance(data, str) else json.dumps(data))
+        return path
+
+    def test_shipped_file(self):
+        init_fees()
+        self.assertEqual(get_model(fee_models.buy_fees, "0x6E96394B930ffb40AfE27cBd5c0133671AD239e9").fee_rate, 2)
+        model = get_model(fee_models.transfer_fees, "0xBB9B264C9F9ED7294B98AB4D83FB9F5762408390")
+        self.assertIsInstance(model, TokenBuyCountFee)
+        self.assertEqual(type(get_model(fee_models.sell_fees, TOKEN)), ERC20Token)
+        # Buy and transfer fees of a token may differ
+        self.assertEqual(get_model(fee_models.buy_fees, "0x78b1ceb872fefc6440fbdfa643f9bc533db41457").fee_rate, 4)
+        self.assertEqual(get_model(fee_models.transfer_fees, "0x78b1ceb872fefc6440fbdfa643f9bc533db41457").fee_rate, 3.8)
+
+    def test_load(self):
+        path = self.write({"buy": {TOKEN.upper().replace("0X", "0x"): {"model": "fixed", "fee_rate": 3,
+                                                                        "note": "Set freely by the owner"}},
+                           "transfer": {TOKEN: {"model": "buy_count_time", "buy_count": 100,
+                                                "transaction_time": 50, "trading_opened_time": 45,
+                                                "fee_tier": [30, 20, 10, 5]}}})
+        tables = load_fee_models(path)
+        self.assertEqual(tables["buy"][TOKEN].fee_rate, 3)
+        self.assertEqual(tables["transfer"][TOKEN].fee_percent(), 5)
+        self.assertEqual(tables["sell"], {})
+
+    def test_invalid(self):
+        for data in ({"buy": {TOKEN: {"model": "fixed"}}},
+                     {"buy": {TOKEN: {"model": "fixed", "fee_rate": 150}}},
+                     {"buy": {TOKEN: {"model": "fixed", "fee_rate": "5"}}},
+                     {"buy": {TOKEN: {"model": "flat", "fee_rate": 5}}},
+                     {"buy": {"0x1234": {"model": "fixed", "fee_rate": 5}}},
+                     {"buy": {TOKEN: {"model": "buy_count_time", "buy_count": 1, "transaction_time": 1,
+                                      "trading_opened_time": 1, "fee_tier": [1, 2]}}},
+                     {"swap": {}},
+                     '{"buy": {"%s": {"model": "fixed", "fee_rate": 1}, "%s": {"model": "fixed", "fee_rate": 2}}}'
+                     % (TOKEN, TOKEN.upper().replace("0X", "0x"))):
+            with self.assertRaises(ValueError, msg=data):
+                load_fee_models(self.write(data))
+
+    def test_transfer_many(self):
+        amounts = [0, 1, 999, 10 ** 9 + 7, 2 ** 62]
+        big = [10 ** 27 + 12345, 2 ** 70]
+        for model in (ERC20Token(), TokenFixedFee(0.7), TokenFixedFee(3),
+                      TokenBuyCountFee(35, initial_fee=20, final_fee=4.5, reduce_fee_at=30),
+                      TokenBuyCountTimeFee(100, 50, trading_opened_time=45, fee_tier=[30, 20, 10, 0.3])):
+            self.assertEqual(model.transfer_many(amounts).tolist(), [model.transfer(a) for a in amounts])
+            self.assertEqual(model.transfer_many(big).tolist(), [model.transfer(a) for a in big])
+        self.assertEqual(TokenFixedFee(1).transfer_many(np.arange(3)).dtype, np.int64)
+        with self.assertRaises(TypeError):
+            TokenFixedFee(1).transfer_many([1.5])
+
+
+if __name__ == '__main__':
+    unittest.main()
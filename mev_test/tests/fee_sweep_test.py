@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from pyrevm import EVM, AccountInfo
+
+import fee_sweep
+from block_meta import BlockHeader
+from fee_sweep import BLOCK_ERROR, FeeSeries, StateCarrier, SweepConfig
+from fork_cache import ForkStateCache
+from rpc_server import FixtureStore, serve
+
+TOKEN = "0x1bfce574deff725a3f483c334b790e25c8fa9779"
+PAIR = "0x" + "22" * 20
+BLOCK_A = "0x" + "aa" * 32
+BLOCK_B = "0x" + "bb" * 32
+# Nothing listens there, every RPC call fails right away
+DEAD_RPC = "http://127.0.0.1:1"
+
+
+def record(block, buy_fee, status="OK"):
+    return {"address": TOKEN, "block": block, "buy_fee": buy_fee, "transfer_fee": 0.0, "sell_fee": buy_fee,
+            "status": status, "error": None}
+
+
+def proof(balance, code_hash, storage_hash):
+    return {"result": {"balance": hex(balance), "nonce": "0x1", "codeHash": "0x" + code_hash * 32,
+                       "storageHash": "0x" + storage_hash * 32}}
+
+
+class FeeSeriesTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.series = FeeSeries(os.path.join(self.tmp.name, "series.sqlite"))
+
+    def tearDown(self) -> None:
+        self.series.close()
+        self.tmp.cleanup()
+
+    def test_series_and_changes(self):
+        for block, fee in ((130, 5.0), (100, 25.0), (110, 25.0), (120, None), (140, 5.0)):
+            self.series.add([record(block, fee, "OK" if fee is not None else "ERROR")], 1_700_000_000 + block)
+        series = self.series.series(TOKEN.upper().replace("0X", "0x"), from_block=110)
+        self.assertEqual(series["block"].tolist(), [110, 120, 130, 140])
+        self.assertTrue(np.isnan(series["buy_fee"][1]))
+        self.assertEqual(series["status"][1], "ERROR")
+        self.assertEqual(self.series.changes(TOKEN), [(100, 25.0), (130, 5.0)])
+        self.assertEqual(self.series.done_blocks(1), {100, 110, 120, 130, 140})
+        self.assertEqual(len(self.series.series(PAIR)["block"]), 0)
+
+    def test_block_errors_are_not_done(self):
+        self.series.add([record(100, 5.0), record(110, None, BLOCK_ERROR)], 1_700_000_000)
+        self.assertEqual(self.series.done_blocks(1), {100})
+
+
+class StateCarrierTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        store = FixtureStore(os.path.join(self.tmp.name, "fixtures"))
+        # TOKEN only changed balance, PAIR changed storage
+        store.put("eth_getProof", [TOKEN, [], {"blockHash": BLOCK_A}], proof(5, "01", "02"))
+        store.put("eth_getProof", [TOKEN, [], {"blockHash": BLOCK_B}], proof(7, "01", "02"))
+        store.put("eth_getProof", [PAIR, [], {"blockHash": BLOCK_A}], proof(0, "03", "04"))
+        store.put("eth_getProof", [PAIR, [], {"blockHash": BLOCK_B}], proof(0, "03", "05"))
+        store.flush()
+        self.server = serve(store.directory)
+        self.cache = ForkStateCache(os.path.join(self.tmp.name, "state.sqlite"))
+
+    def tearDown(self) -> None:
+        self.cache.close()
+        self.server.shutdown()
+        self.tmp.cleanup()
+
+    def test_carry_unchanged_state(self):
+        evm = EVM()
+        evm.insert_account_info(TOKEN, AccountInfo(balance=5, nonce=1, code=bytes.fromhex("6001")))
+        evm.insert_account_info(PAIR, AccountInfo(code=bytes.fromhex("6002")))
+        self.cache.save_accounts(evm, BLOCK_A)
+        self.cache.put_storage(BLOCK_A, TOKEN, {0: 1})
+        self.cache.put_storage(BLOCK_A, PAIR, {8: 2})
+
+        StateCarrier(self.server.url, self.cache).carry(BLOCK_A, BLOCK_B)
+        self.assertEqual((self.cache.stats.accounts_carried, self.cache.stats.slots_carried), (2, 1))
+        self.assertEqual(self.cache.cached_slots(BLOCK_B, TOKEN), [0])
+        self.assertEqual(self.cache.cached_slots(BLOCK_B, PAIR), [])
+
+        fresh = EVM()
+        self.assertTrue(self.cache.seed(fresh, BLOCK_B))
+        self.assertEqual(fresh.get_balance(TOKEN), 7)
+        self.assertEqual(fresh.get_code(PAIR), bytes.fromhex("6002"))
+        self.assertEqual(fresh.storage(TOKEN, 0), 1)
+
+
+class SweepBlockTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        config = SweepConfig(DEAD_RPC, [("TKN", TOKEN), ("PAIR", PAIR)], os.path.join(self.tmp.name, "state.sqlite"))
+        fee_sweep.init_worker(config)
+
+    def tearDown(self) -> None:
+        fee_sweep.worker["state_cache"].close()
+        fee_sweep.worker.clear()
+        self.tmp.cleanup()
+
+    def test_rpc_error_gives_error_rows(self):
+        header = BlockHeader(101, BLOCK_B, BLOCK_A, 1_700_000_000, 30_000_000, "0x" + "00" * 20)
+        records = fee_sweep.sweep_block(header, None)
+        self.assertEqual([(record["address"], record["block"], record["status"]) for record in records],
+                         [(TOKEN, 101, BLOCK_ERROR), (PAIR, 101, BLOCK_ERROR)])
+        self.assertTrue(all(record["error"] for record in records))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+from pyrevm import EVM, AccountInfo
+
+from fork_cache import ForkStateCache
+
+TOKEN = "0x1bfce574deff725a3f483c334b790e25c8fa9779"
+BLOCK_A = "0x" + "aa" * 32
+BLOCK_B = "0x" + "bb" * 32
+
+
+class ForkStateCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "state.sqlite")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        evm = EVM()
+        evm.insert_account_info(TOKEN, AccountInfo(balance=5, nonce=1, code=bytes.fromhex("6001")))
+        cache = ForkStateCache(self.path)
+        self.assertFalse(cache.seed(EVM(), BLOCK_A))
+        cache.save_accounts(evm, BLOCK_A)
+        cache.put_storage(BLOCK_A, TOKEN, {8: 12345})
+        cache.close()
+
+        fresh = EVM()
+        cache = ForkStateCache(self.path)
+        self.assertTrue(cache.seed(fresh, BLOCK_A))
+        self.assertEqual(fresh.get_balance(TOKEN), 5)
+        self.assertEqual(fresh.get_code(TOKEN), bytes.fromhex("6001"))
+        self.assertEqual(fresh.storage(TOKEN, 8), 12345)
+        self.assertEqual(cache.cached_slots(BLOCK_A, TOKEN), [8])
+        self.assertEqual((cache.stats.hits, cache.stats.misses), (1, 0))
+
+    def test_lru_eviction(self):
+        cache = ForkStateCache(self.path, max_blocks=1)
+        cache.put_storage(BLOCK_A, TOKEN, {0: 1})
+        cache.put_storage(BLOCK_B, TOKEN, {0: 2})
+        self.assertEqual(list(cache.blocks()), [BLOCK_B])
+        self.assertFalse(cache.seed(EVM(), BLOCK_A))
+        self.assertEqual(cache.stats.evicted_blocks, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+
+import fee_models
+from arbitrage import measured_fees
+from input_solver import exact_amount_out, golden_section, path_coefficients, solve, solve_many
+from uniswap_v2 import WETH_ADDR
+from v2_math import ReserveCache
+
+DOGE = "0xF2ec4a773ef90c58d98ea734c0eBDB538519b988"
+NEIRO = "0x812Ba41e071C7b7fA4EBcFB62dF5F45f6fA853Ee"
+KABOSU = "0xCEb67a66c2c8a90980dA3A50A3F96c07525a26Cb"
+TRIANGLE = [WETH_ADDR, DOGE, NEIRO, WETH_ADDR]
+ROUND_TRIP = [WETH_ADDR, KABOSU, WETH_ADDR]
+# data/fee_models.json: 1.6% transfer fee, and a 4% buy fee
+TRANSFER_ONLY = "0x0fc6c0465c9739d4a42daca22eb3b2cb0eb9937a"
+LISTED = "0x5aef5bba19e6a1644805bd4f5c93c8557b87c62c"
+
+
+class InputSolverTest(unittest.TestCase):
+    def setUp(self) -> None:
+        # 1 WETH = 1000 DOGE = 10 NEIRO, the DOGE/NEIRO pair gives 10% too many NEIRO
+        self.reserves = ReserveCache()
+        self.reserves.set(WETH_ADDR, DOGE, 10 ** 20, 10 ** 23)
+        self.reserves.set(DOGE, NEIRO, 10 ** 23, 11 * 10 ** 20)
+        self.reserves.set(NEIRO, WETH_ADDR, 10 ** 21, 10 ** 20)
+        self.reserves.set(WETH_ADDR, KABOSU, 10 ** 20, 10 ** 25)
+
+    def profit(self, amount_in, path=TRIANGLE, fees=None):
+        return exact_amount_out(amount_in, path, self.reserves, fees) - amount_in
+
+    def test_closed_form_is_the_optimum(self):
+        solution = solve(TRIANGLE, self.reserves)
+        self.assertEqual(solution.method, "closed_form")
+        self.assertGreater(solution.profit, 0)
+        self.assertEqual(solution.profit, self.profit(solution.amount_in))
+        for factor in (0.9, 0.99, 1.01, 1.1):
+            self.assertGreaterEqual(solution.profit, self.profit(int(solution.amount_in * factor)))
+
+    def test_golden_section_agrees(self):
+        closed = solve(TRIANGLE, self.reserves)
+        searched = solve(TRIANGLE, self.reserves, max_amount=10 ** 20,
+                         quote=lambda amount: exact_amount_out(amount, TRIANGLE, self.reserves))
+        self.assertEqual(searched.method, "golden_section")
+        self.assertAlmostEqual(searched.profit / closed.profit, 1, places=6)
+
+    def test_golden_section_on_a_parabola(self):
+        self.assertEqual(golden_section(lambda x: x + 1000 * x - x * x, 1, 10 ** 6), 500)
+
+    def test_batch_of_paths(self):
+        fees = {NEIRO.lower(): (2.0, 2.0)}
+        solutions = solve_many([TRIANGLE, ROUND_TRIP, TRIANGLE], self.reserves, fees, max_amount=10 ** 17)
+        self.assertEqual([solution.amount_in for solution in solutions][1], 0)
+        self.assertEqual(solutions[0].amount_in, 10 ** 17)
+        self.assertEqual(solutions[0].profit, self.profit(10 ** 17, fees=fees))
+        self.assertLess(solve(TRIANGLE, self.reserves, fees).profit, solve(TRIANGLE, self.reserves).profit)
+
+    def test_coefficients_match_the_quote(self):
+        a, c = path_coefficients([TRIANGLE, ROUND_TRIP], self.reserves)
+        for row, path in enumerate([TRIANGLE, ROUND_TRIP]):
+            amount = 10 ** 18
+            expected = exact_amount_out(amount, path, self.reserves)
+            self.assertAlmostEqual(a[row] * amount / (1 + c[row] * amount) / expected, 1, places=9)
+
+    def test_measured_fees(self):
+        # DOGE replaced by a listed token, with the fee models as arbitrage.py main() passes them
+        self.reserves.set(WETH_ADDR, TRANSFER_ONLY, 10 ** 20, 10 ** 23)
+        self.reserves.set(TRANSFER_ONLY, NEIRO, 10 ** 23, 11 * 10 ** 20)
+        path = [WETH_ADDR, TRANSFER_ONLY, NEIRO, WETH_ADDR]
+        fees = measured_fees()
+        taxed, plain = solve(path, self.reserves, fees), solve(path, self.reserves)
+        self.assertGreater(taxed.profit, 0)
+        self.assertLess(taxed.profit, plain.profit)
+        self.assertEqual(taxed.profit, self.profit(taxed.amount_in, path, fees))
+        for factor in (0.9, 1.1):
+            self.assertGreaterEqual(taxed.profit, self.profit(int(taxed.amount_in * factor), path, fees))
+
+        a, c = path_coefficients([path], self.reserves, fees)
+        expected = exact_amount_out(10 ** 18, path, self.reserves, fees)
+        self.assertAlmostEqual(a[0] * 10 ** 18 / (1 + c[0] * 10 ** 18) / expected, 1, places=6)
+
+        # 4% buy fee on the first hop of a 10% mispricing round trip through it
+        self.reserves.set(WETH_ADDR, LISTED, 10 ** 20, 10 ** 23)
+        self.assertLess(exact_amount_out(10 ** 18, [WETH_ADDR, LISTED, WETH_ADDR], self.reserves, fees),
+                        exact_amount_out(10 ** 18, [WETH_ADDR, LISTED, WETH_ADDR], self.reserves) * 0.961)
+
+    def test_fee_models_are_not_fees(self):
+        fee_models.init_fees()
+        with self.assertRaises(TypeError):
+            solve_many([TRIANGLE], self.reserves, {NEIRO.lower(): (fee_models.buy_fees[LISTED].fee_percent, 0.0)})
+
+    def test_not_a_cycle(self):
+        with self.assertRaises(ValueError):
+            solve([WETH_ADDR, DOGE, NEIRO], self.reserves)
+
+
+if __name__ == "__main__":
+    unittest.main()
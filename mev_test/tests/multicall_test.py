@@ -0,0 +1,83 @@
+import unittest
+
+from eth_abi import encode
+from pyrevm import EVM, AccountInfo
+
+from contract import Contract
+from multicall import Multicall, revert_reason
+from simulator import Simulator
+
+STORE_ADDR = "0x" + "11" * 20
+REVERTER_ADDR = "0x" + "22" * 20
+EMPTY_ADDR = "0x" + "33" * 20
+
+# get(slot) returns sload(slot)
+STORE_CODE = bytes.fromhex("6004355460005260206000f3")
+# Reverts with its arguments as the revert data
+REVERTER_CODE = bytes.fromhex("600436038060046000376000fd")
+
+ABI = [
+    {"type": "function", "name": "get", "inputs": [{"type": "uint256"}], "outputs": [{"type": "uint256"}],
+     "stateMutability": "view"},
+    {"type": "function", "name": "set", "inputs": [{"type": "uint256"}], "outputs": [],
+     "stateMutability": "nonpayable"},
+]
+
+
+class MulticallTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.sim = Simulator(EVM())
+        self.sim.insert_account_info(STORE_ADDR, AccountInfo(code=STORE_CODE))
+        self.sim.insert_account_info(REVERTER_ADDR, AccountInfo(code=REVERTER_CODE))
+        self.sim.insert_account_storage(STORE_ADDR, 1, 100)
+        self.sim.insert_account_storage(STORE_ADDR, 2, 200)
+        self.store = Contract(STORE_ADDR, revm=self.sim, abi=ABI)
+        self.reverter = Contract(REVERTER_ADDR, revm=self.sim, abi=ABI)
+        self.empty = Contract(EMPTY_ADDR, revm=self.sim, abi=ABI)
+
+    def test_results_in_order(self):
+        batch = Multicall(self.sim)
+        for slot in (2, 1, 3):
+            batch.add(self.store, "get", slot)
+        self.assertEqual(batch.values(), [200, 100, 0])
+        self.assertEqual(len(batch), 0)
+
+    def test_failures_do_not_abort_the_batch(self):
+        batch = Multicall(self.sim)
+        batch.add(self.store, "get", 1)
+        batch.add(self.reverter, "get", 7)
+        batch.add(self.empty, "get", 1)
+        batch.add(self.store, "get(uint256)", 2)
+        ok, reverted, no_code, last = batch.execute()
+
+        self.assertEqual((ok.success, ok.value), (True, 100))
+        self.assertFalse(reverted.success)
+        self.assertEqual(reverted.error, "execution reverted: 0x" + encode(["uint256"], [7]).hex())
+        # Like a Contract call, an address without code returns nothing
+        self.assertEqual((no_code.success, no_code.value), (True, None))
+        self.assertEqual(last.value, 200)
+        with self.assertRaises(RuntimeError):
+            reverted.unwrap()
+
+    def test_snapshot_scopes(self):
+        batch = Multicall(self.sim)
+        with self.sim.isolated():
+            self.sim.insert_account_storage(STORE_ADDR, 1, 101)
+            batch.add(self.store, "get", 1)
+            self.assertEqual(batch.values(), [101])
+        # The aggregator was deployed inside the reverted scope, it is put back
+        batch.add(self.store, "get", 1)
+        self.assertEqual(batch.values(), [100])
+
+    def test_rejects_non_constant(self):
+        with self.assertRaises(ValueError):
+            Multicall(self.sim).add(self.store, "set", 1)
+
+    def test_revert_reason(self):
+        data = bytes.fromhex("08c379a0") + encode(["string"], ["TRANSFER_FAILED"])
+        self.assertEqual(revert_reason(data), "execution reverted: TRANSFER_FAILED")
+        self.assertEqual(revert_reason(b""), "execution reverted")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+
+from abi import load_abi_file
+from pair_index import FACTORY_ABI_FILE, PairIndex, PairIndexer
+from rpc_server import FixtureStore, serve
+from uniswap_v2 import (UNISWAP_V2_FACTORY, PAIR_RESERVES_SLOT, PAIR_TOKEN0_SLOT, PAIR_TOKEN1_SLOT, WETH_ADDR,
+                        pair_address, sort_tokens)
+
+BLOCK_HASH = "0x" + "aa" * 32
+DOGE = "0xF2ec4a773ef90c58d98ea734c0eBDB538519b988"
+NEIRO = "0x812Ba41e071C7b7fA4EBcFB62dF5F45f6fA853Ee"
+DEAD = "0x" + "de" * 20
+
+
+def reserves_word(reserve0, reserve1, timestamp=1):
+    return hex(timestamp << 224 | reserve1 << 112 | reserve0)
+
+
+class PairIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index = PairIndex(os.path.join(self.tmp.name, "pairs.sqlite"))
+
+    def tearDown(self) -> None:
+        self.index.close()
+        self.tmp.cleanup()
+
+    def test_lookup_by_block(self):
+        pair = pair_address(WETH_ADDR, DOGE)
+        self.index.add_pairs([(pair, WETH_ADDR, DOGE, None)])
+        self.index.set_reserves(100, [(pair, 10, 20, 0)])
+        self.index.set_reserves(110, [(pair, 0, 0, 0)])
+
+        info = self.index.get(DOGE, WETH_ADDR)
+        self.assertEqual((info.pair, info.block_number), (pair.lower(), 110))
+        self.assertFalse(info.has_liquidity())
+        info = self.index.get(WETH_ADDR, DOGE, block_number=105)
+        self.assertEqual((info.reserve0, info.reserve1), (10, 20))
+        self.assertEqual(info.reserves(DOGE), (20, 10))
+        self.assertEqual(info.other(DOGE), WETH_ADDR.lower())
+        self.assertIsNone(self.index.get(WETH_ADDR, DOGE, block_number=99).reserve0)
+        self.assertEqual([info.pair for info in self.index.pairs_of(DOGE)], [pair.lower()])
+        self.assertIsNone(self.index.get(WETH_ADDR, NEIRO))
+
+        self.index.add_pairs([(pair_address(WETH_ADDR, NEIRO), *sort_tokens(WETH_ADDR, NEIRO), None)])
+        self.assertEqual([(info.pair, info.reserve0, info.block_number)
+                          for info in self.index.pairs_with_reserves(105)], [(pair.lower(), 10, 100)])
+        self.assertEqual(self.index.pairs_with_reserves()[0].block_number, 110)
+
+
+class PairIndexerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pairs = [pair_address(WETH_ADDR, DOGE), pair_address(WETH_ADDR, NEIRO)]
+        block = {"blockHash": BLOCK_HASH}
+        store = FixtureStore(os.path.join(self.tmp.name, "fixtures"))
+        factory_abi = load_abi_file(FACTORY_ABI_FILE)
+
+        def factory_call(name, *args, result):
+            data = "0x" + factory_abi.find(name)[0].encode_inputs(args).hex()
+            store.put("eth_call", [{"to": UNISWAP_V2_FACTORY, "data": data}, block], {"result": result})
+
+        factory_call("allPairsLength", result="0x" + "2".rjust(64, "0"))
+        for index, (pair, token) in enumerate(zip(self.pairs, (DOGE, NEIRO))):
+            factory_call("allPairs", index, result="0x" + pair[2:].rjust(64, "0"))
+            for slot, sorted_token in zip((PAIR_TOKEN0_SLOT, PAIR_TOKEN1_SLOT), sort_tokens(WETH_ADDR, token)):
+                store.put("eth_getStorageAt", [pair, hex(slot), block],
+                          {"result": "0x" + sorted_token[2:].rjust(64, "0")})
+        store.put("eth_getStorageAt", [self.pairs[0], hex(PAIR_RESERVES_SLOT), block],
+                  {"result": reserves_word(10 ** 20, 10 ** 30)})
+        store.put("eth_getStorageAt", [pair_address(WETH_ADDR, DEAD), hex(PAIR_RESERVES_SLOT), block],
+                  {"result": "0x0"})
+        store.flush()
+        self.server = serve(os.path.join(self.tmp.name, "fixtures"))
+        self.index = PairIndex(os.path.join(self.tmp.name, "pairs.sqlite"))
+        self.indexer = PairIndexer(self.index, self.server.url, BLOCK_HASH, 100)
+
+    def tearDown(self) -> None:
+        self.index.close()
+        self.server.shutdown()
+        self.tmp.cleanup()
+
+    def test_sync_factory_is_incremental(self):
+        self.assertEqual(self.indexer.sync_factory(limit=1), 1)
+        self.assertEqual(self.indexer.sync_factory(), 1)
+        self.assertEqual(self.indexer.sync_factory(), 0)
+        self.assertEqual(self.index.pair_count(), 2)
+        self.assertEqual(self.index.get(NEIRO, WETH_ADDR).pair, self.pairs[1].lower())
+
+    def test_discover(self):
+        pairs = self.indexer.discover([DOGE, DEAD])
+        self.assertTrue(pairs[DOGE].has_liquidity())
+        self.assertEqual(pairs[DOGE].reserves(WETH_ADDR), (10 ** 20, 10 ** 30))
+        self.assertIsNone(pairs[DEAD])
+        self.assertEqual(self.index.pair_count(), 1)
+        # The factory sync keeps the pair found by CREATE2
+        self.indexer.sync_factory()
+        self.assertEqual(self.index.pair_count(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import time
+import unittest
+
+from pyrevm import EVM
+
+from block_meta import get_block_header
+from contract import Contract
+from pair_swap import PairSwapper
+from uniswap_v2 import PAIR_RESERVES_SLOT, UNISWAP_V2_ROUTER, WETH_ADDR, pair_address
+from v2_math import get_amount_out
+
+FORK_URL = os.getenv("FORK_URL")
+BLOCK_NUM = 20967700
+MY_ADDR = "0xd8dA6BF26964aF9D7eEd9e03E53415D37aA96045"  # vitalik.eth
+DOGE = "0xF2ec4a773ef90c58d98ea734c0eBDB538519b988"
+
+
+class PairSwapperTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.evm = EVM()
+        self.swapper = PairSwapper(self.evm)
+
+    def test_pair_address(self):
+        pair = self.swapper.pair(DOGE, WETH_ADDR)
+        self.assertEqual(pair.address, pair_address(WETH_ADDR, DOGE))
+        self.assertIs(self.swapper.pair(WETH_ADDR, DOGE), pair)
+
+    def test_quote_from_reserves_slot(self):
+        # WETH sorts first: reserve0 is WETH, reserve1 is DOGE
+        self.evm.insert_account_storage(pair_address(WETH_ADDR, DOGE), PAIR_RESERVES_SLOT,
+                                        (1 << 224) | (5 * 10 ** 24 << 112) | 10 ** 21)
+        self.assertEqual(self.swapper.reserves(WETH_ADDR, DOGE), (10 ** 21, 5 * 10 ** 24))
+        self.assertEqual(self.swapper.reserves(DOGE, WETH_ADDR), (5 * 10 ** 24, 10 ** 21))
+        self.assertEqual(self.swapper.quote(10 ** 18, WETH_ADDR, DOGE), get_amount_out(10 ** 18, 10 ** 21, 5 * 10 ** 24))
+
+    def test_missing_pair(self):
+        self.assertEqual(self.swapper.reserves(WETH_ADDR, DOGE), (0, 0))
+        with self.assertRaises(ValueError):
+            self.swapper.quote(10 ** 18, WETH_ADDR, DOGE)
+
+
+@unittest.skipUnless(FORK_URL, "needs FORK_URL")
+class PairSwapperRouterTest(unittest.TestCase):
+    """A direct pair swap ends in the same balances as the router swap."""
+
+    def setUp(self) -> None:
+        block = get_block_header(FORK_URL, BLOCK_NUM)
+        self.evm = EVM(fork_url=FORK_URL, fork_block=block.parent_hash, tracing=False)
+        self.weth = Contract(WETH_ADDR, revm=self.evm, abi_file_path="./abi/weth.abi")
+        self.doge = Contract(DOGE, revm=self.evm, abi_file_path="./abi/erc20.abi")
+        self.router = Contract(UNISWAP_V2_ROUTER, revm=self.evm, abi_file_path="./abi/uniswapv2router.abi")
+        self.weth.deposit(value=10 ** 19, caller=MY_ADDR)
+        self.weth.approve(self.router.address, 10 ** 19, caller=MY_ADDR)
+
+    def test_same_output_as_router(self):
+        checkpoint = self.evm.snapshot()
+        _, router_out = self.router.swapExactTokensForTokens(10 ** 17, 1, [WETH_ADDR, DOGE], MY_ADDR,
+                                                             int(time.time()) + 600, caller=MY_ADDR)
+        router_balance = self.doge.balanceOf(MY_ADDR)
+        self.evm.revert(checkpoint)
+
+        amount_out = PairSwapper(self.evm).swap_exact_in(self.weth, DOGE, 10 ** 17, MY_ADDR, caller=MY_ADDR)
+        self.assertEqual(amount_out, router_out)
+        self.assertEqual(self.doge.balanceOf(MY_ADDR), router_balance)
+
+
+if __name__ == "__main__":
+    unittest.main()
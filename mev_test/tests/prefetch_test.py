@@ -0,0 +1,80 @@
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from pyrevm import EVM
+
+from prefetch import Prefetcher
+from rpc_server import FixtureStore, serve
+from uniswap_v2 import WETH_ADDR, PAIR_RESERVES_SLOT, pair_address
+
+BLOCK_HASH = "0x" + "ab" * 32
+TOKEN = "0xF2ec4a773ef90c58d98ea734c0eBDB538519b988"
+
+
+class TruncatingHandler(BaseHTTPRequestHandler):
+    """Announces a longer body than it sends, reading the response raises IncompleteRead."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Length", "100")
+        self.end_headers()
+        self.wfile.write(b"[")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PrefetchTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        block = {"blockHash": BLOCK_HASH}
+        self.pair = pair_address(WETH_ADDR, TOKEN)
+        store = FixtureStore(self.tmp.name)
+        for address, code in ((TOKEN, "0x6001"), (self.pair, "0x6002")):
+            store.put("eth_getBalance", [address, block], {"result": "0x0"})
+            store.put("eth_getTransactionCount", [address, block], {"result": "0x1"})
+            store.put("eth_getCode", [address, block], {"result": code})
+        store.put("eth_getStorageAt", [self.pair, hex(PAIR_RESERVES_SLOT), block], {"result": hex(12345)})
+        store.flush()
+        self.server = serve(self.tmp.name)
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.tmp.cleanup()
+
+    def test_pair_address(self):
+        self.assertEqual(pair_address("0x812Ba41e071C7b7fA4EBcFB62dF5F45f6fA853Ee", TOKEN),
+                         "0x270250af8569D4ff712AaEbC2F5971A824249fA7")
+
+    def test_iter_seeded(self):
+        evm = EVM()
+        prefetcher = Prefetcher(self.server.url, BLOCK_HASH)
+        try:
+            seeded = list(prefetcher.iter_seeded(evm, [("DOGE2.0", TOKEN)], lambda item: item[1]))
+        finally:
+            prefetcher.close()
+        self.assertEqual(seeded, [("DOGE2.0", TOKEN)])
+        self.assertEqual(evm.get_code(TOKEN), bytes.fromhex("6001"))
+        self.assertEqual(evm.storage(self.pair, PAIR_RESERVES_SLOT), 12345)
+        # WETH itself has no fixture, it is left to the fork
+        self.assertEqual(prefetcher.stats.accounts, 2)
+        self.assertEqual(prefetcher.stats.batches, 1)
+
+    def test_iter_seeded_http_error(self):
+        server = HTTPServer(("127.0.0.1", 0), TruncatingHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        prefetcher = Prefetcher("http://127.0.0.1:{}".format(server.server_address[1]), BLOCK_HASH)
+        try:
+            seeded = list(prefetcher.iter_seeded(EVM(), [TOKEN]))
+        finally:
+            prefetcher.close()
+            server.shutdown()
+        self.assertEqual(seeded, [TOKEN])
+        self.assertEqual(prefetcher.stats.failed, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
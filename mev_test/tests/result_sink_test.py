@@ -0,0 +1,75 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+
+from fee_checker import FeeCheckResult
+from result_sink import FIELDS, ResultSink, format_record, make_record
+
+
+def ok_result():
+    result = FeeCheckResult()
+    result.buy_fee, result.buy_status = 3.0, "OK"
+    result.transfer_status = "OK"
+    result.sell_fee, result.sell_status = 3.0, "WRONG_FEE"
+    return result
+
+
+class ResultSinkTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_make_record(self):
+        record = make_record("0x01", "A", 100, ok_result(), elapsed=0.5, index=2)
+        self.assertEqual(list(record), FIELDS)
+        self.assertEqual((record["status"], record["sell_fee"], record["elapsed_ms"]), ("WRONG_FEE", 3.0, 500.0))
+
+        record = make_record("0x01", "A", 100, error="RuntimeError: execution reverted")
+        self.assertEqual((record["status"], record["error_class"], record["error"]),
+                         ("ERROR", "RuntimeError", "execution reverted"))
+        no_pair = FeeCheckResult()
+        no_pair.has_v2_pair = False
+        self.assertEqual(make_record("0x01", "A", 100, no_pair)["status"], "NO_PAIR")
+
+    def test_format_record(self):
+        record = dict(make_record("0x01", "A", 100, ok_result()), reused_from=90)
+        self.assertEqual(format_record(record), "    V2Pair: True, Buy Fee: 3.0% (OK), Transfer Fee: 0.0% (OK), "
+                                                "Sell Fee: 3.0% (WRONG_FEE), reused from block 90")
+        self.assertIn("Buy Fee: - (None)", format_record(make_record("0x01", "A", 100)))
+
+    def test_jsonl_appends_and_flushes(self):
+        path = os.path.join(self.tmp.name, "results.jsonl")
+        with ResultSink(path) as sink:
+            for index in range(100):
+                sink.write(make_record("0x{:02x}".format(index), str(index), 100, ok_result(), index=index))
+        with ResultSink(path) as sink:
+            sink.write(make_record("0xff", "last", 101, error=ValueError("bad")))
+            self.assertEqual(sink.path, path)
+
+        with open(path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 101)
+        self.assertEqual([record["index"] for record in records[:100]], list(range(100)))
+        self.assertEqual(records[-1]["error_class"], "ValueError")
+
+    def test_csv_header_once(self):
+        path = os.path.join(self.tmp.name, "results.csv")
+        for _ in range(2):
+            with ResultSink(path) as sink:
+                sink.write(make_record("0x01", "A", 100, ok_result()))
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1]["buy_status"], "OK")
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            ResultSink(os.path.join(self.tmp.name, "results.txt"))
+
+
+if __name__ == '__main__':
+    unittest.main()
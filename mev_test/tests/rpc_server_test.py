@@ -0,0 +1,112 @@
+import json
+import tempfile
+import threading
+import unittest
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from rpc_server import FixtureStore, MISSING_FIXTURE, UPSTREAM_ERROR, serve
+
+TOKEN = "0x1bfce574deff725a3f483c334b790e25c8fa9779"
+
+
+class BadIdsHandler(BaseHTTPRequestHandler):
+    """Answers the first request of a batch, under an unknown id and then its own one."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        data = json.dumps([{"jsonrpc": "2.0", "id": 5, "result": "0x1"}, {"jsonrpc": "2.0", "result": "0x1"},
+                           {"jsonrpc": "2.0", "id": 0, "result": "0x6001"}]).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def post(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+class RPCServerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.upstream_dir = self.tmp.name + "/upstream"
+        store = FixtureStore(self.upstream_dir)
+        store.put("eth_getCode", [TOKEN, "latest"], {"result": "0x6001"})
+        store.put("eth_getStorageAt", [TOKEN, "0x8", "latest"], {"result": "0x" + "00" * 31 + "05"})
+        store.flush()
+        self.upstream = serve(self.upstream_dir)
+
+    def tearDown(self) -> None:
+        self.upstream.shutdown()
+        self.tmp.cleanup()
+
+    def test_replay_single_and_batch(self):
+        response = post(self.upstream.url, {"jsonrpc": "2.0", "id": 7, "method": "eth_getCode",
+                                            "params": [TOKEN.upper().replace("0X", "0x"), "latest"]})
+        self.assertEqual(response, {"jsonrpc": "2.0", "id": 7, "result": "0x6001"})
+
+        responses = post(self.upstream.url, [
+            {"jsonrpc": "2.0", "id": 1, "method": "eth_getStorageAt", "params": [TOKEN, "0x8", "latest"]},
+            {"jsonrpc": "2.0", "id": 2, "method": "eth_getBalance", "params": [TOKEN, "latest"]},
+        ])
+        self.assertEqual([response["id"] for response in responses], [1, 2])
+        self.assertTrue(responses[0]["result"].endswith("05"))
+        self.assertEqual(responses[1]["error"]["code"], MISSING_FIXTURE)
+
+    def test_record_then_replay(self):
+        recorded_dir = self.tmp.name + "/recorded"
+        recorder = serve(recorded_dir, upstream=self.upstream.url)
+        post(recorder.url, [{"jsonrpc": "2.0", "id": "a", "method": "eth_getCode", "params": [TOKEN, "latest"]}])
+        recorder.shutdown()
+        recorder.store.flush()
+
+        replay = serve(recorded_dir)
+        try:
+            response = post(replay.url, {"jsonrpc": "2.0", "id": 1, "method": "eth_getCode",
+                                         "params": [TOKEN, "latest"]})
+            self.assertEqual(response["result"], "0x6001")
+            self.assertEqual((replay.hits, replay.misses), (1, 0))
+        finally:
+            replay.shutdown()
+
+    def test_upstream_error(self):
+        # Nothing listens on port 1
+        recorder = serve(self.tmp.name + "/recorded", upstream="http://127.0.0.1:1")
+        try:
+            responses = post(recorder.url, [
+                {"jsonrpc": "2.0", "id": "a", "method": "eth_getCode", "params": [TOKEN, "latest"]},
+                {"jsonrpc": "2.0", "id": "b", "method": "eth_getBalance", "params": [TOKEN, "latest"]},
+            ])
+        finally:
+            recorder.shutdown()
+        self.assertEqual([(response["id"], response["error"]["code"]) for response in responses],
+                         [("a", UPSTREAM_ERROR), ("b", UPSTREAM_ERROR)])
+        self.assertEqual(len(recorder.store), 0)
+
+    def test_upstream_bad_ids(self):
+        upstream = HTTPServer(("127.0.0.1", 0), BadIdsHandler)
+        threading.Thread(target=upstream.serve_forever, daemon=True).start()
+        recorder = serve(self.tmp.name + "/recorded", upstream="http://127.0.0.1:{}".format(upstream.server_address[1]))
+        try:
+            responses = post(recorder.url, [
+                {"jsonrpc": "2.0", "id": "a", "method": "eth_getCode", "params": [TOKEN, "latest"]},
+                {"jsonrpc": "2.0", "id": "b", "method": "eth_getBalance", "params": [TOKEN, "latest"]},
+            ])
+        finally:
+            recorder.shutdown()
+            upstream.shutdown()
+        self.assertEqual(responses[0], {"jsonrpc": "2.0", "id": "a", "result": "0x6001"})
+        self.assertEqual((responses[1]["id"], responses[1]["error"]["code"]), ("b", UPSTREAM_ERROR))
+        self.assertEqual(len(recorder.store), 1)
+        self.assertEqual((recorder.hits, recorder.misses), (0, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
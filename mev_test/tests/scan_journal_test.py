@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+from result_sink import FIELDS
+from rpc_server import FixtureStore, serve
+from scan_journal import Fingerprinter, ScanJournal, parse_slots
+from uniswap_v2 import WETH_ADDR, PAIR_RESERVES_SLOT, pair_address
+
+BLOCK_A = "0x" + "aa" * 32
+BLOCK_B = "0x" + "bb" * 32
+TOKEN = "0xF2ec4a773ef90c58d98ea734c0eBDB538519b988"
+OTHER = "0x1bfce574deff725a3f483c334b790e25c8fa9779"
+TOKENS = [("DOGE2.0", TOKEN), ("OTHER", OTHER)]
+
+
+class ScanJournalTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = ScanJournal(os.path.join(self.tmp.name, "journal.sqlite"))
+
+    def tearDown(self) -> None:
+        self.journal.close()
+        self.tmp.cleanup()
+
+    def test_parse_slots(self):
+        self.assertEqual(parse_slots("0-3,8,0x10"), (0, 1, 2, 3, 8, 16))
+
+    def test_resume(self):
+        self.journal.add(TOKEN, BLOCK_A, 100, {"address": TOKEN, "block": 100, "status": "OK"})
+        plan = self.journal.plan(TOKENS, BLOCK_A, 100)
+        self.assertEqual(plan.todo, [("OTHER", OTHER)])
+        self.assertEqual(plan.done[0][2].record["status"], "OK")
+        self.assertEqual([name for name, _, _ in plan.journaled], ["DOGE2.0"])
+        record = plan.done[0][2].output_record()
+        self.assertEqual(list(record), FIELDS)
+        self.assertEqual((record["status"], record["reused_from"]), ("OK", 100))
+
+    def test_incremental(self):
+        self.journal.add(TOKEN, BLOCK_A, 100, {"block": 100, "status": "OK"}, fingerprint="f1")
+        self.journal.add(OTHER, BLOCK_A, 100, {"block": 100, "status": "OK"}, fingerprint="f1")
+        plan = self.journal.plan(TOKENS, BLOCK_B, 101, {TOKEN: "f1", OTHER: "f2"})
+        self.assertEqual(plan.todo, [("OTHER", OTHER)])
+        entry = plan.reused[0][2]
+        self.assertEqual((entry.block_number, entry.reused_from, entry.record["block"]), (101, 100, 101))
+        self.assertEqual((entry.output_record()["block"], entry.output_record()["reused_from"]), (101, 100))
+        # Carried over results are journaled, a rerun at the same block resumes from them
+        self.assertEqual(self.journal.plan(TOKENS, BLOCK_B, 101).as_dict(), {"todo": 1, "done": 1, "reused": 0})
+        # Without a fingerprint the token is always checked again
+        self.assertEqual(len(self.journal.plan(TOKENS, "0x" + "cc" * 32, 102, {TOKEN: None}).todo), 2)
+
+
+class FingerprinterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        store = FixtureStore(self.tmp.name)
+        for block_hash, reserves in ((BLOCK_A, 1000), (BLOCK_B, 2000)):
+            block = {"blockHash": block_hash}
+            store.put("eth_getCode", [TOKEN, block], {"result": "0x6001"})
+            store.put("eth_getStorageAt", [pair_address(WETH_ADDR, TOKEN), hex(PAIR_RESERVES_SLOT), block],
+                      {"result": hex(reserves)})
+            for slot in range(2):
+                store.put("eth_getStorageAt", [TOKEN, hex(slot), block], {"result": hex(slot)})
+        store.flush()
+        self.server = serve(self.tmp.name)
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.tmp.cleanup()
+
+    def test_fingerprints(self):
+        first = Fingerprinter(self.server.url, BLOCK_A, watched_slots=range(2)).fingerprints([TOKEN])[TOKEN]
+        again = Fingerprinter(self.server.url, BLOCK_A, watched_slots=range(2)).fingerprints([TOKEN])[TOKEN]
+        traded = Fingerprinter(self.server.url, BLOCK_B, watched_slots=range(2)).fingerprints([TOKEN])[TOKEN]
+        self.assertIsNotNone(first)
+        self.assertEqual(first, again)
+        self.assertNotEqual(first, traded)
+        # Slot 5 has no fixture, the token can't be fingerprinted
+        missing = Fingerprinter(self.server.url, BLOCK_A, watched_slots=range(6)).fingerprints([TOKEN])
+        self.assertEqual(missing, {TOKEN: None})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import fee_checker
+import scanner
+from benchmarks.fixture_chain import FixtureChain
+from fork_cache import ForkStateCache
+from scanner import ScanConfig, WorkerInitError, scan
+
+CONFIG = ScanConfig("http://127.0.0.1:1", "0x" + "aa" * 32, 101, 1_700_000_000)
+CHAIN = FixtureChain(tokens=4, fee_bps=(0, 100, 500))
+TOKENS = [("TKN{}".format(index), address) for index, address in enumerate(CHAIN.tokens)]
+FEES = (0, 1, 5, 0)
+# fee_checker.check_token is patched by the tests, keep the real one
+check_token = fee_checker.check_token
+
+
+class Panic(BaseException):
+    """Stands in for a pyrevm panic, raised as BaseException."""
+
+
+def fixture_evm(config):
+    return FixtureChain(tokens=4, fee_bps=(0, 100, 500)).evm
+
+
+def panicking_check_token(weth, token, swapper):
+    if token.address == CHAIN.tokens[2]:
+        raise Panic("explicit panic")
+    return check_token(weth, token, swapper)
+
+
+def dead_fork(config):
+    raise RuntimeError("connection refused")
+
+
+class ScanTest(unittest.TestCase):
+    def scan(self, workers, fork=fixture_evm, config=CONFIG):
+        scanned = []
+        with mock.patch.object(scanner, "fork_evm", fork), \
+                mock.patch.object(fee_checker, "check_token", panicking_check_token), \
+                contextlib.redirect_stdout(io.StringIO()):
+            results = scan(TOKENS, config, workers, chunk_size=1, on_result=scanned.append)
+        return results, scanned
+
+    def check_results(self, results, scanned):
+        self.assertEqual([(result.index, result.name, result.address) for result in results],
+                         [(index, name, address) for index, (name, address) in enumerate(TOKENS)])
+        self.assertEqual(sorted(result.index for result in scanned), [0, 1, 2, 3])
+        for result, fee in zip(results, FEES):
+            if result.address == CHAIN.tokens[2]:
+                self.assertEqual((result.result, result.error), (None, "Panic: explicit panic"))
+            else:
+                self.assertIsNone(result.error)
+                self.assertAlmostEqual(result.result.buy_fee, fee, places=6)
+
+    def test_single_process(self):
+        self.check_results(*self.scan(1))
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork", "workers must inherit the patches")
+    def test_workers(self):
+        self.check_results(*self.scan(2))
+
+    def test_single_process_state_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "state.sqlite")
+            config = ScanConfig(CONFIG.rpc_url, CONFIG.parent_hash, CONFIG.block_number, CONFIG.timestamp, path)
+            with mock.patch.object(multiprocessing.util, "Finalize") as finalize:
+                self.check_results(*self.scan(1, config=config))
+            # Saved by scan() itself, no second save at interpreter exit
+            finalize.assert_not_called()
+            cache = ForkStateCache(path)
+            try:
+                self.assertIn(CHAIN.tokens[0].lower(), cache.accounts(CONFIG.parent_hash))
+            finally:
+                cache.close()
+
+    def test_init_error(self):
+        with self.assertRaisesRegex(WorkerInitError, "RuntimeError: connection refused"):
+            self.scan(1, dead_fork)
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork", "workers must inherit the patches")
+    def test_init_error_workers(self):
+        with self.assertRaisesRegex(WorkerInitError, "RuntimeError: connection refused"):
+            self.scan(2, dead_fork)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,9 +2,10 @@ import os
 import unittest
 
 from pyrevm import EVM, BlockEnv
-from web3 import Web3
 
+from block_meta import get_block_header
 from contract import Contract
+from uniswap_v2 import pair_address
 
 FORK_URL = os.getenv("FORK_URL") or "http://192.168.1.58:8545"
 BLOCK_NUM = 20967700
@@ -18,9 +19,10 @@ ERC20_LIST = [
     ('TROLL', '0xf8ebf4849F1Fa4FaF0DFF2106A173D3A6CB2eB3A')
 ]
 
+TOKENS = dict(ERC20_LIST)
 UNISWAP_V2_PAIRS = [
-    ('Neiro-DOGE2.0', '0x270250af8569D4ff712AaEbC2F5971A824249fA7'),
-    ('Neiro-KABOSU', '0x6A516271870A48F4F6c72044Ca64Ec9c69ac4efc')
+    ('Neiro-DOGE2.0', pair_address(TOKENS['Neiro'], TOKENS['DOGE2.0'])),
+    ('Neiro-KABOSU', pair_address(TOKENS['Neiro'], TOKENS['KABOSU']))
 ]
 MY_ADDR = "0xd8dA6BF26964aF9D7eEd9e03E53415D37aA96045"  # vitalik.eth
 
@@ -63,16 +65,16 @@ class UniswapV2Test(unittest.TestCase):
         )
 
     def setUp(self) -> None:
-        self.w3 = Web3(Web3.HTTPProvider(FORK_URL))
-        block = self.w3.eth.get_block(block_identifier=BLOCK_NUM, full_transactions=True)
-        self.evm = EVM(fork_url=FORK_URL, fork_block=block['parentHash'].hex(), tracing=False)
+        block = get_block_header(FORK_URL, BLOCK_NUM)
+        self.evm = EVM(fork_url=FORK_URL, fork_block=block.parent_hash, tracing=False)
         self.init_contract()
         return super().setUp()
 
     def init_block(self, block_number):
-        block = self.w3.eth.get_block(block_identifier=block_number, full_transactions=True)
-        print("Block hash", block["hash"].hex())
-        blockEnv = BlockEnv(number=block["number"], timestamp=block["timestamp"])
+        # Cached since setUp, no second round-trip
+        block = get_block_header(FORK_URL, block_number)
+        print("Block hash", block.hash)
+        blockEnv = BlockEnv(number=block.number, timestamp=block.timestamp)
         self.evm.set_block_env(blockEnv)
         balance = self.evm.get_balance(MY_ADDR)
         self.erc20_contracts['WETH'].deposit(value=10 ** 19, caller=MY_ADDR)
@@ -0,0 +1,50 @@
+import unittest
+
+from pyrevm import EVM, AccountInfo, BlockEnv
+
+from simulator import Simulator
+
+MY_ADDR = "0xd8dA6BF26964aF9D7eEd9e03E53415D37aA96045"  # vitalik.eth
+BOT_ADDR = "0x66B8a48DD0A0F42A4f0cb8286ED796D41E664f07"
+
+
+class SimulatorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.sim = Simulator(EVM())
+        self.sim.set_balance(MY_ADDR, 10 ** 18)
+        self.sim.message_call(MY_ADDR, BOT_ADDR, b"", value=1)
+
+    def test_isolated_reverts_changes(self):
+        with self.sim.isolated():
+            self.sim.message_call(MY_ADDR, BOT_ADDR, b"", value=100)
+            self.assertEqual(self.sim.get_balance(BOT_ADDR), 101)
+        self.assertEqual(self.sim.get_balance(BOT_ADDR), 1)
+
+    def test_isolated_reverts_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.sim.isolated():
+                self.sim.message_call(MY_ADDR, BOT_ADDR, b"", value=100)
+                raise RuntimeError("token failed halfway")
+        self.assertEqual(self.sim.get_balance(BOT_ADDR), 1)
+
+    def test_nested_scopes(self):
+        with self.sim.isolated():
+            self.sim.message_call(MY_ADDR, BOT_ADDR, b"", value=10)
+            with self.sim.isolated():
+                self.sim.message_call(MY_ADDR, BOT_ADDR, b"", value=100)
+            self.assertEqual(self.sim.get_balance(BOT_ADDR), 11)
+        self.assertEqual(self.sim.get_balance(BOT_ADDR), 1)
+
+    def test_at_block(self):
+        # Returns block.timestamp
+        clock = "0x" + "33" * 20
+        self.sim.insert_account_info(clock, AccountInfo(code=bytes.fromhex("4260005260206000f3")))
+        self.sim.set_block_env(BlockEnv(number=100, timestamp=1000))
+        with self.sim.at_block(timestamp=500):
+            self.assertEqual(int.from_bytes(bytes(self.sim.message_call(MY_ADDR, clock, b"")), "big"), 500)
+            self.assertEqual(self.sim.env.block.number, 100)
+        self.assertEqual(int.from_bytes(bytes(self.sim.message_call(MY_ADDR, clock, b"")), "big"), 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
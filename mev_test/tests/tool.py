@@ -1,44 +1,36 @@
-import pyrevm
-from web3 import Web3
+from block_replay import BlockReplayer, normalize_log
+from rpc_client import BatchRPCClient
+
 
 class TokenTransactionVerifier:
+    """
+    Replays a transaction on top of the transactions before it in its block and checks the
+    token's logs (Transfer, Approval, ...) are the ones of the mined receipt.
+    """
+
     def __init__(self, rpc_url, token_address):
-        self.web3 = Web3(Web3.HTTPProvider(rpc_url))
-        self.token_address = Web3.toChecksumAddress(token_address)
-        self.evm = pyrevm.EVM()
+        self.rpc_url = rpc_url
+        self.client = BatchRPCClient(rpc_url)
+        self.token_address = token_address.lower()
 
     def load_transaction(self, tx_hash):
-        tx = self.web3.eth.get_transaction(tx_hash)
-        receipt = self.web3.eth.get_transaction_receipt(tx_hash)
+        tx, receipt = self.client.batch([("eth_getTransactionByHash", [tx_hash]),
+                                         ("eth_getTransactionReceipt", [tx_hash])])
         return tx, receipt
 
-    def setup_evm_state(self, block_number):
-        # Sync block state
-        block = self.web3.eth.get_block(block_number)
-        self.evm.set_block(block)
-        # Load token contract code
-        token_code = self.web3.eth.get_code(self.token_address)
-        self.evm.set_account_code(self.token_address, token_code)
-
-    def simulate_transaction(self, tx):
-        # Set up transaction context
-        sender = Web3.toChecksumAddress(tx['from'])
-        receiver = Web3.toChecksumAddress(tx['to'])
-        input_data = tx['input']
-        gas_limit = tx['gas']
-
-        self.evm.set_transaction(sender, receiver, tx['value'], input_data, gas_limit)
-        return self.evm.run()
+    def token_logs(self, logs):
+        return [log for log in logs if log[0] == self.token_address]
 
     def verify_transaction(self, tx_hash):
         tx, receipt = self.load_transaction(tx_hash)
-        self.setup_evm_state(tx['blockNumber'])
-
-        simulated_result = self.simulate_transaction(tx)
-        real_result = receipt['logs']  # Logs generated by real transaction
+        replayer = BlockReplayer(self.rpc_url, tx["blockHash"])
+        simulated = replayer.run(until=tx_hash).txs[-1]
+        real_logs = [normalize_log(log["address"], log["topics"], log["data"]) for log in receipt["logs"]]
 
         # Compare results
-        return simulated_result == real_result
+        return (simulated.success == (int(receipt["status"], 16) == 1)
+                and self.token_logs(simulated.logs) == self.token_logs(real_logs))
+
 
 if __name__ == "__main__":
     verifier = TokenTransactionVerifier(
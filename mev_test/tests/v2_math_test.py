@@ -0,0 +1,125 @@
+import os
+import random
+import unittest
+
+from pyrevm import EVM
+
+from block_meta import get_block_header
+from contract import Contract
+from uniswap_v2 import PAIR_RESERVES_SLOT, UNISWAP_V2_ROUTER, WETH_ADDR, pair_address
+from v2_math import (UINT256_MAX, ReserveCache, get_amount_in, get_amount_out, get_amounts_in, get_amounts_out,
+                     get_amounts_out_many)
+
+FORK_URL = os.getenv("FORK_URL")
+BLOCK_NUM = 20967700
+DOGE = "0xF2ec4a773ef90c58d98ea734c0eBDB538519b988"
+NEIRO = "0x812Ba41e071C7b7fA4EBcFB62dF5F45f6fA853Ee"
+KABOSU = "0xCEb67a66c2c8a90980dA3A50A3F96c07525a26Cb"
+
+
+class V2MathTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.reserves = ReserveCache()
+        self.reserves.set(WETH_ADDR, DOGE, 10 ** 20, 5 * 10 ** 27)
+        self.reserves.set(NEIRO, DOGE, 3 * 10 ** 24, 2 * 10 ** 27)
+
+    def test_single_hop(self):
+        amount_out = 997 * 10 ** 18 * 5 * 10 ** 27 // (1000 * 10 ** 20 + 997 * 10 ** 18)
+        self.assertEqual(get_amount_out(10 ** 18, 10 ** 20, 5 * 10 ** 27), amount_out)
+        self.assertLessEqual(get_amount_in(amount_out, 10 ** 20, 5 * 10 ** 27), 10 ** 18)
+        rng = random.Random(1)
+        for _ in range(1000):
+            reserve_in, reserve_out = rng.randrange(1, 10 ** 30), rng.randrange(2, 10 ** 30)
+            amount_out = rng.randrange(1, reserve_out)
+            amount_in = get_amount_in(amount_out, reserve_in, reserve_out)
+            # getAmountIn rounds up: enough to get amount_out, one wei less is not
+            self.assertGreaterEqual(get_amount_out(amount_in, reserve_in, reserve_out), amount_out)
+            if amount_in > 1:
+                self.assertLess(get_amount_out(amount_in - 1, reserve_in, reserve_out), amount_out)
+
+    def test_reverts(self):
+        for call, reason in ((lambda: get_amount_out(0, 1, 1), "INSUFFICIENT_INPUT_AMOUNT"),
+                             (lambda: get_amount_out(1, 0, 1), "INSUFFICIENT_LIQUIDITY"),
+                             (lambda: get_amount_out(UINT256_MAX // 997 + 1, 1, 1), "ds-math-mul-overflow"),
+                             (lambda: get_amount_in(0, 1, 1), "INSUFFICIENT_OUTPUT_AMOUNT"),
+                             (lambda: get_amount_in(2, 1, 1), "ds-math-sub-underflow"),
+                             (lambda: get_amount_in(1, 1, 1), "division by zero"),
+                             (lambda: get_amounts_out(1, [WETH_ADDR], self.reserves), "INVALID_PATH")):
+            with self.assertRaisesRegex(ValueError, reason):
+                call()
+
+    def test_paths(self):
+        path = [WETH_ADDR, DOGE, NEIRO]
+        amounts = get_amounts_out(10 ** 17, path, self.reserves)
+        self.assertEqual(amounts[1], get_amount_out(10 ** 17, 10 ** 20, 5 * 10 ** 27))
+        self.assertEqual(amounts[2], get_amount_out(amounts[1], 2 * 10 ** 27, 3 * 10 ** 24))
+        amounts_in = get_amounts_in(amounts[-1], path, self.reserves)
+        self.assertEqual(amounts_in[-1], amounts[-1])
+        self.assertLessEqual(amounts_in[0], 10 ** 17)
+
+    def test_many(self):
+        paths = [[WETH_ADDR, DOGE], [WETH_ADDR, DOGE, NEIRO], [NEIRO, DOGE, WETH_ADDR]]
+        requests = [(10 ** (index % 20) + index, paths[index % 3]) for index in range(300)]
+        requests += [(0, paths[0]), (10 ** 18, [WETH_ADDR]), (10 ** 18, [WETH_ADDR, KABOSU])]
+        results = get_amounts_out_many(requests, self.reserves)
+        for (amount_in, path), result in zip(requests[:300], results):
+            self.assertEqual(result, get_amounts_out(amount_in, path, self.reserves))
+        self.assertIsInstance(results[300], ValueError)
+        self.assertIsInstance(results[301], ValueError)
+        self.assertIsInstance(results[302], KeyError)
+        self.assertEqual(len(results), 303)
+
+    def test_many_rounded_to_zero(self):
+        # The first hop rounds 5 wei down to nothing, the router reverts on the second one
+        self.reserves.set(NEIRO, KABOSU, 10 ** 30, 10)
+        self.reserves.set(KABOSU, DOGE, 10 ** 18, 10 ** 18)
+        path = [NEIRO, KABOSU, DOGE]
+        with self.assertRaisesRegex(ValueError, "INSUFFICIENT_INPUT_AMOUNT"):
+            get_amounts_out(5, path, self.reserves)
+        results = get_amounts_out_many([(5, path), (10 ** 30, path)], self.reserves)
+        self.assertIsInstance(results[0], ValueError)
+        self.assertEqual(results[1], get_amounts_out(10 ** 30, path, self.reserves))
+
+    def test_reserves_from_evm(self):
+        evm = EVM()
+        reserves = ReserveCache(evm)
+        token0_reserve, token1_reserve = 12345, 67890
+        evm.insert_account_storage(pair_address(WETH_ADDR, DOGE), PAIR_RESERVES_SLOT,
+                                   (7 << 224) | (token1_reserve << 112) | token0_reserve)
+        # WETH sorts before DOGE
+        self.assertEqual(reserves.get(WETH_ADDR, DOGE), (token0_reserve, token1_reserve))
+        self.assertEqual(reserves.get(DOGE, WETH_ADDR), (token1_reserve, token0_reserve))
+
+
+@unittest.skipUnless(FORK_URL, "needs FORK_URL")
+class V2MathRouterTest(unittest.TestCase):
+    """Bit-exact agreement with UniswapV2Router02 executed in the EVM."""
+
+    def setUp(self) -> None:
+        block = get_block_header(FORK_URL, BLOCK_NUM)
+        self.evm = EVM(fork_url=FORK_URL, fork_block=block.parent_hash, tracing=False)
+        self.router = Contract(UNISWAP_V2_ROUTER, revm=self.evm, abi_file_path="./abi/uniswapv2router.abi")
+
+    def test_library(self):
+        rng = random.Random(2)
+        for _ in range(200):
+            reserve_in, reserve_out = rng.randrange(1, 2 ** 112), rng.randrange(2, 2 ** 112)
+            amount_in = rng.randrange(1, 2 ** 100)
+            self.assertEqual(get_amount_out(amount_in, reserve_in, reserve_out),
+                             self.router.getAmountOut(amount_in, reserve_in, reserve_out))
+            amount_out = rng.randrange(1, reserve_out)
+            self.assertEqual(get_amount_in(amount_out, reserve_in, reserve_out),
+                             self.router.getAmountIn(amount_out, reserve_in, reserve_out))
+
+    def test_paths(self):
+        reserves = ReserveCache(self.evm)
+        for path in ([WETH_ADDR, DOGE], [WETH_ADDR, NEIRO, KABOSU], [KABOSU, NEIRO, DOGE]):
+            for amount in (10 ** 9, 10 ** 15, 10 ** 18):
+                self.assertEqual(get_amounts_out(amount, path, reserves), self.router.getAmountsOut(amount, path))
+                amounts_out = get_amounts_out(amount, path, reserves)
+                self.assertEqual(get_amounts_in(amounts_out[-1], path, reserves),
+                                 self.router.getAmountsIn(amounts_out[-1], path))
+
+
+if __name__ == "__main__":
+    unittest.main()
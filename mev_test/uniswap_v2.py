@@ -0,0 +1,52 @@
+from eth_utils import keccak, to_checksum_address
+
+WETH_ADDR = "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"
+UNISWAP_V2_FACTORY = "0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f"
+UNISWAP_V2_ROUTER = "0x7a250d5630b4cf539739df2c5dacb4c659f2488d"
+# keccak256 of the UniswapV2Pair creation code, used by the factory's CREATE2
+UNISWAP_V2_INIT_CODE_HASH = "0x96e8ac4277198ff8b6f785478aa9a39f403cb768dd02cbee326c3e7da348845f"
+
+# UniswapV2Pair storage layout (UniswapV2ERC20 fields first)
+PAIR_BALANCE_OF_SLOT = 1
+PAIR_TOKEN0_SLOT = 6
+PAIR_TOKEN1_SLOT = 7
+PAIR_RESERVES_SLOT = 8  # reserve0 (uint112) | reserve1 (uint112) | blockTimestampLast (uint32)
+PAIR_SWAP_SLOTS = range(5, 13)  # factory .. unlocked, everything swap() reads or writes
+
+# WETH9 storage layout
+WETH_BALANCE_OF_SLOT = 3
+WETH_ALLOWANCE_SLOT = 4
+
+
+def sort_tokens(token_a: str, token_b: str):
+    token_a, token_b = token_a.lower(), token_b.lower()
+    if token_a == token_b:
+        raise ValueError("Identical addresses {}".format(token_a))
+    return (token_a, token_b) if token_a < token_b else (token_b, token_a)
+
+
+def pair_address(token_a: str, token_b: str, factory: str = UNISWAP_V2_FACTORY,
+                 init_code_hash: str = UNISWAP_V2_INIT_CODE_HASH) -> str:
+    """Address of the V2 pair of two tokens, derived offline like UniswapV2Library.pairFor."""
+    token0, token1 = sort_tokens(token_a, token_b)
+    salt = keccak(bytes.fromhex(token0[2:]) + bytes.fromhex(token1[2:]))
+    digest = keccak(b"\xff" + bytes.fromhex(factory[2:]) + salt + bytes.fromhex(init_code_hash[2:]))
+    return to_checksum_address(digest[12:])
+
+
+def mapping_slot(key: str, slot: int) -> int:
+    """Storage slot of ``mapping(address => ...)`` declared at ``slot``, for ``key``."""
+    return int.from_bytes(keccak(bytes(12) + bytes.fromhex(key[2:]) + slot.to_bytes(32, "big")), "big")
+
+
+def nested_mapping_slot(key: str, inner_key: str, slot: int) -> int:
+    """Storage slot of ``mapping(address => mapping(address => ...))[key][inner_key]``."""
+    outer = mapping_slot(key, slot)
+    return int.from_bytes(keccak(bytes(12) + bytes.fromhex(inner_key[2:]) + outer.to_bytes(32, "big")), "big")
+
+
+def decode_reserves(word: int):
+    """Splits the packed reserves slot into (reserve0, reserve1, blockTimestampLast)."""
+    mask = (1 << 112) - 1
+    return word & mask, (word >> 112) & mask, word >> 224
+
@@ -0,0 +1,179 @@
+"""
+Uniswap V2 quoting without the EVM.
+
+Same integer maths as UniswapV2Library (getAmountOut, getAmountIn, getAmountsOut,
+getAmountsIn), including its uint256 SafeMath checks: every case where the router reverts
+raises a ValueError with the router's revert reason. Reserves come from a ReserveCache,
+filled by hand or read once per pair from a fork.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from uniswap_v2 import (UNISWAP_V2_FACTORY, UNISWAP_V2_INIT_CODE_HASH, PAIR_RESERVES_SLOT, decode_reserves,
+                        pair_address, sort_tokens)
+
+UINT256_MAX = (1 << 256) - 1
+
+
+def get_amount_out(amount_in: int, reserve_in: int, reserve_out: int) -> int:
+    """UniswapV2Library.getAmountOut, 0.3% fee."""
+    if amount_in <= 0:
+        raise ValueError("UniswapV2Library: INSUFFICIENT_INPUT_AMOUNT")
+    if reserve_in <= 0 or reserve_out <= 0:
+        raise ValueError("UniswapV2Library: INSUFFICIENT_LIQUIDITY")
+    amount_in_with_fee = amount_in * 997
+    numerator = amount_in_with_fee * reserve_out
+    denominator = reserve_in * 1000 + amount_in_with_fee
+    if numerator > UINT256_MAX or denominator > UINT256_MAX:
+        # Checked once at the end, every intermediate is at most the numerator or the denominator
+        if numerator > UINT256_MAX or reserve_in * 1000 > UINT256_MAX:
+            raise ValueError("ds-math-mul-overflow")
+        raise ValueError("ds-math-add-overflow")
+    return numerator // denominator
+
+
+def get_amount_in(amount_out: int, reserve_in: int, reserve_out: int) -> int:
+    """UniswapV2Library.getAmountIn, 0.3% fee."""
+    if amount_out <= 0:
+        raise ValueError("UniswapV2Library: INSUFFICIENT_OUTPUT_AMOUNT")
+    if reserve_in <= 0 or reserve_out <= 0:
+        raise ValueError("UniswapV2Library: INSUFFICIENT_LIQUIDITY")
+    numerator = reserve_in * amount_out * 1000
+    if numerator > UINT256_MAX:
+        raise ValueError("ds-math-mul-overflow")
+    if amount_out > reserve_out:
+        raise ValueError("ds-math-sub-underflow")
+    denominator = (reserve_out - amount_out) * 997
+    if denominator == 0:
+        # Division by zero, the router reverts without a reason
+        raise ValueError("division by zero")
+    # denominator < numerator: no overflow there, and numerator // denominator + 1 fits as well
+    return numerator // denominator + 1
+
+
+class ReserveCache:
+    """
+    Reserves of V2 pairs keyed by their sorted tokens. Pairs missing from the cache are
+    read from ``evm`` (the packed reserves slot, what getReserves returns) on first use.
+    Call clear() when the state the reserves were read from changes.
+    """
+
+    def __init__(self, evm=None, factory: str = UNISWAP_V2_FACTORY, init_code_hash: str = UNISWAP_V2_INIT_CODE_HASH):
+        self.evm = evm
+        self.factory = factory
+        self.init_code_hash = init_code_hash
+        self._reserves: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        # (token_in, token_out) exactly as asked -> (reserve_in, reserve_out), skips sorting on repeated quotes
+        self._oriented: Dict[Tuple[str, str], Tuple[int, int]] = {}
+
+    def set(self, token_a: str, token_b: str, reserve_a: int, reserve_b: int):
+        token0, token1 = sort_tokens(token_a, token_b)
+        self._reserves[(token0, token1)] = (reserve_a, reserve_b) if token0 == token_a.lower() else (reserve_b,
+                                                                                                    reserve_a)
+        self._oriented.clear()
+
+    def get(self, token_in: str, token_out: str) -> Tuple[int, int]:
+        """(reserve_in, reserve_out) of the pair, like UniswapV2Library.getReserves."""
+        reserves = self._oriented.get((token_in, token_out))
+        if reserves is not None:
+            return reserves
+        key = sort_tokens(token_in, token_out)
+        reserves = self._reserves.get(key)
+        if reserves is None:
+            reserves = self.load(*key)
+        oriented = reserves if key[0] == token_in.lower() else (reserves[1], reserves[0])
+        self._oriented[(token_in, token_out)] = oriented
+        return oriented
+
+    def load(self, token0: str, token1: str) -> Tuple[int, int]:
+        if self.evm is None:
+            raise KeyError("No reserves for {}/{}".format(token0, token1))
+        pair = pair_address(token0, token1, self.factory, self.init_code_hash)
+        reserve0, reserve1, _ = decode_reserves(self.evm.storage(pair, PAIR_RESERVES_SLOT))
+        self._reserves[(token0, token1)] = (reserve0, reserve1)
+        return reserve0, reserve1
+
+    def clear(self):
+        self._reserves.clear()
+        self._oriented.clear()
+
+
+def _check_path(path: Sequence[str]):
+    if len(path) < 2:
+        raise ValueError("UniswapV2Library: INVALID_PATH")
+
+
+def get_amounts_out(amount_in: int, path: Sequence[str], reserves: ReserveCache) -> List[int]:
+    """UniswapV2Library.getAmountsOut / router.getAmountsOut."""
+    _check_path(path)
+    amounts = [amount_in]
+    for token_in, token_out in zip(path, path[1:]):
+        amounts.append(get_amount_out(amounts[-1], *reserves.get(token_in, token_out)))
+    return amounts
+
+
+def get_amounts_in(amount_out: int, path: Sequence[str], reserves: ReserveCache) -> List[int]:
+    """UniswapV2Library.getAmountsIn / router.getAmountsIn."""
+    _check_path(path)
+    amounts = [amount_out]
+    for token_in, token_out in zip(reversed(path[:-1]), reversed(path[1:])):
+        amounts.append(get_amount_in(amounts[-1], *reserves.get(token_in, token_out)))
+    return amounts[::-1]
+
+
+def _hops_out(amounts: np.ndarray, path: Sequence[str], reserves: ReserveCache) -> List[np.ndarray]:
+    # Object arrays keep Python's exact integers, each hop is a handful of array operations
+    hops = [amounts]
+    for token_in, token_out in zip(path, path[1:]):
+        reserve_in, reserve_out = reserves.get(token_in, token_out)
+        if reserve_in <= 0 or reserve_out <= 0:
+            raise ValueError("UniswapV2Library: INSUFFICIENT_LIQUIDITY")
+        amount_in_with_fee = hops[-1] * 997
+        numerator = amount_in_with_fee * reserve_out
+        denominator = amount_in_with_fee + reserve_in * 1000
+        if any(value > UINT256_MAX for value in (numerator.max(), denominator.max(), reserve_in * 1000)):
+            raise OverflowError
+        hops.append(numerator // denominator)
+        if (hops[-1] <= 0).any():
+            # The next getAmountOut would revert, _quote_or_error tells which request (a zero
+            # amount out of the last hop is no revert, the scalar version returns it as is)
+            raise ValueError("UniswapV2Library: INSUFFICIENT_INPUT_AMOUNT")
+    return hops
+
+
+def get_amounts_out_many(requests: Sequence[Tuple[int, Sequence[str]]], reserves: ReserveCache) -> list:
+    """
+    Quotes ``[(amount_in, path), ...]`` at once, returns the amounts of every request in the
+    same order, with the ValueError in place of a request the router would revert (KeyError
+    for a pair the cache has no reserves for).
+
+    Requests on the same path are computed together, one array operation per hop.
+    """
+    results = [None] * len(requests)
+    by_path: Dict[tuple, List[int]] = {}
+    for index, (_, path) in enumerate(requests):
+        by_path.setdefault(tuple(path), []).append(index)
+
+    for path, indexes in by_path.items():
+        amounts = np.array([requests[index][0] for index in indexes], dtype=object)
+        try:
+            _check_path(path)
+            if (amounts <= 0).any():
+                raise ValueError("UniswapV2Library: INSUFFICIENT_INPUT_AMOUNT")
+            hops = _hops_out(amounts, path, reserves)
+        except (OverflowError, ValueError, KeyError):
+            # Something reverts somewhere on this path, let the scalar version tell which request and why
+            for index in indexes:
+                results[index] = _quote_or_error(requests[index][0], path, reserves)
+            continue
+        for position, index in enumerate(indexes):
+            results[index] = [int(hop[position]) for hop in hops]
+    return results
+
+
+def _quote_or_error(amount_in: int, path: Sequence[str], reserves: ReserveCache):
+    try:
+        return get_amounts_out(amount_in, path, reserves)
+    except (ValueError, KeyError) as e:
+        return e